@@ -0,0 +1,3 @@
+from beusproxy.aio import create_app
+
+app = create_app()
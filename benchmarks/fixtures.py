@@ -0,0 +1,429 @@
+"""Parser Fixtures
+
+Root server HTML reconstructed from demo responses,
+shaped the way each parser in beusproxy.parser reads it.
+"""
+
+import json
+import os
+from html import escape
+
+from beusproxy.config import DEMO_FOLDER
+from beusproxy.parser.grades import grade_fields
+
+
+def _demo(name):
+    with open(os.path.join(DEMO_FOLDER, f"{name}.json"), "r", encoding="UTF-8") as f:
+        return json.load(f)
+
+
+def _row(*cells, tag="td"):
+    return "<tr>" + "".join(f"<{tag}>{escape(str(c))}</{tag}>" for c in cells) + "</tr>"
+
+
+def _table(rows, attrs=""):
+    return f"<table{attrs}>\n" + "\n".join(rows) + "\n</table>"
+
+
+def home(page):
+    """Homepage, parsed by home"""
+    info = page["studentInfo"]
+    edu = info["eduDebt"]
+    last = info["lastLogin"]
+    spec = info["speciality"]
+    fields = [
+        ("Student number", info["studentId"]),
+        ("Name surname patronymic", info["fullNamePatronymic"]),
+        ("Birth date", info["birthDate"]),
+        (
+            "Program / Class",
+            f"{spec['program']}-{spec['lang'].upper()} / {spec['year']}",
+        ),
+        ("Qrup kodu", info["groupCode"]),
+        ("Advisor", info["advisor"].upper()),
+        ("Status", {"studying": "Oxuyur"}.get(info["status"], info["status"])),
+        ("BEU e-mail", info["beuEmail"]),
+        ("State-funded", "Yes" if info["stateFunded"] else "No"),
+        ("Presidential scholarship", "Yes" if info["presidentScholar"] else "No"),
+        ("Last login date", last["datetime"].replace("T", " ")),
+        ("Last login ip", last["ip"]),
+        ("Registration date", info["registerDate"]),
+        (f"Education debt [{edu['year']} - {edu['semester']}]", f"{edu['amount']} AZN"),
+        ("Təhsil haqqı ödəniş forması", {"state_funded": "DS"}[edu["paymentType"]]),
+        ("İllik Təhsil haqqı", f"{edu['paymentAnnual']} AZN"),
+        ("Debt (dormitory)", f"{info['dormDebt']} AZN"),
+        ("Dissertation topic", info["dissTopic"]),
+        ("SEC exam score", info["dimScore"]),
+    ]
+    rows = [_row("", f"{field} :", value) for field, value in fields]
+    return (
+        "<html><body><section class=\"content\">\n"
+        f'<img class="img-circle" src="stud_photo.php?ImgID={page["image"]}&amp;t=1">\n'
+        + _table(rows, ' class="table"')
+        + "\n</section></body></html>"
+    )
+
+
+def grades(page):
+    """Grades page, parsed by grades"""
+    options = ['<option value="1#1">All</option>'] if page["canRequestAll"] else []
+    options += [
+        f'<option value="{e["year"]}#{e["semester"]}">{e["year"]} - {e["semester"]}</option>'
+        for e in page["entries"]
+    ]
+    return (
+        '<html><body><select id="ysem" class="form-control">\n'
+        + "\n".join(options)
+        + "\n</select></body></html>"
+    )
+
+
+# Labels of grades table, by mode
+_grades_headers = {
+    "latest": [
+        ("courseCode", "Dərs kodu"),
+        ("courseName", "Dərsin adı"),
+        ("ects", "AKTS"),
+        ("absents", "Qaib"),
+        ("act1", "SDF1"),
+        ("act2", "SDF2"),
+        ("sem", "SEM"),
+        ("iw", "TSI"),
+        ("final", "SSI"),
+        ("addFinal", "ƏI"),
+        ("reFinal", "TI"),
+        ("sum", "ORT"),
+        ("n", "N"),
+        ("m", "M"),
+        ("l", "L"),
+        ("calc", "IGB"),
+    ],
+}
+_grades_headers["old"] = [
+    ("att", "DVM") if k == "sem" else (k, v) for k, v in _grades_headers["latest"]
+]
+
+
+def _grade_cell(key, value, mode, old_graded):
+    if value == -1:
+        return ""
+    if value == -2:
+        return "Q"
+    if old_graded and (field := grade_fields[mode].get(key)) is not None:
+        return str(round(value / field * 100))
+    return str(value)
+
+
+def grades2(page):
+    """Grades of semesters, parsed by grades2"""
+    semesters = {}
+    for code, row in page.items():
+        semesters.setdefault(row["ys"], {})[code] = row
+
+    html = []
+    for ys, rows in semesters.items():
+        year, semester = ys.split("#")
+        mode = "latest" if any("sem" in row for row in rows.values()) else "old"
+        headers = _grades_headers[mode]
+        trs = [_row(*(label for _, label in headers))]
+        for code, row in rows.items():
+            old_graded = any(isinstance(v, float) for v in row.values())
+            cells = []
+            for key, _ in headers:
+                if key == "courseCode":
+                    cells.append(code)
+                elif key == "calc":
+                    cells.append("")
+                else:
+                    cells.append(_grade_cell(key, row[key], mode, old_graded))
+            trs.append(_row(*cells))
+        trs.append("<tr></tr>")
+        html.append(
+            f"<b>{year}-{int(year) + 1} {semester}. semester</b>\n"
+            '<div class="table-responsive">'
+            + _table(trs, ' class="table table-bordered"')
+            + "</div>"
+        )
+    return "\n".join(html)
+
+
+_semester_label_style = (
+    "font-weight:bold; border:none; padding-top:10px; padding-bottom:2px"
+)
+
+
+def _semester_footer(semester, style):
+    return (
+        f'<tr style="{style}"><td></td>'
+        f"<td>SAC : {semester['sac']}\n"
+        f"TACC : {semester['tacc']}\n"
+        f"TATC : {semester['tatc']}</td>"
+        f"<td>{semester['totalHours']}</td>"
+        f"<td>{semester['totalCredits']}</td>"
+        f"<td>SPA : {semester['spa']}</td>"
+        f"<td>GPA : {semester['gpa']}</td>"
+        "<td></td></tr>"
+    )
+
+
+def transcript(page):
+    """Transcript, parsed by transcript"""
+    spec = page["speciality"]
+    info = _table(
+        [
+            _row("Name", page["fullName"], "Faculty", page["faculty"]),
+            _row(
+                "Student number",
+                page["studentId"],
+                "Speciality",
+                f"Information Technologies ({spec['lang'].upper()})",
+            ),
+            _row(
+                "Level",
+                f"Undergraduate ({page['level'].lower()})",
+                "Entry date",
+                page["entryDate"].split("T")[0],
+            ),
+            _row("Graduate date", "", page["graduateDate"], ""),
+        ],
+        ' class="simple-table"',
+    )
+
+    trs = [_row("Code", "Name", "Hours", "Credits", "Grade", "Letter", "Repeat")]
+    semesters = [
+        (year, semester, courses)
+        for year, by_semester in page["semesters"].items()
+        for semester, courses in by_semester.items()
+    ]
+    for inx, (year, semester, table) in enumerate(semesters):
+        trs.append(
+            f'<tr><td colspan="7" style="{_semester_label_style}">'
+            f"{year} - {int(year) + 1}. {semester} semester</td></tr>"
+        )
+        for code, course in table["courses"].items():
+            trs.append(
+                _row(
+                    code,
+                    course["courseName"],
+                    course["hours"],
+                    course["courses"],
+                    course["grade"],
+                    course["gradeLetter"],
+                    "R" if course["repeat"] else "",
+                )
+            )
+        # Footer of last semester begins the totals.
+        if inx == len(semesters) - 1:
+            trs.append(
+                _semester_footer(
+                    table, "color:Maroon; font-size:12px; font-weight:bold"
+                )
+            )
+        else:
+            trs.append(_semester_footer(table, "font-size:12px; font-weight:bold"))
+
+    for label, key in (
+        ("Total ECTS", "totalEarnedEcts"),
+        ("Total credits", "totalEarnedCredits"),
+        ("GPA", "totalGpa"),
+    ):
+        trs.append(
+            '<tr style="color:Maroon; font-size:12px; font-weight:bold">'
+            f"<td>{label} : {page[key]}</td></tr>"
+        )
+
+    return f"{info}\n" + _table(trs, ' class="table"')
+
+
+def attendance2(page):
+    """Attendance by semester, parsed by attendance2"""
+    trs = [
+        _row(
+            "", "Code", "Name", "Educator", "Credit", "Hours",
+            "Limit", "ATDS", "Absent", "Absent %", "",
+        )
+    ]
+    for code, course in page.items():
+        trs.append(
+            f'<tr><td></td><td><a href="#">{escape(code)}</a></td>'
+            + "".join(
+                f"<td>{escape(str(v))}</td>"
+                for v in (
+                    course["courseName"],
+                    course["courseEducator"].upper(),
+                    course["credit"],
+                    course["hours"],
+                    course["limit"],
+                    course["atds"],
+                    course["absent"],
+                    f"{course['absentPercent']}%",
+                )
+            )
+            + "<td></td></tr>"
+        )
+    return _table(trs, ' class="table box"')
+
+
+def attendance3(page):
+    """Attendance by course, parsed by attendance3"""
+    trs = ["<tr></tr>", _row("", "Date", "Time", "Present", "Place", "")]
+    for entry in page["entries"]:
+        date, time = entry["datetime"].split("T")
+        day, month = date.split("-")
+        trs.append(
+            _row(
+                "",
+                f"2025-{month}-{day}",
+                time,
+                "+" if entry["present"] else "-",
+                f"{entry['place']} otaq",
+                "",
+            )
+        )
+    return (
+        f"<div><h4>{escape(page['course_code'])} - {escape(page['course_name'])}</h4></div>\n"
+        f"<div>Educator: <b>{escape(page['educator'].upper())}</b></div>\n"
+        + _table(trs, ' id="tblJourn"')
+    )
+
+
+def _course_cells(course, lang_name):
+    match course["courseType"]:
+        case "def":
+            code, name = course["courseCode"], course["courseName"]
+        case "ae":
+            code, name = "", "Area elective subject [ AE ]"
+        case "lang":
+            code, name = "", f"{lang_name} [ NAE ]"
+        case _:
+            code, name = "", "Non-area elective subject [ NAE ]"
+    return code, name, course["theory"], course["pr"], course["ects"]
+
+
+def _courses_table(courses, attrs=""):
+    trs = [_row("№", "Course Code", "Name", "Theory", "pr", "ects")]
+    for inx, course in enumerate(courses):
+        trs.append(_row(inx + 1, *_course_cells(course, "Foreign language")))
+    return _table(trs, attrs)
+
+
+def _electives(title, courses):
+    trs = [f"<tr><td><div>&nbsp;{title}</div></td></tr>"]
+    trs += _courses_table(courses).split("\n")[1:-1]
+    trs += ["<tr><td></td></tr>", "<tr><td></td></tr>"]
+    return "<div>" + _table(trs) + "</div>"
+
+
+def program2(page):
+    """Program, parsed by program2"""
+    semesters = list(page["courses"].values())
+    years = []
+    for inx in range(0, len(semesters), 2):
+        years.append(
+            '<tr><td><table class="table"><tr>'
+            + "".join(
+                "<td>" + _courses_table(s, ' class="table"') + "</td>"
+                for s in semesters[inx: inx + 2]
+            )
+            + "</tr></table></td></tr>"
+        )
+    return (
+        '<div class="moddesc">Program</div>\n'
+        + _table(years, ' id="tblMufredatProg"')
+        + "\n"
+        + _electives("AE - Area Elective Courses", page["areaCourses"])
+        + "\n"
+        + _electives("NAE - Non-Area Elective Courses", page["nonAreaCourses"])
+    )
+
+
+def announces(page):
+    """Announces, parsed by announces"""
+    items = [
+        "<div><div>"
+        f"<div><i>{escape(ann['name'])}</i></div>"
+        f"<div>{escape(ann['body']).replace(chr(10), '<br>' + chr(10))}</div>"
+        f"<div>{ann['date']}</div>"
+        "</div></div>"
+        for ann in page
+    ]
+    return (
+        '<div class="box-body"><div>Announces</div><div>\n'
+        + "\n".join(items)
+        + "\n</div></div>"
+    )
+
+
+def faq(page):
+    """FAQ, parsed by faq"""
+    items = []
+    for item in page:
+        title = item["question"][: len(item["question"]) - len(item["answer"])]
+        items.append(
+            '<li><div class="timeline-item">'
+            f"<h3>{escape(title)}</h3>"
+            f'<div class="timeline-body">{escape(item["answer"])}</div>'
+            "</div></li>"
+        )
+    return '<ul class="timeline">\n' + "\n".join(items) + "\n</ul>"
+
+
+def msg2(message):
+    """Message, parsed by msg2"""
+    html = (
+        _table(
+            [
+                _row("From", message["from"]),
+                _row("Date", message["date"].replace("T", " ")),
+                _row("Subject", message["subject"]),
+            ],
+            ' class="table"',
+        )
+        + '\n<div class="mailbox-read-message">'
+        + escape(message["body"])
+        + "</div>"
+    )
+    return json.dumps({"CODE": 1, "DATA": html})
+
+
+def msg_id(messages):
+    """Message list of a page, parsed by msg_id"""
+    rows = [
+        f'<tr onclick="ShowReceivedMessage({inx})"><td>'
+        f'<span style="color:#1E1E1E ;font-weight:bold">{escape(m["subject"])}</span>'
+        "</td></tr>"
+        for inx, m in enumerate(messages, 1000)
+    ]
+    return "<html><body>" + _table(rows, ' class="table"') + "</body></html>"
+
+
+def load():
+    """Reconstruct fixtures of all parsers
+
+    Returns:
+        dict: Parser name to list of (name, HTML, expected output)
+    """
+    messages = _demo("msg")
+    return {
+        "home": [("home", home(d := _demo("home")), d)],
+        "grades": [("grades", grades(d := _demo("grades")), d)],
+        "grades2": [
+            ("grades2", grades2(d := _demo("grades2")), d),
+            ("grades_all", grades2(d := _demo("grades_all")), d),
+        ],
+        "transcript": [("transcript", transcript(d := _demo("transcript")), d)],
+        # Demo files of attendance are named after endpoints.
+        "attendance2": [("attendance3", attendance2(d := _demo("attendance3")), d)],
+        "attendance3": [("attendance2", attendance3(d := _demo("attendance2")), d)],
+        "program2": [("program", program2(d := _demo("program")), d)],
+        "announces": [("announces", announces(d := _demo("announces")), d)],
+        "faq": [("faq", faq(d := _demo("faq")), d)],
+        "msg2": [(f"msg.{inx}", msg2(m), m) for inx, m in enumerate(messages)],
+        "msg_id": [
+            (
+                "msg",
+                msg_id(messages),
+                [str(i) for i in range(1000, 1000 + len(messages))],
+            )
+        ],
+    }
@@ -0,0 +1,140 @@
+"""Grade Diff Benchmark
+
+Compares grade tables of demo responses, mutated the way
+root server changes them, with the jsondiff based diff used before
+and with bot.common.utils.grade_diff. Reports ops/sec and
+whether new diffs are the same as jsondiff ones.
+
+Usage:
+    python -m benchmarks.grade_diff [-n 2000]
+"""
+
+import argparse
+import copy
+import importlib.util
+import json
+import os
+import sys
+import time
+
+from beusproxy.config import DEMO_FOLDER
+from bot.common.utils import GRADE_FIELDS, grade_diff
+
+
+def _demo(name):
+    with open(os.path.join(DEMO_FOLDER, f"{name}.json"), "r", encoding="UTF-8") as f:
+        return json.load(f)
+
+
+def cases():
+    """Old and new grade tables
+
+    Returns:
+        list: List of (case, old, new)
+    """
+    old = _demo("grades_latest")
+    courses = list(old)
+
+    one_field = copy.deepcopy(old)
+    one_field[courses[0]]["final"] = 45
+
+    many_fields = copy.deepcopy(old)
+    for course in courses:
+        many_fields[course]["absents"] += 1
+        many_fields[course]["sem"] = 0
+
+    new_course = copy.deepcopy(old)
+    new_course["IT999"] = dict(old[courses[0]], courseName="New course")
+
+    ignored_field = copy.deepcopy(old)
+    ignored_field[courses[0]]["sum"] = 99
+
+    return [
+        ("unchanged", old, copy.deepcopy(old)),
+        ("one_field", old, one_field),
+        ("many_fields", old, many_fields),
+        ("new_course", old, new_course),
+        ("ignored_field", old, ignored_field),
+    ]
+
+
+def jsondiff_grade_diff(grades_old, grades):
+    """Grade diff as it was, jsondiff over whole tables"""
+    import jsondiff  # pylint: disable=C0415
+
+    def clean_symbol(table):
+        return {
+            k: clean_symbol(v) if isinstance(v, dict) else v
+            for k, v in table.items()
+            if not isinstance(k, jsondiff.symbols.Symbol)
+        }
+
+    diff_dic = clean_symbol(jsondiff.diff(grades_old, grades, syntax="rightonly"))
+    for k, v in dict(diff_dic).items():
+        if isinstance(v, dict):
+            for kk in dict(v):
+                if kk not in GRADE_FIELDS:
+                    v.pop(kk)
+            if len(v) == 0:
+                diff_dic.pop(k)
+    return diff_dic
+
+
+def run(diff, all_cases, number):
+    """Benchmark a diff function
+
+    Args:
+        diff (callable): Diff function
+        all_cases (list): Cases
+        number (int): Rounds over cases
+
+    Returns:
+        dict: Outputs and ops/sec
+    """
+    outputs = {case: diff(old, new) for case, old, new in all_cases}
+
+    start = time.perf_counter()
+    for _ in range(number):
+        for _, old, new in all_cases:
+            diff(old, new)
+    elapsed = time.perf_counter() - start
+
+    return {"outputs": outputs, "ops": number * len(all_cases) / elapsed}
+
+
+def main():
+    """Benchmark entrypoint"""
+    argp = argparse.ArgumentParser(description="Grade diff benchmark")
+    argp.add_argument("-n", "--number", type=int, default=2000, help="Rounds over cases")
+    args = argp.parse_args()
+
+    all_cases = cases()
+    result = run(grade_diff, all_cases, args.number)
+
+    if importlib.util.find_spec("jsondiff") is None:
+        print("Skipping jsondiff, not installed", file=sys.stderr)
+        print(f"{'grade_diff':<12} {result['ops']:>10.1f} ops/sec")
+        sys.exit(0)
+
+    baseline = run(jsondiff_grade_diff, all_cases, args.number)
+    failed = False
+    print(f"{'case':<14} {'identical':>10}")
+    for case, output in result["outputs"].items():
+        identical = output == baseline["outputs"][case]
+        failed = failed or not identical
+        print(f"{case:<14} {str(identical):>10}")
+        if not identical:
+            print(f"  jsondiff:   {baseline['outputs'][case]}", file=sys.stderr)
+            print(f"  grade_diff: {output}", file=sys.stderr)
+
+    print(
+        f"\n{'diff':<12} {'ops/sec':>10} {'speedup':>8}\n"
+        f"{'jsondiff':<12} {baseline['ops']:>10.1f} {1:>7.2f}x\n"
+        f"{'grade_diff':<12} {result['ops']:>10.1f} "
+        f"{result['ops'] / baseline['ops']:>7.2f}x"
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
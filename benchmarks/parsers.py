@@ -0,0 +1,143 @@
+"""Parser Benchmark
+
+Runs every parser over fixtures reconstructed from demo responses,
+with each parser backend. Reports ops/sec and peak allocations,
+and fails if a backend output differs from html.parser.
+
+Usage:
+    python -m benchmarks.parsers [-b html.parser lxml] [-n 50] [-p transcript]
+"""
+
+import argparse
+import importlib.util
+import json
+import sys
+import time
+import tracemalloc
+
+from beusproxy import parser
+from beusproxy.common import utils
+
+from . import fixtures
+
+BACKENDS = ["html.parser", "lxml"]
+
+
+def dumps(page):
+    """Serialized output, compared byte by byte.
+    Errors are prefixed with '!'.
+    """
+    return json.dumps(page, ensure_ascii=False)
+
+
+def matches_demo(page, demo):
+    """Whether output contains the demo response.
+    Demo responses may predate fields added to parsers.
+    """
+    if isinstance(page, dict) and isinstance(demo, dict):
+        return all(k in page and matches_demo(page[k], v) for k, v in demo.items())
+    if isinstance(page, list) and isinstance(demo, list):
+        return len(page) == len(demo) and all(map(matches_demo, page, demo))
+    return page == demo
+
+
+def run(name, cases, backend, number):
+    """Benchmark a parser with a backend
+
+    Args:
+        name (str): Parser name
+        cases (list): Fixtures of parser
+        backend (str): Parser backend
+        number (int): Rounds over fixtures
+
+    Returns:
+        dict: Outputs, ops/sec and peak KiB per op
+    """
+    utils.PARSER_BACKEND = backend
+    parse = getattr(parser, name)
+
+    outputs = {}
+    for fixture, html, _ in cases:
+        try:
+            outputs[fixture] = dumps(parse(html))
+        except Exception as e:  # pylint: disable=W0718
+            outputs[fixture] = f"!{type(e).__name__}: {e}"
+
+    tracemalloc.start()
+    peak = 0
+    for _, html, _ in cases:
+        tracemalloc.reset_peak()
+        try:
+            parse(html)
+        except Exception:  # pylint: disable=W0718
+            pass
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(number):
+        for _, html, _ in cases:
+            try:
+                parse(html)
+            except Exception:  # pylint: disable=W0718
+                pass
+    elapsed = time.perf_counter() - start
+
+    return {
+        "outputs": outputs,
+        "ops": number * len(cases) / elapsed,
+        "peak": peak / 1024,
+    }
+
+
+def main():
+    """Benchmark entrypoint"""
+    argp = argparse.ArgumentParser(description="Parser backend benchmark")
+    argp.add_argument("-b", "--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    argp.add_argument("-n", "--number", type=int, default=50, help="Rounds per parser")
+    argp.add_argument("-p", "--parsers", nargs="+", help="Parsers to run, all by default")
+    args = argp.parse_args()
+
+    backends = ["html.parser"] + [b for b in args.backends if b != "html.parser"]
+    for backend in backends[1:]:
+        if importlib.util.find_spec(backend) is None:
+            print(f"Skipping {backend}, not installed", file=sys.stderr)
+            backends.remove(backend)
+
+    all_cases = fixtures.load()
+    failed = False
+    print(
+        f"{'parser':<12} {'backend':<12} {'ops/sec':>10} {'peak KiB':>10} "
+        f"{'speedup':>8} {'identical':>10} {'demo':>5}"
+    )
+    for name, cases in all_cases.items():
+        if args.parsers and name not in args.parsers:
+            continue
+        baseline = None
+        for backend in backends:
+            result = run(name, cases, backend, args.number)
+            if baseline is None:
+                baseline = result
+            identical = result["outputs"] == baseline["outputs"]
+            demo = all(
+                not result["outputs"][fixture].startswith("!")
+                and matches_demo(json.loads(result["outputs"][fixture]), expected)
+                for fixture, _, expected in cases
+            )
+            failed = failed or not identical
+            print(
+                f"{name:<12} {backend:<12} {result['ops']:>10.1f} {result['peak']:>10.1f} "
+                f"{result['ops'] / baseline['ops']:>7.2f}x {str(identical):>10} "
+                f"{'yes' if demo else 'no':>5}"
+            )
+            if not identical:
+                for fixture, output in result["outputs"].items():
+                    if output != baseline["outputs"][fixture]:
+                        print(f"  {fixture}: {output[:120]}", file=sys.stderr)
+
+    utils.PARSER_BACKEND = "html.parser"
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
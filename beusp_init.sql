@@ -1,3 +1,6 @@
+-- Schema version 0, upgraded by beusproxy/services/migrations.py
+PRAGMA user_version = 0;
+
 DROP TABLE IF EXISTS Students;
 DROP TABLE IF EXISTS Student_Sessions;
 DROP TABLE IF EXISTS Student_Grades;
@@ -5,6 +8,8 @@ DROP TABLE IF EXISTS Telegram_Subscribers;
 DROP TABLE IF EXISTS Discord_Subscribers;
 DROP TABLE IF EXISTS Email_Subscribers;
 DROP TABLE IF EXISTS Verifications;
+DROP TABLE IF EXISTS Grade_Events;
+DROP TABLE IF EXISTS Notify_Outbox;
 
 CREATE TABLE Students(
 	id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -7,8 +7,8 @@ from flask_cors import CORS
 from flask_restful import Api
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-from .config import (APP_NAME, BOT_ENABLED, DEBUG, FLASGGER_ENABLED,
-                     TMSAPI_OFFLINE)
+from .config import (APP_NAME, BOT_ENABLED, BOT_TELEGRAM_WEBHOOK_SECRET, DEBUG,
+                     FLASGGER_ENABLED, TMSAPI_OFFLINE)
 from .context import init_context
 from .resources import bot as bot_resources
 
@@ -36,8 +36,8 @@ def create_app():
 
     @app.teardown_appcontext
     def close_db(_):
-        """Close database connection"""
-        db = g.pop("db", None)
+        """Return database connection into pool"""
+        db = g.pop("_database", None)
         if db is not None:
             db.close()
 
@@ -75,6 +75,9 @@ def create_app():
     if BOT_ENABLED:
         api.add_resource(bot_resources.Bot, "/bot")
         api.add_resource(bot_resources.BotSubscribe, "/bot/subscribe")
+        api.add_resource(bot_resources.BotHistory, "/bot/history")
         api.add_resource(bot_resources.BotVerify, "/bot/verify/<code>")
+        if BOT_TELEGRAM_WEBHOOK_SECRET:
+            api.add_resource(bot_resources.BotTelegram, "/bot/telegram")
 
     return app
@@ -0,0 +1,99 @@
+"""Async Serving Mode
+
+aiohttp application serving ported endpoints natively,
+over a single pooled ClientSession per worker.
+Remaining endpoints are served by the Flask app through a WSGI bridge.
+"""
+
+import logging
+
+from aiohttp import ClientSession, ClientTimeout, DummyCookieJar, TCPConnector, web
+from werkzeug.exceptions import HTTPException
+
+from .. import create_app as create_wsgi_app
+from ..config import (DEBUG, HOST, REQUEST_TIMEOUT, TMSAPI_OFFLINE,
+                      UPSTREAM_ASYNC_LIMIT, USER_AGENT)
+from . import handlers
+from .handlers import httpc_key, json_response
+from .wsgi import wsgi_handler
+
+# Same as CORS config of Flask app
+CORS_ORIGINS = {"http://localhost:5173"}
+
+
+@web.middleware
+async def error_middleware(request, handler):
+    """Render flask_restful aborts the same way as Flask app"""
+    try:
+        response = await handler(request)
+    except HTTPException as e:
+        response = json_response(
+            getattr(e, "data", None) or {"message": e.description}, status=e.code
+        )
+
+    origin = request.headers.get("Origin")
+    if origin in CORS_ORIGINS and "Access-Control-Allow-Origin" not in response.headers:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+        response.headers["Vary"] = "Origin"
+
+    return response
+
+
+async def httpc_ctx(app):
+    """Pooled ClientSession of worker"""
+    app[httpc_key] = ClientSession(
+        connector=TCPConnector(limit=UPSTREAM_ASYNC_LIMIT),
+        timeout=ClientTimeout(total=REQUEST_TIMEOUT),
+        # Session is shared between students.
+        # Never store cookies set by root server.
+        cookie_jar=DummyCookieJar(),
+        headers={
+            "Host": HOST,
+            "User-Agent": USER_AGENT,
+        },
+    )
+    yield
+    await app[httpc_key].close()
+
+
+def create_app(*_):
+    """Async App Factory"""
+    if DEBUG:
+        logging.basicConfig(level=logging.DEBUG)
+
+    # Flask app initializes the context too
+    wsgi = wsgi_handler(create_wsgi_app())
+
+    app = web.Application(middlewares=[error_middleware])
+    app.cleanup_ctx.append(httpc_ctx)
+
+    if not TMSAPI_OFFLINE:
+        app.router.add_get("/resource/msg", handlers.msg)
+        app.router.add_get("/resource/grades/all", handlers.grades_all)
+        app.router.add_get("/resource/grades/latest", handlers.grades_latest)
+        app.router.add_get(
+            r"/resource/grades/{year:\d+}/{semester:\d+}", handlers.grades
+        )
+        app.router.add_get(
+            r"/resource/attendance/{course_code:\d+}", handlers.attendance_course
+        )
+        app.router.add_get(
+            r"/resource/attendance/{year:\d+}/{semester:\d+}", handlers.attendance
+        )
+        app.router.add_get(
+            r"/resource/program/{code:\d+}/{year:\d+}", handlers.program
+        )
+        app.router.add_get("/resource/studphoto", handlers.studphoto)
+        app.router.add_post("/auth", handlers.auth)
+        app.router.add_get("/logout", handlers.logout)
+        app.router.add_get("/verify", handlers.verify)
+        app.router.add_post("/settings", handlers.settings)
+        app.router.add_get("/status", handlers.status)
+        app.router.add_get("/readAnnounces", handlers.read_announce)
+        app.router.add_get("/resource/{resource}", handlers.res)
+
+    # Bot and Swagger endpoints
+    app.router.add_route("*", "/{tail:.*}", wsgi)
+
+    return app
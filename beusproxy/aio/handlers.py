@@ -0,0 +1,339 @@
+import asyncio
+import json
+import secrets
+from contextlib import aclosing, closing
+from functools import partial
+
+from aiohttp import ClientSession, hdrs, web
+from flask_restful import abort
+
+from ..common import pipeline
+from ..common.queries import add_session, bot_status, end_sessions, status_counts
+from ..common.utils import get_logger
+from ..config import BOT_ENABLED, PHOTO_MAX_AGE
+from ..context import c
+from ..services.database import get_db
+from ..services.photos import PhotoCache
+
+logger = get_logger(__name__)
+
+httpc_key = web.AppKey("httpc", ClientSession)
+
+# Same output as flask.jsonify
+dumps = partial(json.dumps, ensure_ascii=True, sort_keys=True, separators=(",", ":"))
+
+
+def json_response(page, status=200):
+    """JSON response, rendered like flask.jsonify"""
+    return web.json_response(page, status=status, dumps=dumps)
+
+
+def revalidated(request, response, etag):
+    """Tag a response with ETag and answer
+    matching If-None-Match with 304 Not Modified.
+    Same as common.utils.revalidated of Flask app.
+    """
+    if etag is None:
+        return response
+    response.etag = etag
+    response.headers[hdrs.CACHE_CONTROL] = "no-cache, private"
+    if any(e.value in (etag, "*") for e in request.if_none_match or ()):
+        response = web.Response(status=304, headers=response.headers)
+        del response.headers[hdrs.CONTENT_TYPE]
+    return response
+
+
+def cookie_arg(request, name, help_msg):
+    """Required cookie argument, like reqparse"""
+    if not (value := request.cookies.get(name)):
+        abort(400, message={name: help_msg})
+    return value
+
+
+async def json_args(request):
+    """JSON body arguments, empty if body is not a JSON object"""
+    try:
+        body = await request.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+def db_call(query, *args):
+    """Run a query function with a fresh database connection"""
+    with closing(get_db()) as db_con:
+        return query(db_con, *args)
+
+
+async def res(request):
+    """Resource Endpoint"""
+    resource = request.match_info["resource"]
+    sessid = cookie_arg(request, "SessionID", "Invalid sessionid")
+    entry = await pipeline.acached(
+        c.get("cache"),
+        sessid,
+        resource,
+        (),
+        partial(pipeline.aresource, request.app[httpc_key], resource, sessid),
+    )
+    page = entry.page
+    response = revalidated(request, json_response(page), entry.etag)
+
+    # Bake ImgID cookie if accessing home resource.
+    if resource == "home":
+        response.set_cookie("ImgID", page.get("image"))
+
+    return response
+
+
+async def msg(request):
+    """Messages Endpoint"""
+    return json_response(
+        await pipeline.amessages(
+            request.app[httpc_key],
+            cookie_arg(request, "SessionID", "Invalid sessionid"),
+        )
+    )
+
+
+async def grades(request):
+    """Grades Endpoint"""
+    return await _grades(
+        request, int(request.match_info["year"]), int(request.match_info["semester"])
+    )
+
+
+async def grades_all(request):
+    """All Grades Endpoint"""
+    return await _grades(request, 1, 1)
+
+
+async def _grades(request, year, semester):
+    """Cached grades of semester"""
+    sessid = cookie_arg(request, "SessionID", "Invalid sessionid")
+    entry = await pipeline.acached(
+        c.get("cache"),
+        sessid,
+        "grades",
+        (year, semester),
+        partial(
+            pipeline.grades(sessid, year, semester).arun, request.app[httpc_key]
+        ),
+    )
+    return revalidated(request, json_response(entry.page), entry.etag)
+
+
+async def grades_latest(request):
+    """Latest Grades Endpoint"""
+    return json_response(
+        await pipeline.agrades_latest(
+            request.app[httpc_key],
+            cookie_arg(request, "SessionID", "Invalid sessionid"),
+        )
+    )
+
+
+async def attendance(request):
+    """Attendance by year and semester Endpoint"""
+    return json_response(
+        await pipeline.attendance(
+            cookie_arg(request, "SessionID", "Invalid sessionid"),
+            int(request.match_info["year"]),
+            int(request.match_info["semester"]),
+        ).arun(request.app[httpc_key])
+    )
+
+
+async def attendance_course(request):
+    """Attendance by course Endpoint"""
+    return json_response(
+        await pipeline.attendance_course(
+            cookie_arg(request, "SessionID", "Invalid sessionid"),
+            int(request.match_info["course_code"]),
+        ).arun(request.app[httpc_key])
+    )
+
+
+async def program(request):
+    """Programs Endpoint"""
+    return json_response(
+        await pipeline.program(
+            cookie_arg(request, "SessionID", "Invalid sessionid"),
+            int(request.match_info["code"]),
+            int(request.match_info["year"]),
+        ).arun(request.app[httpc_key])
+    )
+
+
+def cacheable(response, etag):
+    """Let browsers reuse the photo.
+    Same as resources.studphoto of Flask app.
+    """
+    response.etag = etag
+    response.headers[hdrs.CACHE_CONTROL] = f"private, max-age={PHOTO_MAX_AGE}"
+    return response
+
+
+def read_photo(f):
+    """Read and close a cached photo"""
+    with f:
+        return f.read()
+
+
+async def studphoto(request):
+    """Student Photo Endpoint"""
+    sessid = cookie_arg(request, "SessionID", "Invalid sessionid")
+    img_id = cookie_arg(request, "ImgID", "Invalid imgid")
+    etag = PhotoCache.etag(img_id)
+
+    # Photo of an ImgID never changes,
+    # served without root server to its owner only
+    photos = c.get("photos")
+    not_modified = any(e.value in (etag, "*") for e in request.if_none_match or ())
+    body = None
+    if not not_modified and (f := await asyncio.to_thread(photos.get, img_id)):
+        body = await asyncio.to_thread(read_photo, f)
+    if not_modified or body is not None:
+        await pipeline.aphoto_owner(
+            c.get("cache"), request.app[httpc_key], sessid, img_id
+        )
+        if not_modified:
+            return cacheable(web.Response(status=304), etag)
+        return cacheable(web.Response(body=body, content_type="image/jpeg"), etag)
+
+    mid_res = await pipeline.studphoto(sessid, img_id).aopen(request.app[httpc_key])
+    try:
+        response = cacheable(web.StreamResponse(), etag)
+        response.content_type = "image/jpeg"
+        # Body is decoded by aiohttp if encoded
+        if (
+            mid_res.content_length is not None
+            and hdrs.CONTENT_ENCODING not in mid_res.headers
+        ):
+            response.content_length = mid_res.content_length
+        await response.prepare(request)
+        async with aclosing(
+            pipeline.achunks(mid_res, photos.writer(img_id))
+        ) as chunks:
+            async for chunk in chunks:
+                await response.write(chunk)
+        await response.write_eof()
+    finally:
+        mid_res.release()
+    return response
+
+
+async def verify(request):
+    """Session Verify Endpoint"""
+    await pipeline.verify(cookie_arg(request, "SessionID", "Invalid sessionid")).arun(
+        request.app[httpc_key]
+    )
+    return web.Response()
+
+
+async def settings(request):
+    """Settings Endpoint"""
+    sessid = cookie_arg(request, "SessionID", "Invalid sessionid")
+    lang = (await json_args(request)).get("lang") or request.query.get("lang")
+
+    if lang and str(lang).lower() in {"az", "en"}:
+        await pipeline.settings(sessid, str(lang)).arun(request.app[httpc_key])
+
+    return web.Response()
+
+
+async def read_announce(request):
+    """Read Announce Endpoint"""
+    await pipeline.read_announce(
+        cookie_arg(request, "SessionID", "Invalid sessionid")
+    ).arun(request.app[httpc_key])
+    return web.Response()
+
+
+async def auth(request):
+    """Authentication Endpoint"""
+    args = await json_args(request)
+    for arg in ("studentId", "password"):
+        if args.get(arg) is None:
+            abort(400, message={arg: "Missing the credential parameter in the JSON body"})
+
+    student_id = str(args["studentId"])
+    password = str(args["password"])
+
+    if not student_id or not password:
+        abort(400, help="Invalid credentials")
+
+    # Generate secure session_id
+    sessid = await pipeline.auth(student_id, password, secrets.token_hex(32)).arun(
+        request.app[httpc_key]
+    )
+    logger.info("Student %s has logged in", student_id)
+
+    await asyncio.to_thread(db_call, add_session, student_id, sessid)
+
+    # Sending out freshly baked cookies
+    response = web.Response()
+    response.set_cookie("SessionID", sessid)
+    response.set_cookie("StudentID", student_id)
+    return response
+
+
+async def logout(request):
+    """LogOut Endpoint"""
+    sessid = cookie_arg(request, "SessionID", "Invalid sessionid")
+    student_id = cookie_arg(request, "StudentID", "Invalid studentid")
+
+    session_ids = await asyncio.to_thread(db_call, end_sessions, student_id, sessid)
+
+    # Logging out of all sessions with fetched session_ids
+    ress = await asyncio.gather(
+        *[
+            pipeline.logout(session_id).arun(request.app[httpc_key])
+            for session_id in session_ids
+        ]
+    )
+
+    # Cached responses of ended sessions
+    for session_id in session_ids:
+        await asyncio.to_thread(c.get("cache").invalidate, session_id)
+
+    if not ress or ress[0] != 302:
+        abort(400, help="Couldn't logout")
+
+    logger.info("Student %s has logged out", student_id)
+
+    # Getting rid of spoiled cookies.
+    response = web.Response()
+    response.set_cookie("SessionID", "", samesite="Lax")
+    response.set_cookie("StudentID", "", samesite="Lax")
+    return response
+
+
+async def status(request):
+    """Status Endpoint"""
+    httpc = request.app[httpc_key]
+    status_table = {"botEnabled": BOT_ENABLED}
+
+    await asyncio.to_thread(db_call, status_counts, status_table)
+    if BOT_ENABLED:
+        await asyncio.to_thread(db_call, bot_status, status_table)
+
+    # Check root server status.
+    # Advanced status check returns hashsums of given files.
+    status_table["rootServerIsUp"], *digests = await asyncio.gather(
+        pipeline.root_status().arun(httpc),
+        *(
+            [pipeline.static_hash(hash_file).arun(httpc) for hash_file in pipeline.hash_files]
+            if request.query.get("advanced")
+            else []
+        ),
+    )
+
+    if request.query.get("advanced"):
+        status_table["sha256sums"] = [
+            f"{digest} {hash_file.split('/')[-1]}"
+            for digest, hash_file in zip(digests, pipeline.hash_files)
+            if digest
+        ]
+
+    return json_response(status_table)
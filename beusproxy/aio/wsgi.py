@@ -0,0 +1,85 @@
+import asyncio
+import io
+import sys
+
+from aiohttp import web
+from multidict import CIMultiDict
+
+# Recomputed by aiohttp for the returned body.
+_skip_headers = {"content-length", "transfer-encoding", "connection"}
+
+
+def wsgi_handler(wsgi_app):
+    """Serve a WSGI app from aiohttp
+    Used for endpoints which are not ported to async yet.
+    WSGI app runs in the default executor.
+
+    Args:
+        wsgi_app (callable): WSGI application
+
+    Returns:
+        coroutine: aiohttp handler
+    """
+
+    async def handler(request):
+        body = await request.read()
+        environ = _environ(request, body)
+
+        def call():
+            started = {}
+
+            def start_response(status, headers, exc_info=None):
+                # pylint: disable=W0613
+                started["status"] = status
+                started["headers"] = headers
+
+            chunks = wsgi_app(environ, start_response)
+            try:
+                content = b"".join(chunks)
+            finally:
+                if hasattr(chunks, "close"):
+                    chunks.close()
+            return started, content
+
+        started, content = await asyncio.get_running_loop().run_in_executor(None, call)
+
+        return web.Response(
+            status=int(started["status"].split(" ", 1)[0]),
+            headers=CIMultiDict(
+                (k, v) for k, v in started["headers"] if k.lower() not in _skip_headers
+            ),
+            body=content,
+        )
+
+    return handler
+
+
+def _environ(request, body):
+    """Build WSGI environ of aiohttp request"""
+    host, _, port = (request.host or "localhost").partition(":")
+    environ = {
+        "REQUEST_METHOD": request.method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": request.path.encode("UTF-8").decode("latin-1"),
+        "QUERY_STRING": request.query_string,
+        "SERVER_NAME": host,
+        "SERVER_PORT": port or ("443" if request.secure else "80"),
+        "SERVER_PROTOCOL": f"HTTP/{request.version.major}.{request.version.minor}",
+        "REMOTE_ADDR": request.remote or "",
+        "CONTENT_TYPE": request.headers.get("Content-Type", ""),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": request.scheme,
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for k, v in request.headers.items():
+        k = k.upper().replace("-", "_")
+        if k in {"CONTENT_TYPE", "CONTENT_LENGTH"}:
+            continue
+        k = f"HTTP_{k}"
+        environ[k] = f"{environ[k]},{v}" if k in environ else v
+    return environ
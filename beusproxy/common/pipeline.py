@@ -0,0 +1,814 @@
+"""Fetch & Parse Pipelines
+
+Upstream calls of resources and handling of their replies.
+Shared by blocking (WSGI) and async serving modes.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+
+from aiohttp import ClientError
+from flask_restful import abort
+from requests import RequestException
+from requests.structures import CaseInsensitiveDict
+
+from .. import parser
+from ..config import ROOT
+from ..services.cache import CacheEntry
+from ..services.upstream import session_cookie
+from .utils import get_logger, is_expired, is_there_msg, page_doc
+
+logger = get_logger(__name__)
+
+# Root server pages served by Res
+tms_pages = {
+    "home": "home",
+    "grades": "grades",
+    "faq": "faq",
+    "announces": "elan",
+    #    "deps": "viewdeps",
+    "transcript": "transkript",
+}
+
+# Seconds parsed resources are cached for, per session
+cache_ttls = {
+    "home": 300,
+    "grades": 60,
+    "transcript": 600,
+    "faq": 6 * 3600,
+}
+
+# Bytes read at once from streamed replies
+CHUNK_SIZE = 64 * 1024
+
+# Files to calculate the sha256 hashsum of.
+hash_files = [
+    "/index.php",
+    "/common/general.js",
+    "/dist/js/adminlte.js",
+    "/dist/js/demo.js",
+    "/dist/js/datepicker-simple.js",
+    "/bower_components/jquery/dist/jquery.min.js",
+    "/bower_components/bootstrap/dist/js/bootstrap.min.js",
+]
+
+
+class Reply:
+    """Upstream Reply Model"""
+
+    def __init__(self, status, headers, content, text=None):
+        self.status = status
+        self.headers = headers
+        self.content = content
+        self.text = text
+
+
+class Call:
+    """Upstream Call Model
+
+    Describes a single request to root server
+    and how its reply is turned into a page.
+    """
+
+    def __init__(
+        self,
+        method,
+        url=ROOT,
+        *,
+        handler,
+        sessid=None,
+        stud_ar=True,
+        binary=False,
+        **kwargs,
+    ):
+        # pylint: disable=R0913
+        self.method = method
+        self.url = url
+        self.handler = handler
+        self.sessid = sessid
+        self.stud_ar = stud_ar
+        self.binary = binary
+        self.kwargs = kwargs
+
+    def run(self, upstream):
+        """Run the call, blocking
+
+        Args:
+            upstream (UpstreamClient): Upstream client
+
+        Returns:
+            any: Handler output
+        """
+        try:
+            res = upstream.request(
+                self.method,
+                self.url,
+                sessid=self.sessid,
+                stud_ar=self.stud_ar,
+                **self.kwargs,
+            )
+            reply = Reply(
+                res.status_code,
+                res.headers,
+                res.content,
+                None if self.binary else res.text,
+            )
+        except RequestException as ce:
+            logger.error(ce)
+            abort(502, help="Bad response from root server")
+
+        return self.handler(reply)
+
+    async def arun(self, httpc):
+        """Run the call as a coroutine
+
+        Args:
+            httpc (ClientSession): Shared aiohttp session
+
+        Returns:
+            any: Handler output
+        """
+        kwargs = dict(self.kwargs)
+        headers = kwargs.pop("headers", {})
+        if self.sessid is not None:
+            headers["Cookie"] = session_cookie(self.sessid, stud_ar=self.stud_ar)
+
+        try:
+            async with httpc.request(
+                self.method, self.url, headers=headers, **kwargs
+            ) as res:
+                content = await res.read()
+                reply = Reply(
+                    res.status,
+                    CaseInsensitiveDict(
+                        {k: ", ".join(res.headers.getall(k)) for k in res.headers}
+                    ),
+                    content,
+                    None if self.binary else await res.text(),
+                )
+        except (ClientError, asyncio.TimeoutError) as ce:
+            logger.error(ce)
+            abort(502, help="Bad response from root server")
+
+        return self.handler(reply)
+
+    def open(self, upstream):
+        """Run the call keeping the body unread, blocking.
+        Handler checks the reply without content.
+
+        Args:
+            upstream (UpstreamClient): Upstream client
+
+        Returns:
+            Response: Streamed response, to be closed by caller
+        """
+        try:
+            res = upstream.request(
+                self.method,
+                self.url,
+                sessid=self.sessid,
+                stud_ar=self.stud_ar,
+                stream=True,
+                **self.kwargs,
+            )
+        except RequestException as ce:
+            logger.error(ce)
+            abort(502, help="Bad response from root server")
+
+        try:
+            self.handler(Reply(res.status_code, res.headers, None))
+        except Exception:
+            res.close()
+            raise
+        return res
+
+    async def aopen(self, httpc):
+        """Run the call keeping the body unread, as a coroutine.
+        Handler checks the reply without content.
+
+        Args:
+            httpc (ClientSession): Shared aiohttp session
+
+        Returns:
+            ClientResponse: Streamed response, to be released by caller
+        """
+        kwargs = dict(self.kwargs)
+        headers = kwargs.pop("headers", {})
+        if self.sessid is not None:
+            headers["Cookie"] = session_cookie(self.sessid, stud_ar=self.stud_ar)
+
+        try:
+            res = await httpc.request(self.method, self.url, headers=headers, **kwargs)
+        except (ClientError, asyncio.TimeoutError) as ce:
+            logger.error(ce)
+            abort(502, help="Bad response from root server")
+
+        try:
+            self.handler(Reply(res.status, res.headers, None))
+        except Exception:
+            res.release()
+            raise
+        return res
+
+
+def chunks(res, writer):
+    """Body of a streamed response, teed into writer.
+    Writer is committed only if body is read completely.
+
+    Args:
+        res (Response): Streamed response
+        writer (PhotoWriter): Writer of body
+
+    Yields:
+        bytes: Chunk of body
+    """
+    try:
+        with res, writer:
+            for chunk in res.iter_content(CHUNK_SIZE):
+                writer.write(chunk)
+                yield chunk
+    except RequestException as ce:
+        logger.error(ce)
+
+
+async def achunks(res, writer):
+    """Body of a streamed response, teed into writer, as an async generator
+
+    Args:
+        res (ClientResponse): Streamed response
+        writer (PhotoWriter): Writer of body
+
+    Yields:
+        bytes: Chunk of body
+    """
+    try:
+        with writer:
+            async with res:
+                async for chunk in res.content.iter_chunked(CHUNK_SIZE):
+                    writer.write(chunk)
+                    yield chunk
+    except (ClientError, asyncio.TimeoutError) as ce:
+        logger.error(ce)
+
+
+def _ok_text(reply):
+    """Text of a 200 reply from an active session"""
+    if not reply.status == 200:
+        abort(502, help="Bad response from root server")
+    if is_expired(reply.text):
+        abort(401, help="errorApiUnauthorized")
+    return reply.text
+
+
+def _ok_ajax(reply):
+    """DATA of a successful AJAX reply"""
+    ajax = json.loads(_ok_text(reply))
+    if int(ajax["CODE"]) < 1:
+        abort(400, help=f"Proxy server returned CODE {ajax['CODE']}")
+    return ajax["DATA"]
+
+
+def _grades_page(reply):
+    text = _ok_ajax(reply)
+    if (
+        not text.find(
+            "There aren't any registered section for the selected year-term."
+        )
+        == -1
+    ):
+        abort(
+            400,
+            help="There aren't any registered section for the selected year-term",
+        )
+    return parser.grades2(text)
+
+
+def _attendance_page(reply):
+    text = _ok_text(reply)
+    if not text.find("No section found.") == -1:
+        abort(400, help="No section found")
+    return parser.attendance2(text)
+
+
+def _attendance_course_page(reply):
+    ajax = json.loads(_ok_text(reply))
+    if int(ajax["CODE"]) < 1:
+        abort(400, help=ajax["DATA"])
+    return parser.attendance3(ajax["DATA"])
+
+
+def _program_page(reply):
+    page = parser.program2(_ok_text(reply))
+    if not page:
+        abort(404, help="Not Found")
+    return page
+
+
+def _studphoto_page(reply):
+    if not reply.status == 200:
+        abort(502, help="Bad response from root server")
+    # Expired sessions get an HTML page instead
+    if not reply.headers.get("Content-Type", "").startswith("image/"):
+        abort(401, help="errorApiUnauthorized")
+    return reply.content
+
+
+def _settings_page(reply):
+    if reply.status != 200:
+        abort(400, help="Invalid Language")
+
+
+def _auth_page(reply):
+    # Respond with 401 if it was not redirected.
+    if reply.status == 200:
+        abort(401, help="Bad credentials")
+
+    if not reply.status == 302:
+        abort(502, help="Bad response from root server")
+
+    cookies = reply.headers.get("Set-Cookie")
+
+    # Preventing unusual behaviour of the root server.
+    if not cookies:
+        logger.error("Couldn't get the cookies")
+        abort(502, help="Bad response from root server")
+
+    # Eating cookies...
+    sessid = None
+    for header in cookies.replace(" ", "").split(";"):
+        if not header.find("PHPSESSID") == -1:
+            sessid = header.split("=")[1]
+    return sessid
+
+
+def _msg_text(reply):
+    if reply.status == 200:
+        return reply.text
+    return None
+
+
+def _static_hash(reply):
+    if reply.status == 200:
+        return hashlib.sha256(reply.text.encode("UTF-8")).hexdigest()
+    return None
+
+
+def page(resource, sessid):
+    """Root server page of a resource
+
+    Args:
+        resource (str): Resource, key of tms_pages
+        sessid (str): Student session_id
+
+    Returns:
+        Call: Call returning page HTML
+    """
+    return Call("GET", f"{ROOT}?mod={tms_pages[resource]}", sessid=sessid, handler=_ok_text)
+
+
+def msgs(sessid):
+    """Messages page"""
+    return Call("GET", params={"mod": "msg"}, sessid=sessid, handler=_ok_text)
+
+
+def read_msg(sessid, msg_id):
+    """Read a message
+
+    Args:
+        sessid (str): Student session_id
+        msg_id (str): Message id
+
+    Returns:
+        Call: Call returning raw message or None
+    """
+    return Call(
+        "POST",
+        data={
+            "ajx": 1,
+            "mod": "msg",
+            "action": "ShowReceivedMessage",
+            "sm_id": msg_id,
+        },
+        sessid=sessid,
+        stud_ar=False,
+        handler=_msg_text,
+    )
+
+
+def read_announce(sessid):
+    """Read announces of student"""
+    return Call(
+        "POST",
+        data={
+            "btnRead": "Oxudum",
+        },
+        headers={
+            "Cookie": f"PHPSESSID={sessid}; uname=240218019; BEU_STUD_AR=0; ",
+        },
+        handler=lambda _: None,
+    )
+
+
+def grades(sessid, year, semester):
+    """Grades in given semester
+
+    Year 1, semester 1 returns all grades.
+    """
+    return Call(
+        "POST",
+        data={
+            "ajx": 1,
+            "mod": "grades",
+            "action": "GetGrades",
+            "yt": f"{year}#{semester}",
+            round(time.time()): "",
+        },
+        sessid=sessid,
+        handler=_grades_page,
+    )
+
+
+def attendance(sessid, year, semester):
+    """Attendance in given semester"""
+    return Call(
+        "POST",
+        data={
+            "ajx": 1,
+            "mod": "ejurnal",
+            "action": "getCourses",
+            "ysem": f"{year}#{semester}",
+        },
+        sessid=sessid,
+        handler=_attendance_page,
+    )
+
+
+def attendance_course(sessid, course_code):
+    """Attendance of given course"""
+    return Call(
+        "POST",
+        data={
+            "ajx": 1,
+            "mod": "ejurnal",
+            "action": "viewCourse",
+            "derst": course_code,
+        },
+        sessid=sessid,
+        handler=_attendance_course_page,
+    )
+
+
+def deps(sessid, dep_code):
+    """Department by department code"""
+    return Call(
+        "GET",
+        params={
+            "mod": "viewdeps",
+            "d": dep_code,
+        },
+        sessid=sessid,
+        handler=lambda reply: parser.deps2(_ok_text(reply)),
+    )
+
+
+def program(sessid, code, year):
+    """Program by code and year"""
+    return Call(
+        "GET",
+        params={
+            "mod": "progman",
+            "pc": code,
+            "py": year,
+        },
+        sessid=sessid,
+        handler=_program_page,
+    )
+
+
+def verify(sessid):
+    """Session verification"""
+    return Call("POST", data={"ajx": 1}, sessid=sessid, handler=_ok_text)
+
+
+def settings(sessid, lang):
+    """Change interface language"""
+    return Call(
+        "GET",
+        params={
+            "mod": "setting",
+            "a": "update_interface_lang",
+            "lang": lang.upper(),
+        },
+        sessid=sessid,
+        handler=_settings_page,
+    )
+
+
+def studphoto(sessid, img_id):
+    """Student photo
+
+    Returns:
+        Call: Call returning photo, or to be opened for streaming
+    """
+    return Call(
+        "GET",
+        f"{ROOT}stud_photo.php",
+        params={
+            "ses": img_id,
+        },
+        sessid=sessid,
+        binary=True,
+        handler=_studphoto_page,
+    )
+
+
+def auth(student_id, password, sessid):
+    """Authenticate the student_id with session_id
+
+    Returns:
+        Call: Call returning session_id given by root server
+    """
+    return Call(
+        "POST",
+        f"{ROOT}auth.php",
+        data={
+            "username": student_id,
+            "password": password,
+            "LogIn": "",
+        },
+        sessid=sessid,
+        stud_ar=False,
+        allow_redirects=False,
+        handler=lambda reply: _auth_page(reply) or sessid,
+    )
+
+
+def logout(sessid):
+    """Log out of a session
+
+    Returns:
+        Call: Call returning status code
+    """
+    return Call(
+        "GET",
+        f"{ROOT}logout.php",
+        sessid=sessid,
+        allow_redirects=False,
+        handler=lambda reply: reply.status,
+    )
+
+
+def root_status():
+    """Root server status
+
+    Returns:
+        Call: Call returning whether root server is up
+    """
+    return Call("GET", handler=lambda reply: reply.status == 200)
+
+
+def static_hash(hash_file):
+    """Hashsum of a static file in root server
+
+    Returns:
+        Call: Call returning sha256 hexdigest or None
+    """
+    return Call(
+        "GET",
+        ROOT + hash_file,
+        allow_redirects=False,
+        handler=_static_hash,
+    )
+
+
+def resource(upstream, res, sessid):
+    """Fetch & parse a resource
+
+    Args:
+        upstream (UpstreamClient): Upstream client
+        res (str): Resource, key of tms_pages
+        sessid (str): Student session_id
+
+    Returns:
+        dict: Parsed page
+    """
+    page_parser = _page_parser(res)
+
+    # Retry after reading messages
+    for i in range(2):
+        # Page is parsed at most once
+        doc = page_doc(page(res, sessid).run(upstream))
+        if not is_there_msg(doc):
+            return page_parser(doc)
+        if i == 1:
+            abort(502, help="Bad response from root server")
+        read_msgs(upstream, sessid, parser.msg_id(doc))
+    return None
+
+
+async def aresource(httpc, res, sessid):
+    """Fetch & parse a resource, as a coroutine
+
+    Args:
+        httpc (ClientSession): Shared aiohttp session
+        res (str): Resource, key of tms_pages
+        sessid (str): Student session_id
+
+    Returns:
+        dict: Parsed page
+    """
+    page_parser = _page_parser(res)
+
+    # Retry after reading messages
+    for i in range(2):
+        # Page is parsed at most once
+        doc = page_doc(await page(res, sessid).arun(httpc))
+        if not is_there_msg(doc):
+            return page_parser(doc)
+        if i == 1:
+            abort(502, help="Bad response from root server")
+        await aread_msgs(httpc, sessid, parser.msg_id(doc))
+    return None
+
+
+def _page_parser(res):
+    """Parser function of a resource"""
+    # Prevent accessing not assigned resources.
+    if not tms_pages.get(res):
+        abort(404)
+
+    # Trying to get respective parser function.
+    try:
+        return getattr(parser, res)
+    except AttributeError:
+        abort(404)
+    return None
+
+
+def messages(upstream, sessid):
+    """Fetch & parse all messages"""
+    text = msgs(sessid).run(upstream)
+    return [
+        parser.msg2(msg_raw)
+        for msg_raw in read_msgs(upstream, sessid, parser.msg(text))
+    ]
+
+
+async def amessages(httpc, sessid):
+    """Fetch & parse all messages, as a coroutine"""
+    text = await msgs(sessid).arun(httpc)
+    return [
+        parser.msg2(msg_raw)
+        for msg_raw in await aread_msgs(httpc, sessid, parser.msg(text))
+    ]
+
+
+def read_msgs(upstream, sessid, msg_ids):
+    """Read messages of student
+
+    Args:
+        upstream (UpstreamClient): Upstream client
+        sessid (str): Student session_id
+        msg_ids (list): List of message ids to be read
+
+    Returns:
+        list: List of raw messages, read concurrently
+    """
+    msgs_raw = upstream.map(lambda i: read_msg(sessid, i).run(upstream), msg_ids)
+    return [msg_raw for msg_raw in msgs_raw if msg_raw is not None]
+
+
+async def aread_msgs(httpc, sessid, msg_ids):
+    """Read messages of student concurrently"""
+    msgs_raw = await asyncio.gather(
+        *[read_msg(sessid, i).arun(httpc) for i in msg_ids]
+    )
+    return [msg_raw for msg_raw in msgs_raw if msg_raw is not None]
+
+
+def grades_latest(upstream, sessid):
+    """Fetch & parse grades of latest semester.
+    Composes grades resource and grades page in-process.
+
+    Args:
+        upstream (UpstreamClient): Upstream client
+        sessid (str): Student session_id
+
+    Returns:
+        dict: Parsed grades
+    """
+    year, semester = _latest_semester(resource(upstream, "grades", sessid))
+    return grades(sessid, year, semester).run(upstream)
+
+
+async def agrades_latest(httpc, sessid):
+    """Fetch & parse grades of latest semester, as a coroutine"""
+    year, semester = _latest_semester(await aresource(httpc, "grades", sessid))
+    return await grades(sessid, year, semester).arun(httpc)
+
+
+def _latest_semester(grades_page):
+    """Year and semester of last grades entry"""
+    if not grades_page.get("entries"):
+        abort(502, help="Bad response from root server")
+    return grades_page["entries"][-1]["year"], grades_page["entries"][-1]["semester"]
+
+
+def photo_owner(cache, upstream, sessid, img_id):
+    """Check that session is active and ImgID is of its student,
+    before serving a cached photo. ImgID is on home page,
+    which is served from cache mostly.
+
+    Args:
+        cache (ResponseCache): Response cache
+        upstream (UpstreamClient): Upstream client
+        sessid (str): Student session_id
+        img_id (str): ImgID
+    """
+    entry = cached(
+        cache, sessid, "home", (), lambda: resource(upstream, "home", sessid)
+    )
+    if entry.page.get("image") != img_id:
+        abort(401, help="errorApiUnauthorized")
+
+
+async def aphoto_owner(cache, httpc, sessid, img_id):
+    """Check that session owns ImgID, as a coroutine
+
+    Args:
+        cache (ResponseCache): Response cache
+        httpc (ClientSession): Shared aiohttp session
+        sessid (str): Student session_id
+        img_id (str): ImgID
+    """
+    entry = await acached(
+        cache, sessid, "home", (), lambda: aresource(httpc, "home", sessid)
+    )
+    if entry.page.get("image") != img_id:
+        abort(401, help="errorApiUnauthorized")
+
+
+def cached(cache, sessid, res, params, fetch):
+    """Serve a parsed resource from cache, fetching it on miss.
+    Resources without a TTL are never cached.
+
+    Args:
+        cache (ResponseCache): Response cache
+        sessid (str): Student session_id
+        res (str): Resource, key of cache_ttls
+        params (tuple): Resource parameters
+        fetch (callable): Fetch & parse the resource
+
+    Returns:
+        CacheEntry: Entry, etag is None if not cached
+    """
+    if not cache.enabled or (ttl := cache_ttls.get(res)) is None:
+        return CacheEntry(fetch(), None)
+
+    key = cache.key(sessid, res, *params)
+    try:
+        if (entry := cache.get(key)) is not None:
+            return entry
+    except sqlite3.Error as e:
+        logger.error("Response cache: %s", e)
+
+    result = fetch()
+    try:
+        return cache.put(sessid, key, result, ttl)
+    except sqlite3.Error as e:
+        logger.error("Response cache: %s", e)
+    return CacheEntry(result, None)
+
+
+async def acached(cache, sessid, res, params, fetch):
+    """Serve a parsed resource from cache, as a coroutine
+
+    Args:
+        cache (ResponseCache): Response cache
+        sessid (str): Student session_id
+        res (str): Resource, key of cache_ttls
+        params (tuple): Resource parameters
+        fetch (callable): Coroutine function to fetch & parse the resource
+
+    Returns:
+        CacheEntry: Entry, etag is None if not cached
+    """
+    if not cache.enabled or (ttl := cache_ttls.get(res)) is None:
+        return CacheEntry(await fetch(), None)
+
+    key = cache.key(sessid, res, *params)
+    try:
+        if (entry := await asyncio.to_thread(cache.get, key)) is not None:
+            return entry
+    except sqlite3.Error as e:
+        logger.error("Response cache: %s", e)
+
+    result = await fetch()
+    try:
+        return await asyncio.to_thread(cache.put, sessid, key, result, ttl)
+    except sqlite3.Error as e:
+        logger.error("Response cache: %s", e)
+    return CacheEntry(result, None)
@@ -0,0 +1,163 @@
+"""Database Queries
+
+Queries of resources.
+Shared by blocking (WSGI) and async serving modes.
+"""
+
+import time
+from datetime import datetime
+
+from flask_restful import abort
+
+from ..services.telegram_proc import telegram_status
+
+
+def add_session(db_con, student_id, sessid):
+    """Register student if not present and push new session_id
+
+    Args:
+        db_con (sqlite3.Connection): Database connection
+        student_id (str): Student ID
+        sessid (str): Student session_id
+    """
+    db_cur = db_con.cursor()
+
+    # Update student information, adding new student
+    # without password if it's not present
+    db_cur.execute(
+        """
+        INSERT INTO Students (student_id, password)
+        VALUES (?, '')
+        ON CONFLICT (student_id) DO NOTHING;
+    """,
+        (student_id,),
+    )
+
+    db_res = db_cur.execute(
+        """
+        SELECT id FROM Students
+        WHERE student_id = ?;
+    """,
+        (student_id,),
+    ).fetchone()
+
+    if db_res is None:
+        db_con.rollback()
+        abort(400, help="Unknown error")
+    db_con.commit()
+
+    # Pushing new session_id
+    db_cur.execute(
+        """
+        INSERT INTO Student_Sessions(owner_id, session_id, login_date)
+        VALUES (?, ?, ?);
+    """,
+        (db_res["id"], sessid, datetime.now().isoformat()),
+    )
+    db_con.commit()
+
+
+def end_sessions(db_con, student_id, sessid):
+    """Mark all sessions of student as logged out
+
+    Args:
+        db_con (sqlite3.Connection): Database connection
+        student_id (str): Student ID
+        sessid (str): Current session_id of student
+
+    Returns:
+        list: session_ids which were not logged out, latest first
+    """
+    db_cur = db_con.cursor()
+
+    # Querying current session to see if it exists
+    db_res = db_cur.execute(
+        """
+        SELECT ss.owner_id FROM Student_Sessions ss
+        INNER JOIN Students s
+        ON ss.owner_id = s.id
+        WHERE s.student_id = ? AND ss.session_id = ? AND ss.logged_out = 0
+        LIMIT 1;
+    """,
+        (student_id, sessid),
+    ).fetchone()
+    if db_res is None:
+        abort(400, help="Couldn't logout")
+
+    # Querying all sessions with ids which are not logged out yet
+    owner_id = db_res["owner_id"]
+    db_res = db_cur.execute(
+        """
+        SELECT ss.session_id FROM Student_Sessions ss
+        WHERE ss.owner_id = ? AND ss.logged_out = 0
+        ORDER BY ss.login_date DESC;
+    """,
+        (owner_id,),
+    ).fetchall()
+    if len(db_res) == 0:
+        abort(400, help="Couldn't logout")
+
+    # Updating database all sessions with fetched ids
+    db_cur.execute(
+        """
+        UPDATE Student_Sessions
+        SET logged_out = 1
+        WHERE owner_id = ?
+    """,
+        (owner_id,),
+    )
+    db_con.commit()
+
+    return [row["session_id"] for row in db_res]
+
+
+def status_counts(db_con, status_table):
+    """Fill students and subscriptions count
+
+    Args:
+        db_con (sqlite3.Connection): Database connection
+        status_table (dict): Status table to fill
+    """
+    db_cur = db_con.cursor()
+
+    # Get students count.
+    db_res = db_cur.execute(
+        """
+        SELECT COUNT(id) AS c FROM Students;
+    """
+    ).fetchone()
+    if db_res:
+        status_table["studentsRegistered"] = db_res["c"]
+
+    # Get total subscribers count.
+    db_res = db_cur.execute(
+        """
+        SELECT ts + es + ds as c FROM
+            (SELECT count(telegram_id) as ts FROM Telegram_Subscribers) JOIN
+            (SELECT count(email_id) as es FROM Email_Subscribers) JOIN
+            (SELECT count(discord_id) as ds FROM Discord_Subscribers);
+    """
+    ).fetchone()
+    if db_res:
+        status_table["subscriptions"] = db_res["c"]
+
+
+def bot_status(db_con, status_table):
+    """Fill liveness of bot workers and Telegram process
+
+    Args:
+        db_con (sqlite3.Connection): Database connection
+        status_table (dict): Status table to fill
+    """
+    # Workers heartbeat into Bot_Workers, see bot/leases.py
+    db_res = db_con.execute(
+        """
+        SELECT COUNT(*) AS c FROM Bot_Workers
+        WHERE expires >= ?;
+    """,
+        (time.time(),),
+    ).fetchone()
+    if db_res:
+        status_table["botWorkers"] = db_res["c"]
+
+    status_table["telegram"] = telegram_status()
@@ -1,19 +1,15 @@
-import asyncio
 import json
 import logging
 import os
 import random
-import sqlite3
-import requests
 from datetime import datetime
 
-import aiohttp
 from bs4 import BeautifulSoup
 from dateutil import parser
-from flask import abort, g, logging as flogging
+from flask import abort, g, request, logging as flogging
 
-from ..config import DATABASE, DEMO_FOLDER, HOST, ROOT, USER_AGENT, REQUEST_TIMEOUT
-from ..services.email import EmailClient
+from ..config import DEMO_FOLDER, PARSER_BACKEND
+from ..services import database
 
 def get_logger(name=None):
     """Get a logger
@@ -29,89 +25,65 @@ def get_logger(name=None):
     return logger
 
 
+# Style of unread message spans
+MSG_STYLE = "color:#1E1E1E ;font-weight:bold"
+
+
+def make_soup(markup, backend=None):
+    """Parse markup with configured parser backend.
+    Already parsed documents are returned as is,
+    so one document can be shared between parsers.
+    lxml wraps fragments in html and body tags,
+    they are unwrapped so that top-level lookups
+    match the ones of html.parser.
+
+    Args:
+        markup (str | BeautifulSoup): HTML input or parsed document
+        backend (str): Tree builder, PARSER_BACKEND if not given
+
+    Returns:
+        BeautifulSoup: Parsed document
+    """
+    if isinstance(markup, BeautifulSoup):
+        return markup
+    backend = backend or PARSER_BACKEND
+    soup = BeautifulSoup(markup, backend)
+    if backend == "lxml" and "<html" not in markup[:1024].lower():
+        for tag in (soup.head, soup.body, soup.html):
+            if tag is not None:
+                tag.unwrap()
+    return soup
+
+
 def get_db():
     """Get a database connection.
-    Create one if doesn't exist in appcontext.
+    Check out one from pool if doesn't exist in appcontext.
     """
     db = getattr(g, "_database", None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+        db = g._database = database.get_db()
     return db
 
-def get_emailc():
-    """Get an email client.
-    Create one if doesn't exist in appcontext.
-    """
-    emailc = getattr(g, "_emailc", None)
-    if emailc is None:
-        emailc = g._database = EmailClient()
-    return emailc
-
 
-def read_announce(sessid):
-    """Read announces of student
+def revalidated(response, etag):
+    """Tag a response with ETag and answer
+    matching If-None-Match with 304 Not Modified.
+    Clients always revalidate, server cache decides freshness.
 
     Args:
-        sessid (str): Student session_id
-    """
-    requests.request(
-        "POST",
-        ROOT,
-        data={
-            "btnRead": "Oxudum",
-        },
-        headers={
-            "Host": HOST,
-            "Cookie": f"PHPSESSID={sessid}; uname=240218019; BEU_STUD_AR=0; ",
-            "User-Agent": USER_AGENT,
-        },
-        timeout=REQUEST_TIMEOUT,
-    )
-
-
-def read_msgs(sessid, msg_ids):
-    """Read messages of student
-
-    Args:
-        sessid (str): Student session_id
-        msg_ids (list): List of message ids to be read
+        response (Response): Flask response
+        etag (str): Entity tag, None to skip
 
     Returns:
-        list: List of responses
+        Response: Flask response
     """
+    if etag is None:
+        return response
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
-    async def read_msgs_coro():
-        async with aiohttp.ClientSession() as httpc:
-            results = await asyncio.gather(
-                *[
-                    httpc.request(
-                        "POST",
-                        ROOT,
-                        data={
-                            "ajx": 1,
-                            "mod": "msg",
-                            "action": "ShowReceivedMessage",
-                            "sm_id": id,
-                        },
-                        headers={
-                            "Host": HOST,
-                            "Cookie": f"PHPSESSID={sessid}; ",
-                            "User-Agent": USER_AGENT,
-                        },
-                    )
-                    for id in msg_ids
-                ]
-            )
-
-            msgs_raw = []
-            for res in results:
-                if res.status == 200:
-                    msgs_raw.append(await res.text())
-
-            return msgs_raw
-
-    return asyncio.run(read_msgs_coro())
 
 def verify_code_gen(length):
     """Generate verification code of given length
@@ -193,19 +165,38 @@ def is_announce(html):
     return False
 
 
+def page_doc(html):
+    """Document of a page, shared by message checks and parsers.
+    Parsed only if message style is present in the page,
+    otherwise the page itself is returned.
+
+    Args:
+        html (str): HTML input
+
+    Returns:
+        str | BeautifulSoup: HTML input or parsed document
+    """
+    if MSG_STYLE not in html:
+        return html
+    return make_soup(html)
+
+
 def is_there_msg(html):
     """Check if there is a message
 
     Args:
-        html (str): HTML input
+        html (str | BeautifulSoup): HTML input or parsed document
 
     Returns:
         bool: Whether there is a message
     """
-    soup = BeautifulSoup(html, "html.parser")
+    # Skip building the document if message style is absent.
+    if isinstance(html, str) and MSG_STYLE not in html:
+        return False
+    soup = make_soup(html)
 
     # Checking if span with given attributes exist.
-    if soup.find("span", attrs={"style": "color:#1E1E1E ;font-weight:bold"}):
+    if soup.find("span", attrs={"style": MSG_STYLE}):
         return True
     return False
 
@@ -1,3 +1,4 @@
+import importlib.util
 import logging
 import os
 import re
@@ -31,10 +32,25 @@ def _log_config():
 
 APP_NAME = "beusproxy"
 DATABASE = "beusp.db"
+DATABASE_POOL_SIZE = 4
+DATABASE_BUSY_TIMEOUT = 5000
+DATABASE_CACHE_SIZE = 8192
+SESSION_RETENTION_DAYS = 30
 REQUEST_TIMEOUT = 10
 POLLING_TIMEOUT = 30
+UPSTREAM_POOL_CONNECTIONS = 2
+UPSTREAM_POOL_MAXSIZE = 8
+UPSTREAM_ASYNC_LIMIT = 256
+RESPONSE_CACHE = "beusp_cache.db"
+RESPONSE_CACHE_SIZE = 4096
+PHOTO_CACHE = "beusp_photos"
+PHOTO_CACHE_SIZE = 64 * 1024 * 1024
+PHOTO_MAX_AGE = 86400
+PARSER_BACKEND = "html.parser"
 DEMO_FOLDER = "beusproxy/demo"
 TEMPLATES_FOLDER = "beusproxy/templates"
+# Compiled templates kept between restarts, empty disables
+TEMPLATES_CACHE = ""
 
 # Root server config
 
@@ -65,12 +81,24 @@ BOT_EMAIL = ""
 BOT_EMAIL_PASSWORD = "asd"
 BOT_SMTP_HOSTNAME = "smtp.gmil.com"
 BOT_SMTP_IS_SSL = True
+# SMTP connections kept by each process
+BOT_SMTP_POOL_SIZE = 2
 # BOT_IMAP_HOSTNAME = "" # Not used
 # BOT_POP_HOSTNAME = "" # Not used
 BOT_TELEGRAM_API_KEY = ""
 BOT_TELEGRAM_HOSTNAME = "api.telgram.org"
+# Receive updates by webhook instead of polling, if set
+BOT_TELEGRAM_WEBHOOK_SECRET = ""
 BOT_DISCORD_USERNAME = "BeuTMSBot"
 BOT_DISCORD_AVATAR = ""
+# Simultaneous requests of bot to API
+BOT_CONCURRENCY = 16
+# Students polled by bot per minute
+BOT_POLL_BUDGET = 120
+# Students are partitioned into shards,
+# leased by bot workers across processes and hosts
+BOT_SHARDS = 16
+BOT_WORKERS = 1
 
 #
 # Do not modify below
@@ -92,6 +120,34 @@ if os.path.isfile(database := os.getenv("DATABASE", DATABASE)):
 else:
     _arg_error("DATABASE")
 
+if (db_pool_size := os.getenv(
+        "DATABASE_POOL_SIZE", str(DATABASE_POOL_SIZE)
+)).isdigit():
+    DATABASE_POOL_SIZE = int(db_pool_size)
+else:
+    _arg_error(help_msg="DATABASE_POOL_SIZE should be a positive number or 0.")
+
+if (busy_timeout := os.getenv(
+        "DATABASE_BUSY_TIMEOUT", str(DATABASE_BUSY_TIMEOUT)
+)).isdigit():
+    DATABASE_BUSY_TIMEOUT = int(busy_timeout)
+else:
+    _arg_error(help_msg="DATABASE_BUSY_TIMEOUT should be a positive number.")
+
+if (db_cache_size := os.getenv(
+        "DATABASE_CACHE_SIZE", str(DATABASE_CACHE_SIZE)
+)).isdigit():
+    DATABASE_CACHE_SIZE = int(db_cache_size)
+else:
+    _arg_error(help_msg="DATABASE_CACHE_SIZE should be a positive number.")
+
+if (retention_days := os.getenv(
+        "SESSION_RETENTION_DAYS", str(SESSION_RETENTION_DAYS)
+)).isdigit():
+    SESSION_RETENTION_DAYS = int(retention_days)
+else:
+    _arg_error(help_msg="SESSION_RETENTION_DAYS should be a positive number.")
+
 if not (APP_NAME := os.getenv("APP_NAME", APP_NAME)):
     _arg_error("APP_NAME")
 
@@ -141,6 +197,65 @@ if (polling_timeout := os.getenv("POLLING_TIMEOUT", str(POLLING_TIMEOUT))).isdig
 else:
     _arg_error(help_msg="POLLING_TIMEOUT should be a positive number.")
 
+if (pool_connections := os.getenv(
+        "UPSTREAM_POOL_CONNECTIONS", str(UPSTREAM_POOL_CONNECTIONS)
+)).isdigit() and int(pool_connections) > 0:
+    UPSTREAM_POOL_CONNECTIONS = int(pool_connections)
+else:
+    _arg_error(help_msg="UPSTREAM_POOL_CONNECTIONS should be a positive number.")
+
+if (pool_maxsize := os.getenv(
+        "UPSTREAM_POOL_MAXSIZE", str(UPSTREAM_POOL_MAXSIZE)
+)).isdigit() and int(pool_maxsize) > 0:
+    UPSTREAM_POOL_MAXSIZE = int(pool_maxsize)
+else:
+    _arg_error(help_msg="UPSTREAM_POOL_MAXSIZE should be a positive number.")
+
+if (async_limit := os.getenv(
+        "UPSTREAM_ASYNC_LIMIT", str(UPSTREAM_ASYNC_LIMIT)
+)).isdigit() and int(async_limit) > 0:
+    UPSTREAM_ASYNC_LIMIT = int(async_limit)
+else:
+    _arg_error(help_msg="UPSTREAM_ASYNC_LIMIT should be a positive number.")
+
+if os.path.isdir(
+    os.path.dirname(os.path.abspath(cache := os.getenv("RESPONSE_CACHE", RESPONSE_CACHE)))
+):
+    RESPONSE_CACHE = cache
+else:
+    _arg_error("RESPONSE_CACHE")
+
+if (cache_size := os.getenv("RESPONSE_CACHE_SIZE", str(RESPONSE_CACHE_SIZE))).isdigit():
+    RESPONSE_CACHE_SIZE = int(cache_size)
+else:
+    _arg_error(help_msg="RESPONSE_CACHE_SIZE should be a positive number or 0.")
+
+if os.path.isdir(
+    os.path.dirname(os.path.abspath(photo_cache := os.getenv("PHOTO_CACHE", PHOTO_CACHE)))
+):
+    PHOTO_CACHE = photo_cache
+else:
+    _arg_error("PHOTO_CACHE")
+
+if (photo_cache_size := os.getenv("PHOTO_CACHE_SIZE", str(PHOTO_CACHE_SIZE))).isdigit():
+    PHOTO_CACHE_SIZE = int(photo_cache_size)
+else:
+    _arg_error(help_msg="PHOTO_CACHE_SIZE should be a positive number or 0.")
+
+if (photo_max_age := os.getenv("PHOTO_MAX_AGE", str(PHOTO_MAX_AGE))).isdigit():
+    PHOTO_MAX_AGE = int(photo_max_age)
+else:
+    _arg_error(help_msg="PHOTO_MAX_AGE should be a positive number or 0.")
+
+if (parser_backend := os.getenv("PARSER_BACKEND", PARSER_BACKEND)) == "html.parser":
+    PARSER_BACKEND = parser_backend
+elif parser_backend == "lxml":
+    if importlib.util.find_spec("lxml") is None:
+        _arg_error(help_msg="PARSER_BACKEND lxml requires lxml package to be installed.")
+    PARSER_BACKEND = parser_backend
+else:
+    _arg_error(help_msg="PARSER_BACKEND should be either html.parser or lxml.")
+
 if demo_folder := os.getenv("DEMO_FOLDER", DEMO_FOLDER):
     if os.path.isdir(os.path.expanduser(demo_folder)):
         DEMO_FOLDER = demo_folder
@@ -153,6 +268,12 @@ if templates_folder := os.getenv("TEMPLATES_FOLDER", TEMPLATES_FOLDER):
     else:
         _arg_error("TEMPLATES_FOLDER")
 
+if templates_cache := os.getenv("TEMPLATES_CACHE", TEMPLATES_CACHE):
+    if os.path.isdir(os.path.dirname(os.path.abspath(templates_cache))):
+        TEMPLATES_CACHE = templates_cache
+    else:
+        _arg_error("TEMPLATES_CACHE")
+
 if bot_enabled := os.getenv("BOT_ENABLED", ""):
     if isinstance(bot_enabled, str):
         BOT_ENABLED = bot_enabled == "true"
@@ -163,6 +284,18 @@ if BOT_ENABLED:
     BOT_TELEGRAM_API_KEY = os.getenv("BOT_TELEGRAM_API_KEY", BOT_TELEGRAM_API_KEY)
 
     BOT_TELEGRAM_HOSTNAME = os.getenv("BOT_TELEGRAM_HOSTNAME", BOT_TELEGRAM_HOSTNAME)
+
+    if re.fullmatch(
+            r"[A-Za-z0-9_-]{0,256}",
+            webhook_secret := os.getenv(
+                "BOT_TELEGRAM_WEBHOOK_SECRET", BOT_TELEGRAM_WEBHOOK_SECRET
+            ),
+    ):
+        BOT_TELEGRAM_WEBHOOK_SECRET = webhook_secret
+    else:
+        _arg_error(
+            help_msg="BOT_TELEGRAM_WEBHOOK_SECRET should be up to 256 of A-Z, a-z, 0-9, _ and -."
+        )
     
     BOT_RESTRICTED = os.getenv("BOT_RESTRICTED", BOT_RESTRICTED)
     BOT_ADMIN_STDID = os.getenv("BOT_ADMIN_STDID", BOT_ADMIN_STDID)
@@ -177,6 +310,41 @@ if BOT_ENABLED:
 
     BOT_SMTP_HOSTNAME = os.getenv("BOT_SMTP_HOSTNAME", BOT_SMTP_HOSTNAME)
 
+    if (bot_smtp_pool_size := os.getenv(
+            "BOT_SMTP_POOL_SIZE", str(BOT_SMTP_POOL_SIZE)
+    )).isdigit() and int(bot_smtp_pool_size) > 0:
+        BOT_SMTP_POOL_SIZE = int(bot_smtp_pool_size)
+    else:
+        _arg_error(help_msg="BOT_SMTP_POOL_SIZE should be a positive number.")
+
+    if (bot_concurrency := os.getenv(
+            "BOT_CONCURRENCY", str(BOT_CONCURRENCY)
+    )).isdigit() and int(bot_concurrency) > 0:
+        BOT_CONCURRENCY = int(bot_concurrency)
+    else:
+        _arg_error(help_msg="BOT_CONCURRENCY should be a positive number.")
+
+    if (bot_poll_budget := os.getenv(
+            "BOT_POLL_BUDGET", str(BOT_POLL_BUDGET)
+    )).isdigit() and int(bot_poll_budget) > 0:
+        BOT_POLL_BUDGET = int(bot_poll_budget)
+    else:
+        _arg_error(help_msg="BOT_POLL_BUDGET should be a positive number.")
+
+    if (bot_shards := os.getenv(
+            "BOT_SHARDS", str(BOT_SHARDS)
+    )).isdigit() and int(bot_shards) > 0:
+        BOT_SHARDS = int(bot_shards)
+    else:
+        _arg_error(help_msg="BOT_SHARDS should be a positive number.")
+
+    if (bot_workers := os.getenv(
+            "BOT_WORKERS", str(BOT_WORKERS)
+    )).isdigit() and int(bot_workers) > 0:
+        BOT_WORKERS = int(bot_workers)
+    else:
+        _arg_error(help_msg="BOT_WORKERS should be a positive number.")
+
     if not (
             BOT_DISCORD_USERNAME := os.getenv("BOT_DISCORD_USERNAME", BOT_DISCORD_USERNAME)
     ):
@@ -1,12 +1,17 @@
 import atexit
+import sqlite3
 import sys
-from smtplib import SMTPAuthenticationError
-
-from jinja2 import Environment, FileSystemLoader
 
 from .common.utils import get_logger
-from .config import BOT_ENABLED, TEMPLATES_FOLDER
-from .services.telegram_proc import TelegramProc
+from .config import API_HOSTNAME, BOT_ENABLED, BOT_TELEGRAM_WEBHOOK_SECRET
+from .services.cache import ResponseCache
+from .services.database import connection
+from .services.email import EmailClient
+from .services.migrations import migrate
+from .services.photos import PhotoCache
+from .services.telegram_proc import TelegramProc, TelegramWebhook
+from .services.templates import registry
+from .services.upstream import UpstreamClient
 
 
 class Context:
@@ -36,17 +41,39 @@ def init_context():
     logger = get_logger(__name__)
 
     try:
-        c.set("jinjaenv", Environment(loader=FileSystemLoader(TEMPLATES_FOLDER)))
-        # c.set("httpc", HTTPClient(trust_env=True))
-        if BOT_ENABLED:
-            c.set("tgproc", TelegramProc())
-    except SMTPAuthenticationError as e:
-        logger.error(e)
+        with connection() as conn:
+            migrate(conn)
+    except sqlite3.Error as e:
+        logger.error("Database migration: %s", e)
         sys.exit(1)
 
+    registry.warm()
+    c.set("jinjaenv", registry.env)
+    # c.set("httpc", HTTPClient(trust_env=True))
+    c.set("upstream", UpstreamClient())
+    c.set("cache", ResponseCache())
+    c.set("photos", PhotoCache())
+    if BOT_ENABLED:
+        c.set("emailc", EmailClient())
+        if BOT_TELEGRAM_WEBHOOK_SECRET:
+            c.set(
+                "tgclient",
+                TelegramWebhook(
+                    f"{API_HOSTNAME}bot/telegram", BOT_TELEGRAM_WEBHOOK_SECRET
+                ),
+            )
+        else:
+            c.set("tgproc", TelegramProc())
+
     @atexit.register
     def cleanup():
         """Cleanup resources"""
         if BOT_ENABLED:
-            c.get("tgproc").close()
+            if c.exists("tgclient"):
+                c.get("tgclient").close()
+            else:
+                c.get("tgproc").close()
+            c.get("emailc").quit()
         # c.get("httpc").close()
+        c.get("upstream").close()
+        c.get("cache").close()
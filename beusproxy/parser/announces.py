@@ -1,18 +1,16 @@
-from bs4 import BeautifulSoup
-
-from ..common.utils import parse_date
+from ..common.utils import make_soup, parse_date
 
 
 def announces(text):
     """Announces parser
 
     Args:
-        text (str): HTML input from root server
+        text (str | BeautifulSoup): HTML input from root server or parsed document
 
     Returns:
         dict: parsed JSON output
     """
-    soup = BeautifulSoup(text, "html.parser")
+    soup = make_soup(text)
 
     anns_list = []
     # Find announces sitting in div tags
@@ -1,6 +1,4 @@
-from bs4 import BeautifulSoup
-
-from ..common.utils import parse_date
+from ..common.utils import make_soup, parse_date
 
 
 def attendance2(html):
@@ -12,7 +10,7 @@ def attendance2(html):
     Returns:
         dict: JSON output
     """
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
 
     # New headers
     headers = [
@@ -83,7 +81,7 @@ def attendance3(html):
     Returns:
         dict: JSON output
     """
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
 
     headers = [
         "date",
@@ -1,4 +1,4 @@
-from bs4 import BeautifulSoup
+from ..common.utils import make_soup
 
 
 def deps(text):
@@ -20,7 +20,7 @@ def deps(text):
         "Bölməyə məxsus dərs kodu prefiksləri": "depPrefixes",
     }
 
-    soup = BeautifulSoup(text, "html.parser")
+    soup = make_soup(text)
 
     is_header_row = True
     # Collect table cells in a list for further processing.
@@ -77,7 +77,7 @@ def deps2(text):
         "Aid olduğu fakültə": "faculty"
     }
 
-    soup = BeautifulSoup(text, "html.parser")
+    soup = make_soup(text)
 
     # Collect table cells in a list for further processing.
     table = []
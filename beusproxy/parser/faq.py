@@ -1,16 +1,16 @@
-from bs4 import BeautifulSoup
+from ..common.utils import make_soup
 
 
 def faq(text):
     """FAQ parser
 
     Args:
-        text (str): HTML input from root server
+        text (str | BeautifulSoup): HTML input from root server or parsed document
 
     Returns:
         dict: parsed JSON output
     """
-    soup = BeautifulSoup(text, "html.parser")
+    soup = make_soup(text)
 
     faq_list = []
     # Find FAQ sitting in ul element with given class name.
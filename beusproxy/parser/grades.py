@@ -1,18 +1,18 @@
 import re
 
-from bs4 import BeautifulSoup
+from ..common.utils import make_soup
 
 
 def grades(text):
     """Grades parser
 
     Args:
-        text (str): HTML input from root server
+        text (str | BeautifulSoup): HTML input from root server or parsed document
 
     Returns:
         dict: parsed JSON output
     """
-    soup = BeautifulSoup(text, "html.parser")
+    soup = make_soup(text)
 
     grades_ops = []
     all_enabled = False
@@ -54,7 +54,7 @@ def grades2(html):
     # Cleaning input HTML.
     html = re.sub(r"\\([rnt])", "", html)
     html = re.sub(r"\\", "", html)
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     ys_count = 0
     grades_table = {}
     # Find all year & semester headers.
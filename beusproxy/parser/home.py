@@ -1,15 +1,13 @@
 import re
 
-from bs4 import BeautifulSoup
-
-from beusproxy.common.utils import parse_date
+from beusproxy.common.utils import make_soup, parse_date
 
 
 def home(text):
     """Homepage parser
 
     Args:
-        text (str): HTML input from root server
+        text (str | BeautifulSoup): HTML input from root server or parsed document
 
     Returns:
         dict: parsed JSON output
@@ -49,7 +47,7 @@ def home(text):
         "Təhsil haqqı ödəniş forması": "_eduDebtType",
         "İllik Təhsil haqqı": "_eduDebtFirst",
     }
-    soup = BeautifulSoup(text, "html.parser")
+    soup = make_soup(text)
 
     student_info_table = {
         "eduDebt": {},
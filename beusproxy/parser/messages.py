@@ -1,9 +1,7 @@
 import json
 import re
 
-from bs4 import BeautifulSoup
-
-from ..common.utils import parse_date
+from ..common.utils import MSG_STYLE, make_soup, parse_date
 
 
 def msg(html):
@@ -35,7 +33,7 @@ def msg2(text):
     # Seperate HTML from JSON
     # It is designed to keep DATA and CODE together.
     # Why would you even do that?
-    soup = BeautifulSoup(json.loads(text)["DATA"], "html.parser")
+    soup = make_soup(json.loads(text)["DATA"])
 
     msg_table = {}
     header = soup.find_all("tr")
@@ -63,17 +61,17 @@ def msg_id(html):
     """Message ID parser
 
     Args:
-        html (str): HTML input
+        html (str | BeautifulSoup): HTML input or parsed document
 
     Returns:
         list: List of message ids
     """
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
 
     msg_ids = []
     # Iterating through matches of regex and append it to list.
     # Regex is used to match message ids from html.
-    for i in soup.find_all("span", attrs={"style": "color:#1E1E1E ;font-weight:bold"}):
+    for i in soup.find_all("span", attrs={"style": MSG_STYLE}):
         for k in re.findall(r"(?<=\().*?(?=\))", i.parent.parent.attrs["onclick"]):
             msg_ids.append(k)
     return msg_ids
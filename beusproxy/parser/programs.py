@@ -1,5 +1,4 @@
-from bs4 import BeautifulSoup
-
+from ..common.utils import make_soup
 from .common import courses_parser, references_parser
 
 
@@ -15,7 +14,7 @@ def program2(html):
     Returns:
         str: JSON output
     """
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
 
     # Return if moddesc div doesn't exist
     if not soup.find("div", class_="moddesc"):
@@ -1,8 +1,6 @@
 import re
 
-from bs4 import BeautifulSoup
-
-from beusproxy.common.utils import parse_date
+from beusproxy.common.utils import make_soup, parse_date
 
 
 def transcript(html):
@@ -10,12 +8,12 @@ def transcript(html):
     """Transcript parser
 
     Args:
-        html (str): HTML input
+        html (str | BeautifulSoup): HTML input or parsed document
 
     Returns:
         dict: JSON output
     """
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
 
     transcript_table = {"semesters": {}}
     # Find extra table by given class name.
@@ -1,12 +1,8 @@
-import requests
-from flask import current_app as app
 from flask import jsonify, make_response
-from flask_restful import Resource, abort, reqparse
-from requests import RequestException
+from flask_restful import Resource, reqparse
 
-from .. import parser
-from ..common.utils import is_expired
-from ..config import HOST, ROOT, USER_AGENT, REQUEST_TIMEOUT
+from ..common import pipeline
+from ..context import c
 
 
 class AttendanceBySemester(Resource):
@@ -77,39 +73,11 @@ class AttendanceBySemester(Resource):
         )
         args = rp.parse_args()
 
-        try:
-            mid_res = requests.request(
-                "POST",
-                ROOT,
-                data={
-                    "ajx": 1,
-                    "mod": "ejurnal",
-                    "action": "getCourses",
-                    "ysem": f"{year}#{semester}",
-                },
-                headers={
-                    "Host": HOST,
-                    "Cookie": f"PHPSESSID={args.get("SessionID")}; BEU_STUD_AR=1; ",
-                    "User-Agent": USER_AGENT,
-                },
-                timeout=REQUEST_TIMEOUT,
+        page = jsonify(
+            pipeline.attendance(args.get("SessionID"), year, semester).run(
+                c.get("upstream")
             )
-
-            if not mid_res.status_code == 200:
-                abort(502, help="Bad response from root server")
-
-            mid_res = mid_res.text
-        except RequestException as ce:
-            app.logger.error(ce)
-            abort(502, help="Bad response from root server")
-
-        if is_expired(mid_res):
-            abort(401, help="errorApiUnauthorized")
-
-        if not mid_res.find("No section found.") == -1:
-            abort(400, help="No section found")
-
-        page = jsonify(parser.attendance2(mid_res))
+        )
         res = make_response(page, 200)
         return res
 
@@ -158,37 +126,10 @@ class AttendanceByCourse(Resource):
         )
         args = rp.parse_args()
 
-        try:
-            mid_res = requests.request(
-                "POST",
-                ROOT,
-                data={
-                    "ajx": 1,
-                    "mod": "ejurnal",
-                    "action": "viewCourse",
-                    "derst": course_code,
-                },
-                headers={
-                    "Host": HOST,
-                    "Cookie": f"PHPSESSID={args.get("SessionID")}; BEU_STUD_AR=1; ",
-                    "User-Agent": USER_AGENT,
-                },
-                timeout=REQUEST_TIMEOUT,
+        page = jsonify(
+            pipeline.attendance_course(args.get("SessionID"), course_code).run(
+                c.get("upstream")
             )
-
-            if not mid_res.status_code == 200:
-                abort(502, help="Bad response from root server")
-
-        except RequestException as ce:
-            app.logger.error(ce)
-            abort(502, help="Bad response from root server")
-        if is_expired(mid_res.text):
-            abort(401, help="errorApiUnauthorized")
-
-        ajax = mid_res.json()
-        if int(ajax["CODE"]) < 1:
-            abort(400, help=ajax["DATA"])
-
-        page = jsonify(parser.attendance3(ajax["DATA"]))
+        )
         res = make_response(page, 200)
         return res
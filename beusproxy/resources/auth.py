@@ -1,14 +1,13 @@
 import secrets
-from datetime import datetime
 
-import requests
 from flask import current_app as app
 from flask import make_response
 from flask_restful import Resource, abort, reqparse
-from requests import RequestException
 
+from ..common import pipeline
+from ..common.queries import add_session
 from ..common.utils import get_db
-from ..config import HOST, ROOT, USER_AGENT, REQUEST_TIMEOUT
+from ..context import c
 
 
 class Auth(Resource):
@@ -80,87 +79,13 @@ class Auth(Resource):
             abort(400, help="Invalid credentials")
 
         # Generate secure session_id
-        sessid = secrets.token_hex(32)
-
-        try:
-            # Authenticate the student_id with session_id
-            mid_res = requests.request(
-                "POST",
-                f"{ROOT}auth.php",
-                data={
-                    "username": student_id,
-                    "password": password,
-                    "LogIn": "",
-                },
-                headers={
-                    "Host": HOST,
-                    "Cookie": f"PHPSESSID={sessid}; ",
-                    "User-Agent": USER_AGENT,
-                },
-                allow_redirects=False,
-                timeout=REQUEST_TIMEOUT,
-            )
-
-        except RequestException as ce:
-            app.logger.error(ce)
-            abort(502, help="Bad response from root server")
-
-        # Respond with 401 if it was not redirected.
-        if mid_res.status_code == 200:
-            abort(401, help="Bad credentials")
-
-        if not mid_res.status_code == 302:
-            abort(502, help="Bad response from root server")
-
+        sessid = pipeline.auth(student_id, password, secrets.token_hex(32)).run(
+            c.get("upstream")
+        )
         app.logger.info("Student %s has logged in", student_id)
-        cookies = mid_res.headers.get("Set-Cookie")
-
-        # Preventing unusual behaviour of the root server.
-        if not cookies:
-            app.logger.error("Couldn't get the cookies")
-            abort(502, help="Bad response from root server")
-
-        # Eating cookies...
-        for header in cookies.replace(" ", "").split(";"):
-            if not header.find("PHPSESSID") == -1:
-                sessid = header.split("=")[1]
 
         with get_db() as db_con:
-            db_cur = db_con.cursor()
-
-            # Update student information, adding new student
-            # without password if it's not present
-            db_cur.execute(
-                """
-                INSERT INTO Students (student_id, password)
-                VALUES (?, '')
-                ON CONFLICT (student_id) DO NOTHING;
-            """,
-                (student_id, )
-            )
-
-            db_res = db_cur.execute(
-                """
-                SELECT id FROM Students
-                WHERE student_id = ?;           
-            """,
-                (student_id, )
-            ).fetchone()
-
-            if db_res is None:
-                db_con.rollback()
-                abort(400, help="Unknown error")
-            db_con.commit()
-
-            # Pushing new session_id
-            db_cur.execute(
-                """
-                INSERT INTO Student_Sessions(owner_id, session_id, login_date)
-                VALUES (?, ?, ?);
-            """,
-                (db_res["id"], sessid, datetime.now().isoformat()),
-            )
-            db_con.commit()
+            add_session(db_con, student_id, sessid)
 
         # Sending out freshly baked cookies
         mid_res = make_response("", 200)
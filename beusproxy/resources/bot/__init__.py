@@ -5,7 +5,9 @@ from requests import RequestException
 from ...config import BOT_EMAIL
 from ...context import c
 from ...services.telegram import TelegramClient, get_me
+from .history import BotHistory
 from .subscribe import BotSubscribe
+from .telegram import BotTelegram
 from .verify import BotVerify
 
 
@@ -58,4 +60,4 @@ class Bot(Resource):
         return bot
 
 
-__all__ = ["Bot", "BotSubscribe", "BotVerify"]
+__all__ = ["Bot", "BotHistory", "BotSubscribe", "BotTelegram", "BotVerify"]
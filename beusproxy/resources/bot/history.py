@@ -0,0 +1,188 @@
+import json
+from datetime import datetime
+
+from flask_restful import Resource, abort, reqparse
+
+from ...config import TMSAPI_OFFLINE
+from ...common.utils import get_db
+
+# Max events returned at once
+HISTORY_LIMIT = 500
+
+
+class BotHistory(Resource):
+    """BeuTMSBot Grade History
+
+    Flask-RESTFUL resource
+    """
+
+    def get(self):
+        """
+        Bot History Endpoint
+        Returns grade changes found by bot.
+        ---
+        tags:
+          - Bot
+        description: Gets grade changes of current user, latest first.
+        parameters:
+          - name: course
+            in: query
+            required: false
+            example: IT437
+            schema:
+                type: string
+          - name: field
+            in: query
+            required: false
+            example: final
+            schema:
+                type: string
+          - name: since
+            in: query
+            required: false
+            description: Only changes after this ISO 8601 datetime
+            example: 2025-01-01T00:00:00
+            schema:
+                type: string
+          - name: before
+            in: query
+            required: false
+            description: Only changes before this ISO 8601 datetime, for paging
+            example: 2025-06-01T00:00:00
+            schema:
+                type: string
+          - name: limit
+            in: query
+            required: false
+            example: 100
+            schema:
+                type: integer
+                minimum: 1
+                maximum: 500
+        responses:
+            200:
+                description: Success
+                content:
+                    application/json:
+                        schema:
+                            type: array
+                            items:
+                                type: object
+                                properties:
+                                    course:
+                                        type: string
+                                        example: IT437
+                                    field:
+                                        type: string
+                                        example: final
+                                    old:
+                                        example: null
+                                    new:
+                                        example: 50
+                                    ts:
+                                        type: string
+                                        example: 2025-01-20T14:02:11.410263
+            400:
+                description: Invalid arguments
+            401:
+                description: Session invalid or has expired
+            404:
+                description: Bot is not active
+        """
+        rp = reqparse.RequestParser()
+        rp.add_argument(
+            "SessionID",
+            type=str,
+            help="Invalid sessionid",
+            location="cookies",
+            required=True,
+        )
+        rp.add_argument(
+            "StudentID",
+            type=str,
+            help="Invalid studentid",
+            location="cookies",
+            required=True,
+        )
+        rp.add_argument("course", type=str, location="args")
+        rp.add_argument("field", type=str, location="args")
+        rp.add_argument("since", type=str, location="args")
+        rp.add_argument("before", type=str, location="args")
+        rp.add_argument(
+            "limit",
+            type=int,
+            help="Invalid limit",
+            location="args",
+            default=100,
+        )
+        args = rp.parse_args()
+
+        if not 0 < args.get("limit") <= HISTORY_LIMIT:
+            abort(400, help=f"Limit must be between 1 and {HISTORY_LIMIT}")
+        for arg in ("since", "before"):
+            if args.get(arg) is not None:
+                try:
+                    args[arg] = datetime.fromisoformat(args[arg]).isoformat()
+                except ValueError:
+                    abort(400, help=f"Invalid {arg}")
+
+        with get_db() as db_con:
+            if TMSAPI_OFFLINE:
+                db_res = db_con.execute(
+                    """
+                    SELECT id as owner_id FROM Students
+                    WHERE student_id = 99;
+                """
+                ).fetchone()
+            else:
+                db_res = db_con.execute(
+                    """
+                    SELECT ss.owner_id FROM Student_Sessions ss
+                    INNER JOIN Students s
+                    ON ss.owner_id = s.id
+                    WHERE
+                        s.student_id = ? AND
+                        ss.session_id = ? AND
+                        ss.logged_out = 0
+                    LIMIT 1;
+                """,
+                    (args.get("StudentID"), args.get("SessionID")),
+                ).fetchone()
+
+            if db_res is None:
+                abort(401, help="errorApiUnauthorized")
+
+            # Served from Grade_Events indexes, snapshots are not touched
+            where = ["owner_id = ?"]
+            params = [db_res["owner_id"]]
+            for arg, cond in (
+                ("course", "course = ?"),
+                ("field", "field = ?"),
+                ("since", "ts > ?"),
+                ("before", "ts < ?"),
+            ):
+                if args.get(arg) is not None:
+                    where.append(cond)
+                    params.append(args[arg])
+
+            events = db_con.execute(
+                f"""
+                SELECT course, field, old, new, ts
+                FROM Grade_Events
+                WHERE {" AND ".join(where)}
+                ORDER BY ts DESC
+                LIMIT ?;
+            """,
+                (*params, args.get("limit")),
+            ).fetchall()
+
+        return [
+            {
+                "course": event["course"],
+                "field": event["field"],
+                "old": json.loads(event["old"]),
+                "new": json.loads(event["new"]),
+                "ts": event["ts"],
+            }
+            for event in events
+        ]
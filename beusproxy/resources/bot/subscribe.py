@@ -5,7 +5,8 @@ from flask import make_response
 from flask_restful import Resource, abort, reqparse
 
 from ...config import TMSAPI_OFFLINE, BOT_RESTRICTED, BOT_ADMIN_STDID
-from ...common.utils import get_db, get_emailc, verify_code_gen
+from ...common.utils import get_db, verify_code_gen
+from ...context import c
 from ...services.discord import is_webhook
 from ...services.email import is_email
 
@@ -351,8 +352,8 @@ class BotSubscribe(Resource):
                 )
                 db_con.commit()
                 try:
-                    get_emailc().send_verification(args.get("email"), code)
-                except SMTPException:
+                    c.get("emailc").send_verification(args.get("email"), code)
+                except (SMTPException, OSError):
                     abort(500)
                 return {"emailSent": True}, 202
 
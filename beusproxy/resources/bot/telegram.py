@@ -0,0 +1,74 @@
+import hmac
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from flask import make_response, request
+from flask_restful import Resource, abort
+
+from ...config import BOT_TELEGRAM_WEBHOOK_SECRET, REQUEST_TIMEOUT
+from ...context import c
+
+
+class BotTelegram(Resource):
+    """BeuTMSBot Telegram Webhook
+
+    Flask-RESTFUL resource
+    """
+
+    def post(self):
+        """
+        Bot Telegram Endpoint
+        Receives Telegram updates, if webhook mode is enabled.
+        ---
+        tags:
+          - Bot
+        description: Handles an update, answering after it is handled.
+            Failed updates are logged, not retried, as they may be
+            partly applied.
+        parameters:
+          - name: X-Telegram-Bot-Api-Secret-Token
+            in: header
+            required: true
+            schema:
+                type: string
+        requestBody:
+            description: Telegram Update object
+            content:
+                application/json:
+                    schema:
+                        type: object
+            required: yes
+        responses:
+            200:
+                description: Handled
+            400:
+                description: Invalid update
+            401:
+                description: Invalid secret token
+            404:
+                description: Webhook mode is not enabled
+        """
+        tgclient = c.get("tgclient")
+        if tgclient is None:
+            abort(404)
+
+        # Compared as bytes, str must be ASCII
+        if not hmac.compare_digest(
+            request.headers.get("X-Telegram-Bot-Api-Secret-Token", "").encode(),
+            BOT_TELEGRAM_WEBHOOK_SECRET.encode(),
+        ):
+            abort(401, help="errorApiUnauthorized")
+
+        update = request.get_json(silent=True)
+        if not isinstance(update, dict) or not isinstance(update.get("update_id"), int):
+            abort(400, help="Invalid update")
+
+        try:
+            tgclient.submit(update).result(timeout=REQUEST_TIMEOUT)
+        except FutureTimeoutError:
+            # Still queued behind its chat, handled anyway
+            pass
+        except Exception:  # pylint: disable=W0718
+            # Logged by client, redelivery would apply it twice
+            pass
+
+        return make_response("", 200)
@@ -1,12 +1,8 @@
-import requests
-from flask import current_app as app
 from flask import jsonify, make_response
-from flask_restful import Resource, abort, reqparse
-from requests import RequestException
+from flask_restful import Resource, reqparse
 
-from .. import parser
-from ..common.utils import is_expired
-from ..config import HOST, ROOT, USER_AGENT, REQUEST_TIMEOUT
+from ..common import pipeline
+from ..context import c
 
 
 class Deps(Resource):
@@ -53,32 +49,8 @@ class Deps(Resource):
         )
         args = rp.parse_args()
 
-        try:
-            mid_res = requests.request(
-                "GET",
-                ROOT,
-                params={
-                    "mod": "viewdeps",
-                    "d": dep_code,
-                },
-                headers={
-                    "Host": HOST,
-                    "Cookie": f"PHPSESSID={args.get("SessionID")}; BEU_STUD_AR=1; ",
-                    "User-Agent": USER_AGENT,
-                },
-                timeout=REQUEST_TIMEOUT,
-            )
-
-            if not mid_res.status_code == 200:
-                abort(502, help="Bad response from root server")
-
-            mid_res = mid_res.text
-        except RequestException as ce:
-            app.logger.error(ce)
-            abort(502, help="Bad response from root server")
-        if is_expired(mid_res):
-            abort(401, help="errorApiUnauthorized")
-
-        page = jsonify(parser.deps2(mid_res))
+        page = jsonify(
+            pipeline.deps(args.get("SessionID"), dep_code).run(c.get("upstream"))
+        )
         res = make_response(page, 200)
         return res
@@ -1,14 +1,9 @@
-import time
-
-import requests
-from flask import current_app as app
 from flask import jsonify, make_response
-from flask_restful import Resource, abort, reqparse
-from requests import RequestException
+from flask_restful import Resource, reqparse
 
-from .. import parser
-from ..common.utils import is_expired
-from ..config import HOST, ROOT, USER_AGENT, API_INTERNAL_HOSTNAME, REQUEST_TIMEOUT
+from ..common import pipeline
+from ..common.utils import revalidated
+from ..context import c
 
 
 class Grades(Resource):
@@ -96,52 +91,16 @@ class Grades(Resource):
         )
         args = rp.parse_args()
 
-        try:
-            mid_res = requests.request(
-                "POST",
-                ROOT,
-                data={
-                    "ajx": 1,
-                    "mod": "grades",
-                    "action": "GetGrades",
-                    "yt": f"{year}#{semester}",
-                    round(time.time()): "",
-                },
-                headers={
-                    "Host": HOST,
-                    "Cookie": f"PHPSESSID={args.get("SessionID")}; BEU_STUD_AR=1; ",
-                    "User-Agent": USER_AGENT,
-                },
-                timeout=REQUEST_TIMEOUT,
-            )
-
-            if not mid_res.status_code == 200:
-                abort(502, help="Bad response from root server")
-
-        except RequestException as ce:
-            app.logger.error(ce)
-            abort(502, help="Bad response from root server")
-        if is_expired(mid_res.text):
-            abort(401, help="errorApiUnauthorized")
-
-        ajax = mid_res.json()
-        if int(ajax["CODE"]) < 1:
-            abort(400, help=f"Proxy server returned CODE {ajax["CODE"]}")
-
-        text = ajax["DATA"]
-        if (
-            not text.find(
-                "There aren't any registered section for the selected year-term."
-            )
-            == -1
-        ):
-            abort(
-                400,
-                help="There aren't any registered section for the selected year-term",
-            )
-
-        page = jsonify(parser.grades2(text))
-        res = make_response(page, 200)
+        entry = pipeline.cached(
+            c.get("cache"),
+            args.get("SessionID"),
+            "grades",
+            (year, semester),
+            lambda: pipeline.grades(args.get("SessionID"), year, semester).run(
+                c.get("upstream")
+            ),
+        )
+        res = revalidated(make_response(jsonify(entry.page), 200), entry.etag)
         return res
 
 
@@ -219,53 +178,16 @@ class GradesAll(Resource):
         )
         args = rp.parse_args()
 
-        try:
-            mid_res = requests.request(
-                "POST",
-                ROOT,
-                data={
-                    "ajx": 1,
-                    "mod": "grades",
-                    "action": "GetGrades",
-                    "yt": "1#1",
-                    round(time.time()): "",
-                },
-                headers={
-                    "Host": HOST,
-                    "Cookie": f"PHPSESSID={args.get("SessionID")}; BEU_STUD_AR=1; ",
-                    "User-Agent": USER_AGENT,
-                },
-                timeout=REQUEST_TIMEOUT,
-            )
-
-            if not mid_res.status_code == 200:
-                abort(502, help="Bad response from root server")
-
-        except RequestException as ce:
-            app.logger.error(ce)
-            abort(502, help="Bad response from root server")
-
-        if is_expired(mid_res.text):
-            abort(401, help="errorApiUnauthorized")
-
-        ajax = mid_res.json()
-        if int(ajax["CODE"]) < 1:
-            abort(400, help=f"Proxy server returned CODE {ajax["CODE"]}")
-
-        text = ajax["DATA"]
-        if (
-            not text.find(
-                "There aren't any registered section for the selected year-term."
-            )
-            == -1
-        ):
-            abort(
-                400,
-                help="There aren't any registered section for the selected year-term",
-            )
-
-        page = jsonify(parser.grades2(text))
-        res = make_response(page, 200)
+        entry = pipeline.cached(
+            c.get("cache"),
+            args.get("SessionID"),
+            "grades",
+            (1, 1),
+            lambda: pipeline.grades(args.get("SessionID"), 1, 1).run(
+                c.get("upstream")
+            ),
+        )
+        res = revalidated(make_response(jsonify(entry.page), 200), entry.etag)
         return res
 
 
@@ -343,47 +265,8 @@ class GradesLatest(Resource):
         )
         args = rp.parse_args()
 
-        try:
-            mid_res = requests.request(
-                "GET",
-                f"{API_INTERNAL_HOSTNAME}resource/grades",
-                headers={
-                    "Host": HOST,
-                    "Cookie": f"SessionID={args.get("SessionID")};",
-                    "User-Agent": USER_AGENT,
-                },
-                timeout=REQUEST_TIMEOUT,
-            )
-
-            mid_json = mid_res.json()
-            if not mid_res.status_code == 200:
-                return mid_json, mid_res.status_code
-
-            year, semester = (
-                mid_json["entries"][-1]["year"],
-                mid_json["entries"][-1]["semester"],
-            )
-
-            if not mid_json.get("entries"):
-                abort(502, help="Bad response from root server")
-
-            mid_res = requests.request(
-                "GET",
-                f"{API_INTERNAL_HOSTNAME}resource/grades/{year}/{semester}",
-                headers={
-                    "Host": HOST,
-                    "Cookie": f"SessionID={args.get("SessionID")};",
-                    "User-Agent": USER_AGENT,
-                },
-                timeout=REQUEST_TIMEOUT
-            )
-
-            mid_json = mid_res.json()
-            if not mid_res.status_code == 200:
-                return mid_json, mid_res.status_code
-        except RequestException as ce:
-            app.logger.error(ce)
-            abort(502, help="Bad response from root server")
-
-        res = make_response(mid_json, 200)
+        page = jsonify(
+            pipeline.grades_latest(c.get("upstream"), args.get("SessionID"))
+        )
+        res = make_response(page, 200)
         return res
@@ -1,14 +1,11 @@
-import asyncio
-
-import requests
-from aiohttp import ClientSession, ClientResponseError, ClientConnectionError, ClientTimeout
 from flask import current_app as app
 from flask import make_response
 from flask_restful import Resource, abort, reqparse
-from requests import RequestException
 
+from ..common import pipeline
+from ..common.queries import end_sessions
 from ..common.utils import get_db
-from ..config import HOST, ROOT, USER_AGENT, REQUEST_TIMEOUT
+from ..context import c
 
 
 class LogOut(Resource):
@@ -49,73 +46,22 @@ class LogOut(Resource):
         args = rp.parse_args()
 
         with get_db() as db_con:
-            db_cur = db_con.cursor()
-
-            # Querying current session to see if it exists
-            db_res = db_cur.execute(
-                """
-                SELECT ss.owner_id FROM Student_Sessions ss
-                INNER JOIN Students s
-                ON ss.owner_id = s.id
-                WHERE s.student_id = ? AND ss.session_id = ? AND ss.logged_out = 0
-                LIMIT 1;
-            """,
-                (args.get("StudentID"), args.get("SessionID")),
-            ).fetchone()
-            if db_res is None:
-                abort(400, help="Couldn't logout")
-
-            # Querying all sessions with ids which are not logged out yet
-            owner_id = db_res["owner_id"]
-            db_res = db_cur.execute(
-                """
-                SELECT ss.session_id FROM Student_Sessions ss
-                WHERE ss.owner_id = ? AND ss.logged_out = 0
-                ORDER BY ss.login_date DESC;
-            """,
-                (owner_id,),
-            ).fetchall()
-            if len(db_res) == 0:
-                abort(400, help="Couldn't logout")
-
-            # Updating database all sessions with fetched ids
-            db_cur.execute(
-                """
-                UPDATE Student_Sessions
-                SET logged_out = 1
-                WHERE owner_id = ?
-            """,
-                (owner_id,),
+            session_ids = end_sessions(
+                db_con, args.get("StudentID"), args.get("SessionID")
             )
-            db_con.commit()
 
-        async def logout_coro():
-            async with ClientSession(timeout=ClientTimeout(REQUEST_TIMEOUT)) as httpc:
-                try:
-                    return await asyncio.gather(
-                        *[
-                            httpc.request(
-                                "GET",
-                                f"{ROOT}logout.php",
-                                headers={
-                                    "Host": HOST,
-                                    "Cookie": f"PHPSESSID={session_id}; BEU_STUD_AR=1; ",
-                                    "User-Agent": USER_AGENT,
-                                },
-                                allow_redirects=False,
-                            )
-                            for session_id in list(map(lambda row: row["session_id"], db_res))
-                        ]
-                    )
-                except (ClientResponseError, ClientConnectionError) as ce:
-                    app.logger.error(ce)
-                    abort(502, help="Bad response from root server")
+        # Logging out of all sessions with fetched session_ids, concurrently
+        upstream = c.get("upstream")
+        ress = upstream.map(
+            lambda session_id: pipeline.logout(session_id).run(upstream), session_ids
+        )
 
-        # Logging out of all sessions with fetched session_ids
-        ress = asyncio.run(logout_coro())
+        # Cached responses of ended sessions
+        for session_id in session_ids:
+            c.get("cache").invalidate(session_id)
 
         try:
-            if ress[0].status != 302:
+            if ress[0] != 302:
                 abort(400, help="Couldn't logout")
         except IndexError:
             abort(400, help="Couldn't logout")
@@ -54,7 +54,7 @@ class StudPhoto(Resource):
             img = f.read()
 
         res = make_response(img, 200)
-        res.headers.set("Content-Type", "image/jpg")
+        res.headers.set("Content-Type", "image/jpeg")
         res.headers.set("Content-Length", len(img))
 
         return res
@@ -1,12 +1,8 @@
-import requests
-from flask import current_app as app
 from flask import jsonify, make_response
-from flask_restful import Resource, abort, reqparse
-from requests import RequestException
+from flask_restful import Resource, reqparse
 
-from .. import parser
-from ..common.utils import is_expired
-from ..config import HOST, ROOT, USER_AGENT, REQUEST_TIMEOUT
+from ..common import pipeline
+from ..context import c
 
 
 class Program(Resource):
@@ -57,36 +53,8 @@ class Program(Resource):
         )
         args = rp.parse_args()
 
-        try:
-            mid_res = requests.request(
-                "GET",
-                ROOT,
-                params={
-                    "mod": "progman",
-                    "pc": code,
-                    "py": year,
-                },
-                headers={
-                    "Host": HOST,
-                    "Cookie": f"PHPSESSID={args.get("SessionID")}; BEU_STUD_AR=1; ",
-                    "User-Agent": USER_AGENT,
-                },
-                timeout=REQUEST_TIMEOUT,
-            )
-
-            if not mid_res.status_code == 200:
-                abort(502, help="Bad response from root server")
-
-            mid_res = mid_res.text
-        except RequestException as ce:
-            app.logger.error(ce)
-            abort(502, help="Bad response from root server")
-        if is_expired(mid_res):
-            abort(401, help="errorApiUnauthorized")
-
-        page = parser.program2(mid_res)
-
-        if not page:
-            abort(404, help="Not Found")
+        page = pipeline.program(args.get("SessionID"), code, year).run(
+            c.get("upstream")
+        )
         res = make_response(jsonify(page), 200)
         return res
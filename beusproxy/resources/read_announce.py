@@ -1,8 +1,8 @@
 from flask import make_response
-from flask_restful import Resource, abort, reqparse
-from requests import RequestException
+from flask_restful import Resource, reqparse
 
-from beusproxy.common.utils import read_announce
+from beusproxy.common import pipeline
+from beusproxy.context import c
 
 
 class ReadAnnounce(Resource):
@@ -38,9 +38,6 @@ class ReadAnnounce(Resource):
         )
         args = rq.parse_args()
 
-        try:
-            read_announce(args.get("SessionID"))
-        except RequestException:
-            abort(502)
+        pipeline.read_announce(args.get("SessionID")).run(c.get("upstream"))
 
         return make_response("", 200)
@@ -1,12 +1,9 @@
-import requests
-from flask import current_app as app
 from flask import jsonify, make_response
-from flask_restful import Resource, abort, reqparse
-from requests import RequestException
+from flask_restful import Resource, reqparse
 
-from .. import parser
-from ..common.utils import is_expired, is_there_msg, read_msgs
-from ..config import HOST, ROOT, USER_AGENT, REQUEST_TIMEOUT
+from ..common import pipeline
+from ..common.utils import revalidated
+from ..context import c
 
 
 class Res(Resource):
@@ -68,52 +65,17 @@ class Res(Resource):
         )
         args = rp.parse_args()
 
-        # Prevent accessing not assigned resources.
-        if not tms_pages.get(resource):
-            abort(404)
-
-        # Trying to get respective parser function.
-        res = None
-        try:
-            res = getattr(parser, resource)
-        except AttributeError:
-            abort(404)
-
-        # Retry after reading messages
-        mid_res = None
-        for i in range(2):
-            try:
-                mid_res = requests.request(
-                    "GET",
-                    f"{ROOT}?mod={tms_pages[resource]}",
-                    headers={
-                        "Host": HOST,
-                        "Cookie": f"PHPSESSID={args.get("SessionID")}; BEU_STUD_AR=1; ",
-                        "User-Agent": USER_AGENT,
-                    },
-                    timeout=REQUEST_TIMEOUT,
-                )
-
-                if not mid_res.status_code == 200:
-                    abort(502, help="Bad response from root server")
-
-                mid_res = mid_res.text
-            except RequestException as ce:
-                app.logger.error(ce)
-                abort(502, help="Bad response from root server")
-
-            if is_expired(mid_res):
-                abort(401, help="errorApiUnauthorized")
-
-            if is_there_msg(mid_res):
-                if i == 1:
-                    abort(502, help="Bad response from root server")
-                read_msgs(args.get("SessionID"), parser.msg_id(mid_res))
-            else:
-                break
-
-        page = res(mid_res)
-        res = make_response(jsonify(page), 200)
+        entry = pipeline.cached(
+            c.get("cache"),
+            args.get("SessionID"),
+            resource,
+            (),
+            lambda: pipeline.resource(
+                c.get("upstream"), resource, args.get("SessionID")
+            ),
+        )
+        page = entry.page
+        res = revalidated(make_response(jsonify(page), 200), entry.etag)
 
         # Bake ImgID cookie if accessing home resource.
         if resource == "home":
@@ -127,12 +89,3 @@ class Res(Resource):
 
         return res
 
-
-tms_pages = {
-    "home": "home",
-    "grades": "grades",
-    "faq": "faq",
-    "announces": "elan",
-#    "deps": "viewdeps",
-    "transcript": "transkript",
-}
@@ -1,9 +1,8 @@
-import requests
-from flask import make_response, current_app as app
-from flask_restful import Resource, abort, reqparse
-from requests import RequestException
+from flask import make_response
+from flask_restful import Resource, reqparse
 
-from ..config import HOST, ROOT, USER_AGENT, REQUEST_TIMEOUT
+from ..common import pipeline
+from ..context import c
 
 
 class Settings(Resource):
@@ -49,27 +48,9 @@ class Settings(Resource):
         args = rp.parse_args()
 
         if args.get("lang") and args.get("lang").lower() in langs:
-            try:
-                mid_res = requests.request(
-                    "GET",
-                    ROOT,
-                    params={
-                        "mod": "setting",
-                        "a": "update_interface_lang",
-                        "lang": args.get("lang").upper(),
-                    },
-                    headers={
-                        "Host": HOST,
-                        "Cookie": f"PHPSESSID={args.get("SessionID")}; BEU_STUD_AR=1; ",
-                        "User-Agent": USER_AGENT,
-                    },
-                    timeout=REQUEST_TIMEOUT,
-                )
-                if mid_res.status_code != 200:
-                    abort(400, help="Invalid Language")
-            except RequestException as ce:
-                app.logger.error(ce)
-                abort(502, help="Bad response from root server")
+            pipeline.settings(args.get("SessionID"), args.get("lang")).run(
+                c.get("upstream")
+            )
 
         return make_response("", 200)
 
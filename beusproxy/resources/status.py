@@ -1,24 +1,10 @@
-import asyncio
-import hashlib
+from flask_restful import Resource, reqparse
 
-from flask import current_app as app
-from flask_restful import Resource, abort, reqparse
-from aiohttp import ClientSession, ClientResponseError, ClientConnectionError, ClientTimeout
-
-from .. import BOT_ENABLED
+from ..common import pipeline
+from ..common.queries import bot_status, status_counts
 from ..common.utils import get_db
-from ..config import HOST, ROOT, USER_AGENT, REQUEST_TIMEOUT
-
-# Files to calculate the sha256 hashsum of.
-hash_files = [
-    "/index.php",
-    "/common/general.js",
-    "/dist/js/adminlte.js",
-    "/dist/js/demo.js",
-    "/dist/js/datepicker-simple.js",
-    "/bower_components/jquery/dist/jquery.min.js",
-    "/bower_components/bootstrap/dist/js/bootstrap.min.js",
-]
+from ..config import BOT_ENABLED
+from ..context import c
 
 
 class Status(Resource):
@@ -59,6 +45,29 @@ class Status(Resource):
                                 root_server_is_up:
                                     type: boolean
                                     example: true
+                                botWorkers:
+                                    type: integer
+                                    description: Live bot workers, if bot is enabled
+                                    example: 1
+                                telegram:
+                                    type: object
+                                    description: Telegram process, if bot is enabled
+                                    properties:
+                                        alive:
+                                            type: boolean
+                                            example: true
+                                        restarts:
+                                            type: integer
+                                            description: Polling mode only
+                                            example: 0
+                                        pendingUpdates:
+                                            type: integer
+                                            description: Webhook mode only
+                                            example: 0
+                                        lastError:
+                                            type: string
+                                            description: Webhook mode only
+                                            example: null
                                 sha256sums:
                                     type: array
                                     items:
@@ -79,81 +88,29 @@ class Status(Resource):
             location="args",
         )
         args = rp.parse_args()
+
         status_table = {"botEnabled": BOT_ENABLED}
 
         with get_db() as db_con:
-            db_cur = db_con.cursor()
-
-            # Get students count.
-            db_res = db_cur.execute(
-                """
-                SELECT COUNT(id) AS c FROM Students;
-            """
-            ).fetchone()
-            if db_res:
-                status_table["studentsRegistered"] = db_res["c"]
-
-            # Get total subscribers count.
-            db_res = db_cur.execute(
-                """
-                SELECT ts + es + ds as c FROM
-                    (SELECT count(telegram_id) as ts FROM Telegram_Subscribers) JOIN
-                    (SELECT count(email_id) as es FROM Email_Subscribers) JOIN
-                    (SELECT count(discord_id) as ds FROM Discord_Subscribers);
-            """
-            ).fetchone()
-            if db_res:
-                status_table["subscriptions"] = db_res["c"]
-
-        async def status_coro(status_table):
-            async with ClientSession(timeout=ClientTimeout(REQUEST_TIMEOUT)) as httpc:
-                try:
-                    # Check root server status.
-                    mid_res = await httpc.request(
-                        "GET", ROOT, headers={"Host": HOST, "User-Agent": USER_AGENT}
-                    )
-                    status_table["rootServerIsUp"] = mid_res.status == 200
+            status_counts(db_con, status_table)
+            if BOT_ENABLED:
+                bot_status(db_con, status_table)
 
-                    # Advanced status check.
-                    # Return hashsums of given files.
-                    async def none():
-                        return None
+        # Check root server status.
+        status_table["rootServerIsUp"] = pipeline.root_status().run(c.get("upstream"))
 
-                    if args.get("advanced"):
-                        status_table["sha256sums"] = []
-                        mid_ress = await asyncio.gather(
-                            *[
-                                res.text() if res.status == 200 else none()
-                                for res in list(
-                                    res
-                                    for res in await asyncio.gather(
-                                        *[
-                                            httpc.request(
-                                                "GET",
-                                                ROOT + hash_file,
-                                                headers={
-                                                    "Host": HOST,
-                                                    "User-Agent": USER_AGENT,
-                                                },
-                                                allow_redirects=False,
-                                            )
-                                            for hash_file in hash_files
-                                        ]
-                                    )
-                                )
-                            ]
-                        )
-                        for inx, mid_res in enumerate(mid_ress):
-                            if not mid_res:
-                                continue
-                            status_table["sha256sums"].append(
-                                f"{hashlib.sha256(
-                                mid_res.encode("UTF-8")
-                                ).hexdigest()} {hash_files[inx].split("/")[-1]}"
-                            )
-                except (ClientResponseError, ClientConnectionError) as ce:
-                    app.logger.error(ce)
-                    abort(502, help="Bad response from root server")
+        # Advanced status check.
+        # Return hashsums of given files.
+        if args.get("advanced"):
+            upstream = c.get("upstream")
+            digests = upstream.map(
+                lambda hash_file: pipeline.static_hash(hash_file).run(upstream),
+                pipeline.hash_files,
+            )
+            status_table["sha256sums"] = [
+                f"{digest} {hash_file.split('/')[-1]}"
+                for digest, hash_file in zip(digests, pipeline.hash_files)
+                if digest
+            ]
 
-        asyncio.run(status_coro(status_table))
         return status_table
@@ -1,10 +1,10 @@
-import requests
-from flask import current_app as app
-from flask import make_response
-from flask_restful import Resource, abort, reqparse
-from requests import RequestException
+from flask import Response, make_response, request, send_file
+from flask_restful import Resource, reqparse
 
-from ..config import HOST, ROOT, USER_AGENT, REQUEST_TIMEOUT
+from ..common import pipeline
+from ..config import PHOTO_MAX_AGE
+from ..context import c
+from ..services.photos import PhotoCache
 
 
 class StudPhoto(Resource):
@@ -32,6 +32,8 @@ class StudPhoto(Resource):
                             type: string
                             format: binary
                             example: ""
+            304:
+                description: Not Modified
             401:
                 description: Unauthorized
             502:
@@ -53,31 +55,47 @@ class StudPhoto(Resource):
             required=True,
         )
         args = rp.parse_args()
+        img_id = args.get("ImgID")
+        etag = PhotoCache.etag(img_id)
+        photos = c.get("photos")
 
-        try:
-            mid_res = requests.request(
-                "GET",
-                f"{ROOT}stud_photo.php",
-                params={
-                    "ses": args.get("ImgID"),
-                },
-                headers={
-                    "Host": HOST,
-                    "Cookie": f"PHPSESSID={args.get("SessionID")}; BEU_STUD_AR=1; ",
-                    "User-Agent": USER_AGENT,
-                },
-                timeout=REQUEST_TIMEOUT,
-            )
+        # Photo of an ImgID never changes,
+        # served without root server to its owner only
+        not_modified = request.if_none_match.contains(etag)
+        cached = None if not_modified else photos.get(img_id)
+        if not_modified or cached is not None:
+            try:
+                pipeline.photo_owner(
+                    c.get("cache"), c.get("upstream"), args.get("SessionID"), img_id
+                )
+            except Exception:
+                if cached is not None:
+                    cached.close()
+                raise
+            if not_modified:
+                return _cacheable(make_response("", 304), etag)
+            return _cacheable(send_file(cached, mimetype="image/jpeg"), etag)
 
-            if not mid_res.status_code == 200:
-                abort(502, help="Bad response from root server")
+        mid_res = pipeline.studphoto(args.get("SessionID"), img_id).open(
+            c.get("upstream")
+        )
+
+        res = Response(
+            pipeline.chunks(mid_res, photos.writer(img_id)),
+            mimetype="image/jpeg",
+            direct_passthrough=True,
+        )
+        res.call_on_close(mid_res.close)
+        # Body is decoded by requests if encoded
+        length = mid_res.headers.get("Content-Length")
+        if length is not None and "Content-Encoding" not in mid_res.headers:
+            res.headers.set("Content-Length", length)
+        return _cacheable(res, etag)
 
-            mid_res = mid_res.content
-        except RequestException as ce:
-            app.logger.error(ce)
-            abort(502, help="Bad response from root server")
 
-        res = make_response(mid_res)
-        res.headers.set("Content-Type", "image/png")
-        res.headers.set("Content-Length", len(mid_res))
-        return res
+def _cacheable(response, etag):
+    """Let browsers reuse the photo"""
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = PHOTO_MAX_AGE
+    return response
@@ -1,11 +1,8 @@
-import requests
-from flask import current_app as app
 from flask import make_response
-from flask_restful import Resource, abort, reqparse
-from requests import RequestException
+from flask_restful import Resource, reqparse
 
-from ..common.utils import is_expired
-from ..config import HOST, ROOT, USER_AGENT, REQUEST_TIMEOUT
+from ..common import pipeline
+from ..context import c
 
 
 class Verify(Resource):
@@ -40,28 +37,6 @@ class Verify(Resource):
         )
         args = rp.parse_args()
 
-        try:
-            mid_res = requests.request(
-                "POST",
-                ROOT,
-                data={"ajx": 1},
-                headers={
-                    "Host": HOST,
-                    "Cookie": f"PHPSESSID={args.get("SessionID")}; BEU_STUD_AR=1; ",
-                    "User-Agent": USER_AGENT,
-                },
-                timeout=REQUEST_TIMEOUT,
-            )
-
-            if not mid_res.status_code == 200:
-                abort(502, help="Bad response from root server")
-
-            mid_res = mid_res.text
-        except RequestException as ce:
-            app.logger.error(ce)
-            abort(502, help="Bad response from root server")
-
-        if is_expired(mid_res):
-            abort(401, help="errorApiUnauthorized")
+        pipeline.verify(args.get("SessionID")).run(c.get("upstream"))
 
         return make_response("", 200)
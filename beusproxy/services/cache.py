@@ -0,0 +1,193 @@
+"""Response Cache Service
+
+Parsed resources cached per student session,
+stored in SQLite so that all worker processes share it.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import Optional
+
+from ..config import RESPONSE_CACHE, RESPONSE_CACHE_SIZE
+
+
+class CacheEntry:
+    """Cache Entry Model"""
+
+    def __init__(self, page, etag):
+        self.page = page
+        self.etag = etag
+
+
+class ResponseCache:
+    """ResponseCache base class.
+    TTL bounded entries with LRU eviction,
+    keyed by hash of (session_id, resource, params).
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = RESPONSE_CACHE,
+        *,
+        max_entries: Optional[int] = RESPONSE_CACHE_SIZE,
+    ):
+        self._path = path
+        self._max_entries = max_entries
+        self._lock = Lock()
+        self._pid = None
+        self._conn = None
+
+    @property
+    def enabled(self):
+        """Caching is disabled with size of 0"""
+        return self._max_entries > 0
+
+    def close(self):
+        """Close database connection"""
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self._pid = None
+
+    def _connect(self):
+        """Connection of current worker process.
+        Created lazily, recreated after fork.
+        Must be called with lock held.
+
+        Returns:
+            Connection: sqlite3.Connection
+        """
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(
+                self._path, check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode = WAL;")
+            conn.execute("PRAGMA synchronous = NORMAL;")
+            conn.execute("PRAGMA busy_timeout = 5000;")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS Responses (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    etag TEXT NOT NULL,
+                    page TEXT NOT NULL,
+                    expires REAL NOT NULL,
+                    accessed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_responses_accessed
+                ON Responses (accessed);
+                CREATE INDEX IF NOT EXISTS idx_responses_expires
+                ON Responses (expires);
+                CREATE INDEX IF NOT EXISTS idx_responses_owner
+                ON Responses (owner);
+            """
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def key(sessid, resource, *params):
+        """Cache key of a resource.
+        Session ids are hashed, never stored.
+
+        Args:
+            sessid (str): Student session_id
+            resource (str): Resource name
+            params: Resource parameters
+
+        Returns:
+            str: Cache key
+        """
+        return hashlib.sha256(
+            json.dumps([sessid, resource, params]).encode("UTF-8")
+        ).hexdigest()
+
+    @staticmethod
+    def owner(sessid):
+        """Hashed session_id, owner of entries"""
+        return hashlib.sha256(sessid.encode("UTF-8")).hexdigest()
+
+    def get(self, key):
+        """Get an entry if it is not expired
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            CacheEntry: Entry or None
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                """
+                UPDATE Responses SET accessed = ?
+                WHERE key = ? AND expires > ?
+                RETURNING page, etag;
+            """,
+                (now, key, now),
+            ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(json.loads(row[0]), row[1])
+
+    def put(self, sessid, key, page, ttl):
+        """Store an entry, evicting least recently used ones
+
+        Args:
+            sessid (str): Student session_id
+            key (str): Cache key
+            page (dict): Parsed page
+            ttl (int): Time to live in seconds
+
+        Returns:
+            CacheEntry: Stored entry
+        """
+        dump = json.dumps(page, sort_keys=True, separators=(",", ":"))
+        etag = hashlib.sha256(dump.encode("UTF-8")).hexdigest()[:32]
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE;")
+            try:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO Responses
+                    (key, owner, etag, page, expires, accessed)
+                    VALUES (?, ?, ?, ?, ?, ?);
+                """,
+                    (key, self.owner(sessid), etag, dump, now + ttl, now),
+                )
+                conn.execute("DELETE FROM Responses WHERE expires <= ?;", (now,))
+                conn.execute(
+                    """
+                    DELETE FROM Responses WHERE key IN (
+                        SELECT key FROM Responses
+                        ORDER BY accessed DESC
+                        LIMIT -1 OFFSET ?
+                    );
+                """,
+                    (self._max_entries,),
+                )
+                conn.execute("COMMIT;")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK;")
+                raise
+        return CacheEntry(page, etag)
+
+    def invalidate(self, sessid):
+        """Drop entries of a session
+
+        Args:
+            sessid (str): Student session_id
+        """
+        with self._lock:
+            self._connect().execute(
+                "DELETE FROM Responses WHERE owner = ?;", (self.owner(sessid),)
+            )
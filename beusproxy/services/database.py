@@ -1,26 +1,204 @@
+"""Database Service
+
+Pooled connections to main database, one pool per worker process.
+Connections are reused, so are their prepared statements.
+"""
+
+import os
 import sqlite3
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+from typing import Optional
+
+from ..config import (DATABASE, DATABASE_BUSY_TIMEOUT, DATABASE_CACHE_SIZE,
+                      DATABASE_POOL_SIZE)
+
+# Prepared statements kept per connection
+STATEMENT_CACHE = 256
+
+
+class PooledConnection(sqlite3.Connection):
+    """Pooled Connection Model
+
+    Closing returns the connection into its pool.
+    Context manager commits or rolls back as usual,
+    connection stays checked out.
+    """
+
+    pool = None
+    # Checkout slot of pool, released on close
+    slot = None
+
+    def close(self):
+        """Return into pool, close if pool is full"""
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def discard(self):
+        """Close the connection for real"""
+        super().close()
+
+
+class ConnectionPool:
+    """ConnectionPool base class.
+    At most size connections are checked out at once,
+    others wait up to busy_timeout for one. Size of 0 disables
+    pooling, every checkout opens a new connection.
+    """
+
+    def __init__(
+        self,
+        database: Optional[str] = DATABASE,
+        *,
+        readonly: Optional[bool] = False,
+        size: Optional[int] = DATABASE_POOL_SIZE,
+        busy_timeout: Optional[int] = DATABASE_BUSY_TIMEOUT,
+        cache_size: Optional[int] = DATABASE_CACHE_SIZE,
+    ):
+        # pylint: disable=R0913
+        self._database = database
+        self._readonly = readonly
+        self._size = size
+        self._busy_timeout = busy_timeout
+        self._cache_size = cache_size
+        self._lock = Lock()
+        self._pid = None
+        self._idle = []
+        self._slots = None
+
+    def close(self):
+        """Close idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            pid, self._pid = self._pid, None
+        if pid == os.getpid():
+            for conn in idle:
+                conn.discard()
 
-from ..config import DATABASE
+    def acquire(self):
+        """Check out a connection of current worker process.
+        Idle ones are dropped after fork.
 
-_conn_list = []
+        Returns:
+            PooledConnection: Connection
+
+        Raises:
+            sqlite3.OperationalError: No connection freed up in time
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                self._idle = []
+                self._slots = BoundedSemaphore(self._size) if self._size > 0 else None
+                self._pid = os.getpid()
+            slots = self._slots
+
+        if slots is not None and not slots.acquire(timeout=self._busy_timeout / 1000):
+            raise sqlite3.OperationalError("Connection pool exhausted")
+
+        try:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._connect()
+        except BaseException:
+            if slots is not None:
+                slots.release()
+            raise
+        conn.slot = slots
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release(self, conn):
+        """Return a connection, rolling back what is left uncommitted
+
+        Args:
+            conn (PooledConnection): Connection
+        """
+        if conn.slot is None and self._slots is not None:
+            # Returned already
+            return
+        slot, conn.slot = conn.slot, None
+        try:
+            self._return(conn)
+        finally:
+            # Slots of another process are gone with it
+            if slot is not None and slot is self._slots:
+                slot.release()
+
+    def _return(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.discard()
+            return
+
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self._size:
+                self._idle.append(conn)
+                return
+        conn.discard()
+
+    def _connect(self):
+        """Create a tuned connection"""
+        if self._readonly:
+            conn = sqlite3.connect(
+                f"file:{self._database}?mode=ro",
+                uri=True,
+                factory=PooledConnection,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE,
+            )
+        else:
+            conn = sqlite3.connect(
+                self._database,
+                factory=PooledConnection,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE,
+            )
+            # Readers don't block the writer and vice versa.
+            # Persisted in database file.
+            conn.execute("PRAGMA journal_mode = WAL;")
+            conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute(f"PRAGMA busy_timeout = {int(self._busy_timeout)};")
+        # Negative size is in KiB
+        conn.execute(f"PRAGMA cache_size = {-int(self._cache_size)};")
+        conn.pool = self
+        return conn
+
+
+_pools = {
+    False: ConnectionPool(),
+    True: ConnectionPool(readonly=True),
+}
 
 
 def get_db(*, readonly=False):
-    """Gets a Database Connection"""
-    if readonly:
-        return _get_conn(f"file:{DATABASE}?mode=ro", uri=True)
-    return _get_conn(DATABASE)
+    """Gets a Database Connection.
+    Close it to return into pool.
+    """
+    return _pools[readonly].acquire()
 
 
-def _get_conn(conn_str, *, uri=False):
-    """Gets a Database Connection"""
-    conn = sqlite3.connect(conn_str, uri=uri)
-    conn.row_factory = sqlite3.Row
-    _conn_list.append(conn)
-    return conn
+@contextmanager
+def connection(*, readonly=False):
+    """Pooled connection as a transaction.
+    Committed if block succeeds, returned into pool afterwards.
+
+    Yields:
+        PooledConnection: Connection
+    """
+    conn = get_db(readonly=readonly)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
 
 
 def clean():
     """Clean Connection Pool"""
-    for conn in _conn_list:
-        conn.close()
+    for pool in _pools.values():
+        pool.close()
@@ -1,10 +1,24 @@
+import asyncio
+import json
 import re
+import time
 
 import requests
 from requests import RequestException
 
+from ..common.utils import get_logger
 from ..config import BOT_DISCORD_USERNAME, BOT_DISCORD_AVATAR, REQUEST_TIMEOUT
 
+logger = get_logger(__name__)
+
+# Embeds allowed in one webhook message
+MAX_EMBEDS = 10
+# 429 is retried in place while retry_after is short,
+# otherwise raised to caller
+DISCORD_RETRIES = 3
+DISCORD_RETRY_AFTER_MAX = 30
+DISCORD_BUCKETS = 1024
+
 
 def is_webhook(url):
     """Checks if it is a valid discord webhook URL
@@ -66,3 +80,138 @@ def send_message(webhook, *, message):
         raise RequestException(res.status_code, res.text)
 
     return res.text
+
+
+def split_message(message, size=MAX_EMBEDS):
+    """Split a message into messages of at most size embeds
+
+    Args:
+        message (dict): Message Dictionary
+        size (int): Max embeds per message
+
+    Returns:
+        list: Messages
+    """
+    embeds = message.get("embeds") or []
+    if len(embeds) <= size:
+        return [message]
+    return [
+        dict(message, embeds=embeds[i : i + size])
+        for i in range(0, len(embeds), size)
+    ]
+
+
+class WebhookBucket:
+    """Webhook Rate Limit Bucket Model"""
+
+    def __init__(self):
+        self.remaining = None
+        self.reset_at = 0.0
+        self.lock = asyncio.Lock()
+
+    def update(self, headers):
+        """Track bucket from X-RateLimit-* headers
+
+        Args:
+            headers (Mapping): Response headers
+        """
+        try:
+            if (remaining := headers.get("X-RateLimit-Remaining")) is not None:
+                self.remaining = int(remaining)
+            if (reset_after := headers.get("X-RateLimit-Reset-After")) is not None:
+                self.reset_at = time.monotonic() + float(reset_after)
+        except ValueError:
+            pass
+
+    def delay(self):
+        """Seconds until a request is allowed"""
+        if self.remaining == 0:
+            return max(self.reset_at - time.monotonic(), 0)
+        return 0
+
+
+class WebhookClient:
+    """WebhookClient base class.
+    Async webhook messages over a shared aiohttp session.
+    Messages to a webhook are queued behind its bucket,
+    tracked from response headers, instead of running into 429.
+    """
+
+    def __init__(self, httpc):
+        self._httpc = httpc
+        self._buckets = {}
+        self._global_reset_at = 0.0
+
+    def _bucket(self, webhook):
+        bucket = self._buckets.get(webhook)
+        if bucket is None:
+            # Forget webhooks which are quiet again
+            if len(self._buckets) >= DISCORD_BUCKETS:
+                self._buckets = {
+                    k: v
+                    for k, v in self._buckets.items()
+                    if v.lock.locked() or v.delay() > 0
+                }
+            bucket = self._buckets[webhook] = WebhookBucket()
+        return bucket
+
+    async def send(self, webhook, message, *, start=0, on_part=None):
+        """Send message object, split by MAX_EMBEDS.
+        Parts before start were sent by an earlier attempt and are skipped.
+
+        Args:
+            webhook (str): Webhook URL
+            message (dict): Message Dictionary
+            start (int): Parts already sent
+            on_part (callable): Called with parts sent so far, after each part
+
+        Returns:
+            bool: If it was sent
+        """
+        if not is_webhook(webhook):
+            return False
+        if not message.get("content") and not message.get("embeds"):
+            return True
+
+        bucket = self._bucket(webhook)
+        parts = split_message(message)
+        async with bucket.lock:
+            for sent, part in enumerate(parts[start:], start + 1):
+                await self._post(webhook, part, bucket)
+                if on_part is not None:
+                    on_part(sent)
+        return True
+
+    async def _post(self, webhook, message, bucket):
+        """POST a message within rate limits.
+        Raises ClientResponseError if it wasn't accepted.
+        """
+        for attempt in range(1, DISCORD_RETRIES + 1):
+            delay = max(bucket.delay(), self._global_reset_at - time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            async with self._httpc.post(webhook, json=message) as res:
+                bucket.update(res.headers)
+                if res.status != 429:
+                    res.raise_for_status()
+                    return
+
+                try:
+                    retry_after = float(
+                        json.loads(await res.read()).get(
+                            "retry_after", res.headers.get("Retry-After", 1)
+                        )
+                    )
+                except (ValueError, AttributeError):
+                    retry_after = 1
+                logger.warning("Discord webhook rate limited, retry after %.1fs", retry_after)
+                if attempt == DISCORD_RETRIES or retry_after > DISCORD_RETRY_AFTER_MAX:
+                    res.raise_for_status()
+
+            reset_at = time.monotonic() + retry_after
+            if res.headers.get("X-RateLimit-Global"):
+                self._global_reset_at = reset_at
+            else:
+                bucket.remaining = 0
+                bucket.reset_at = reset_at
@@ -1,39 +1,54 @@
 import logging
 import math
+import os
 import re
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from smtplib import SMTP, SMTP_SSL, SMTPSenderRefused
+from smtplib import (SMTP, SMTP_SSL, SMTPAuthenticationError, SMTPException,
+                     SMTPResponseException, SMTPSenderRefused,
+                     SMTPServerDisconnected)
+from threading import BoundedSemaphore, Lock
 from typing import Optional
 
 from flask import logging as flogging
-from jinja2 import Environment, FileSystemLoader
 
 from ..config import (API_HOSTNAME, APP_NAME, BOT_EMAIL, BOT_EMAIL_PASSWORD,
-                      BOT_SMTP_HOSTNAME, EMAIL_REGEX, TEMPLATES_FOLDER,
-                      STATIC_HOSTNAME)
-from .database import get_db
+                      BOT_SMTP_HOSTNAME, BOT_SMTP_IS_SSL, BOT_SMTP_POOL_SIZE,
+                      EMAIL_REGEX, REQUEST_TIMEOUT, STATIC_HOSTNAME)
+from .database import connection
+from .templates import render
 
 
-jinja_env = Environment(loader=FileSystemLoader(TEMPLATES_FOLDER))
 logger = logging.getLogger("email")
 logger.addHandler(flogging.default_handler)
 
+# Connections used within this many seconds skip NOOP check
+SMTP_IDLE_CHECK = 30
+
 
 class EmailClient:
     """EmailClient base class.
-    Sending emails.
+    Sending emails over a pool of SMTP connections,
+    opened on first use and checked before reuse.
+    Servers drop idle connections, broken ones are reopened.
     """
 
-    def __init__(self, *, is_ssl: Optional[bool] = True):
-        self._server: Optional[SMTP] = None
-
-        if is_ssl:
-            self._server = SMTP_SSL(BOT_SMTP_HOSTNAME)
-        else:
-            self._server = SMTP(BOT_SMTP_HOSTNAME)
-        self._server.login(BOT_EMAIL, BOT_EMAIL_PASSWORD)
+    def __init__(
+        self,
+        *,
+        is_ssl: Optional[bool] = BOT_SMTP_IS_SSL,
+        size: Optional[int] = BOT_SMTP_POOL_SIZE,
+        timeout: Optional[int] = REQUEST_TIMEOUT,
+    ):
+        self._is_ssl = is_ssl
+        self._timeout = timeout
+        self._slots = BoundedSemaphore(size)
+        self._lock = Lock()
+        self._idle = []
+        self._pid = os.getpid()
 
     def __enter__(self):
         return self
@@ -42,8 +57,78 @@ class EmailClient:
         self.quit()
 
     def quit(self):
-        """Close the SMTP server"""
-        self._server.quit()
+        """Close idle SMTP connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            _close(server)
+
+    def _connect(self):
+        """Open and log in a connection"""
+        if self._is_ssl:
+            server = SMTP_SSL(BOT_SMTP_HOSTNAME, timeout=self._timeout)
+        else:
+            server = SMTP(BOT_SMTP_HOSTNAME, timeout=self._timeout)
+        try:
+            server.login(BOT_EMAIL, BOT_EMAIL_PASSWORD)
+        except SMTPAuthenticationError as e:
+            # Bad credentials fail every email, not just this one
+            logger.error("SMTP login of %s failed: %s", BOT_EMAIL, e)
+            _close(server)
+            raise
+        except BaseException:
+            _close(server)
+            raise
+        return server
+
+    def _checkout(self):
+        """Idle connection answering NOOP, or a new one"""
+        with self._lock:
+            # Sockets of parent process are not shared
+            if self._pid != os.getpid():
+                self._idle = []
+                self._pid = os.getpid()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, used = self._idle.pop()
+            if time.monotonic() - used < SMTP_IDLE_CHECK:
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (SMTPException, OSError):
+                pass
+            _close(server)
+        return self._connect()
+
+    @contextmanager
+    def connection(self):
+        """Check out a pooled connection.
+        Broken connections are closed instead of returned.
+
+        Yields:
+            SMTP: Logged in connection
+        """
+        with self._slots:
+            server = self._checkout()
+            try:
+                yield server
+            except BaseException as e:
+                if _is_broken(e):
+                    _close(server)
+                else:
+                    self._checkin(server)
+                raise
+            self._checkin(server)
+
+    def _checkin(self, server):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._idle.append((server, time.monotonic()))
+                return
+        _close(server)
 
     def send(self, mime):
         """Sends an email.
@@ -52,11 +137,44 @@ class EmailClient:
         Args:
             mime (MIMEBase): Message as MIME
         """
-        try:
-            self._server.sendmail(BOT_EMAIL, mime["To"], mime.as_string())
-        except SMTPSenderRefused as e:
-            logger.error(e)
-            self._server.connect()
+        error = self.send_many([mime])[0]
+        if error is not None:
+            raise error
+
+    def send_many(self, mimes):
+        """Sends emails back to back over one connection.
+        Reconnects once per message if server drops the connection.
+
+        Args:
+            mimes (list): Messages as MIME
+
+        Returns:
+            list: Exception per message, None if it was sent
+        """
+        errors = []
+        retried = False
+        while len(errors) < len(mimes):
+            try:
+                with self.connection() as server:
+                    for mime in mimes[len(errors):]:
+                        try:
+                            server.sendmail(BOT_EMAIL, mime["To"], mime.as_string())
+                        except SMTPException as e:
+                            if _is_broken(e):
+                                raise
+                            # Refused by server, connection is still fine
+                            logger.error(e)
+                            errors.append(e)
+                        else:
+                            errors.append(None)
+                        retried = False
+            except (SMTPException, OSError) as e:
+                if retried or not _is_broken(e):
+                    errors.extend([e] * (len(mimes) - len(errors)))
+                    break
+                logger.warning("SMTP connection dropped, reconnecting: %s", e)
+                retried = True
+        return errors
 
     def send_verification(self, recipient, code):
         """Sends verification email.
@@ -69,7 +187,8 @@ class EmailClient:
             generate_mime(
                 email_to=recipient,
                 email_subject=f"[{APP_NAME}] Verification",
-                body=jinja_env.get_template("verify.html").render(
+                body=render(
+                    "verify.html",
                     assets_link=STATIC_HOSTNAME,
                     verify_link=f"{API_HOSTNAME}/bot/verify/{code}",
                     verify_code=code,
@@ -78,6 +197,25 @@ class EmailClient:
         )
 
 
+def _is_broken(e):
+    """Whether exception leaves SMTP connection unusable"""
+    if isinstance(e, (SMTPServerDisconnected, SMTPSenderRefused)):
+        return True
+    # 421: Service not available, closing transmission channel
+    if isinstance(e, SMTPResponseException):
+        return e.smtp_code == 421
+    # SMTPException is an OSError too, socket errors are not SMTPException
+    return isinstance(e, OSError) and not isinstance(e, SMTPException)
+
+
+def _close(server):
+    """Close SMTP connection, politely if possible"""
+    try:
+        server.quit()
+    except (SMTPException, OSError):
+        server.close()
+
+
 def is_email(email):
     """Check if email syntax is correct
 
@@ -121,7 +259,7 @@ def verify_email(code):
         code (str): 9-digit code
     """
 
-    with get_db() as db_con:
+    with connection() as db_con:
         db_cur = db_con.cursor()
         db_res = db_cur.execute(
             """
@@ -140,9 +278,7 @@ def verify_email(code):
             (code,),
         ).fetchone()
         if not db_res:
-            return jinja_env.get_template("verify_failed.html").render(
-                assets_link=STATIC_HOSTNAME
-            )
+            return render("verify_failed.html", assets_link=STATIC_HOSTNAME)
 
         owner_id = db_res["owner_id"]
         email = db_res["verify_item"]
@@ -158,9 +294,7 @@ def verify_email(code):
                 > 29
         ):
             logger.info("%s - verification code has been expired", email)
-            return jinja_env.get_template("verify_failed.html").render(
-                assets_link=STATIC_HOSTNAME
-            )
+            return render("verify_failed.html", assets_link=STATIC_HOSTNAME)
 
         db_res = db_cur.execute(
             """
@@ -182,9 +316,7 @@ def verify_email(code):
             logger.info(
                 "%s - couldn't find the email, even though found a matching code", email
             )
-            return jinja_env.get_template("verify_failed.html").render(
-                assets_link=STATIC_HOSTNAME
-            )
+            return render("verify_failed.html", assets_link=STATIC_HOSTNAME)
 
         db_res = db_cur.execute(
             """
@@ -228,6 +360,4 @@ def verify_email(code):
 
         db_con.commit()
 
-    return jinja_env.get_template("verify_success.html").render(
-        assets_link=STATIC_HOSTNAME
-    )
+    return render("verify_success.html", assets_link=STATIC_HOSTNAME)
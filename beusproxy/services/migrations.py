@@ -0,0 +1,158 @@
+"""Database Migrations
+
+Versioned schema upgrades of main database, applied in place.
+Version is kept in PRAGMA user_version, 0 being beusp_init.sql.
+"""
+
+from ..common.utils import get_logger
+
+logger = get_logger(__name__)
+
+# Migration N upgrades database to version N.
+# Append only, never edit an applied migration.
+MIGRATIONS = [
+    # 1: Indexes of session, verification and subscriber lookups
+    [
+        """
+        CREATE INDEX IF NOT EXISTS Student_Sessions_owner
+        ON Student_Sessions (owner_id, logged_out, login_date);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS Student_Sessions_session
+        ON Student_Sessions (session_id);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS Verifications_code
+        ON Verifications (verify_code, verify_service, verified);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS Verifications_owner
+        ON Verifications (owner_id, verify_service, verified);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS Telegram_Subscribers_user
+        ON Telegram_Subscribers (telegram_user_id, telegram_chat_id);
+        """,
+        "ANALYZE;",
+    ],
+    # 2: Adaptive polling state of bot
+    [
+        "ALTER TABLE Student_Grades ADD COLUMN changed TEXT;",
+        """
+        ALTER TABLE Student_Grades
+        ADD COLUMN poll_interval INTEGER NOT NULL DEFAULT 120;
+        """,
+        "ALTER TABLE Student_Grades ADD COLUMN next_poll TEXT;",
+    ],
+    # 3: Bot worker heartbeats and shard leases
+    [
+        """
+        CREATE TABLE IF NOT EXISTS Bot_Workers (
+            worker TEXT PRIMARY KEY,
+            expires REAL NOT NULL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Bot_Leases (
+            shard INTEGER PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires REAL NOT NULL
+        );
+        """,
+    ],
+    # 4: Digest of stored grades
+    [
+        "ALTER TABLE Student_Grades ADD COLUMN digest TEXT;",
+    ],
+    # 5: Per-field grade change log, values are JSON encoded
+    [
+        """
+        CREATE TABLE IF NOT EXISTS Grade_Events (
+            id INTEGER PRIMARY KEY,
+            owner_id INTEGER NOT NULL,
+            course TEXT NOT NULL,
+            field TEXT NOT NULL,
+            old TEXT,
+            new TEXT,
+            ts TEXT NOT NULL,
+            FOREIGN KEY(owner_id) REFERENCES Students(id)
+        );
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS Grade_Events_owner
+        ON Grade_Events (owner_id, ts);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS Grade_Events_course
+        ON Grade_Events (owner_id, course, field, ts);
+        """,
+    ],
+    # 6: Notification outbox of bot
+    [
+        """
+        CREATE TABLE IF NOT EXISTS Notify_Outbox (
+            id INTEGER PRIMARY KEY,
+            owner_id INTEGER NOT NULL,
+            service TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            dedupe TEXT NOT NULL UNIQUE,
+            payload TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created TEXT NOT NULL,
+            updated TEXT,
+            next_try TEXT NOT NULL,
+            FOREIGN KEY(owner_id) REFERENCES Students(id)
+        );
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS Notify_Outbox_due
+        ON Notify_Outbox (state, next_try);
+        """,
+    ],
+]
+
+
+def schema_version(conn):
+    """Schema version of database
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+
+    Returns:
+        int: Version
+    """
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply pending migrations.
+    Writers are locked out while migrating,
+    so concurrent workers apply each migration once.
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+
+    Returns:
+        int: Version after migrating
+    """
+    if schema_version(conn) >= len(MIGRATIONS):
+        return schema_version(conn)
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        # Another worker may have migrated meanwhile
+        version = schema_version(conn)
+        for version, statements in enumerate(MIGRATIONS[version:], version + 1):
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version};")
+            logger.info("Database migrated to version %d", version)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return version
@@ -0,0 +1,189 @@
+"""Photo Cache Service
+
+Student photos stored on disk, keyed by hash of ImgID.
+Least recently served photos are evicted over size limit.
+"""
+
+import hashlib
+import os
+import tempfile
+from threading import Lock
+from typing import Optional
+
+from ..config import PHOTO_CACHE, PHOTO_CACHE_SIZE
+
+# Leading bytes of JPEG files, cached photos are served as image/jpeg
+PHOTO_MAGIC = b"\xff\xd8\xff"
+
+
+class PhotoWriter:
+    """PhotoWriter base class.
+    Writes a streamed photo into a temporary file,
+    moved into cache only if the stream completes.
+    Streams not starting as a JPEG are never cached.
+    """
+
+    def __init__(self, cache, path=None):
+        self._cache = cache
+        self._path = path
+        self._size = 0
+        self._file = None
+        self._tmp = None
+        if path is None:
+            return
+        try:
+            os.makedirs(cache.folder, exist_ok=True)
+            fd, self._tmp = tempfile.mkstemp(dir=cache.folder, suffix=".part")
+            self._file = os.fdopen(fd, "wb")
+        except OSError:
+            self._tmp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        # Interrupted streams are never cached
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+    def write(self, chunk):
+        """Write a chunk, giving up over size limit"""
+        if self._file is None:
+            return
+        if self._size == 0 and not chunk.startswith(PHOTO_MAGIC):
+            self.abort()
+            return
+        self._size += len(chunk)
+        try:
+            if self._size > self._cache.max_bytes:
+                raise OSError("Photo is larger than cache")
+            self._file.write(chunk)
+        except OSError:
+            self.abort()
+
+    def commit(self):
+        """Move completed photo into cache"""
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+            os.replace(self._tmp, self._path)
+        except OSError:
+            self.abort()
+            return
+        self._file = None
+        self._cache.evict()
+
+    def abort(self):
+        """Drop incomplete photo"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._tmp is not None:
+            try:
+                os.unlink(self._tmp)
+            except FileNotFoundError:
+                pass
+            self._tmp = None
+
+
+class PhotoCache:
+    """PhotoCache base class.
+    Photos are files named after hash of ImgID,
+    modification time marks the last time served.
+    """
+
+    def __init__(
+        self,
+        folder: Optional[str] = PHOTO_CACHE,
+        *,
+        max_bytes: Optional[int] = PHOTO_CACHE_SIZE,
+    ):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+
+    @property
+    def enabled(self):
+        """Caching is disabled with size of 0"""
+        return self.max_bytes > 0
+
+    @staticmethod
+    def etag(img_id):
+        """Entity tag of a photo.
+        Photo of an ImgID never changes.
+
+        Args:
+            img_id (str): ImgID
+
+        Returns:
+            str: Entity tag
+        """
+        return hashlib.sha256(img_id.encode("UTF-8")).hexdigest()[:32]
+
+    def _path(self, img_id):
+        return os.path.join(self.folder, f"{self.etag(img_id)}.jpg")
+
+    def get(self, img_id):
+        """Open a cached photo
+
+        Args:
+            img_id (str): ImgID
+
+        Returns:
+            BufferedReader: Photo file or None if not cached
+        """
+        if not self.enabled:
+            return None
+        path = self._path(img_id)
+        try:
+            f = open(path, "rb")  # pylint: disable=R1732
+        except OSError:
+            return None
+        try:
+            # Mark as recently served
+            os.utime(f.fileno())
+        except OSError:
+            pass
+        return f
+
+    def writer(self, img_id):
+        """Writer of a photo being streamed
+
+        Args:
+            img_id (str): ImgID
+
+        Returns:
+            PhotoWriter: Writer, discarding chunks if caching is disabled
+        """
+        if not self.enabled:
+            return PhotoWriter(self)
+        return PhotoWriter(self, self._path(img_id))
+
+    def evict(self):
+        """Remove least recently served photos over size limit"""
+        with self._lock:
+            photos = []
+            total = 0
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    if not entry.name.endswith(".jpg"):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    photos.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+
+            photos.sort()
+            for _, size, path in photos:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
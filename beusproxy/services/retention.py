@@ -0,0 +1,153 @@
+"""Session Retention
+
+Deletes old sessions and delivered notifications,
+then compacts main database.
+Run by bot daily, or by hand:
+
+python3 -m beusproxy.services.retention --days 30
+"""
+
+import argparse
+from datetime import datetime, timedelta
+
+from ..common.utils import get_logger
+from ..config import SESSION_RETENTION_DAYS
+from .database import connection
+
+logger = get_logger(__name__)
+
+
+class RetentionReport:
+    """Retention Report Model"""
+
+    def __init__(self, sessions, pages_before, pages_after, *, notifications=0):
+        self.sessions = sessions
+        self.notifications = notifications
+        self.pages_before = pages_before
+        self.pages_after = pages_after
+
+    @property
+    def reclaimed(self):
+        """Pages returned to file system"""
+        return self.pages_before - self.pages_after
+
+    def __str__(self):
+        return (
+            f"{self.sessions} sessions, "
+            f"{self.notifications} notifications deleted, "
+            f"{self.reclaimed} of {self.pages_before} pages reclaimed"
+        )
+
+
+def prune_sessions(conn, days=SESSION_RETENTION_DAYS):
+    """Delete logged out sessions older than given days.
+    Sessions not logged out are kept, even if superseded,
+    /logout still ends them on root server.
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        days (int): Retention in days
+
+    Returns:
+        int: Deleted sessions
+    """
+    before = (datetime.now() - timedelta(days=days)).isoformat()
+    db_res = conn.execute(
+        """
+        DELETE FROM Student_Sessions
+        WHERE
+            login_date < ? AND
+            logged_out = 1;
+    """,
+        (before,),
+    )
+    conn.commit()
+    return db_res.rowcount
+
+
+def prune_notifications(conn, days=SESSION_RETENTION_DAYS):
+    """Delete sent and dead notifications older than given days.
+    Pending ones are kept until delivered or given up.
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        days (int): Retention in days
+
+    Returns:
+        int: Deleted notifications
+    """
+    before = (datetime.now() - timedelta(days=days)).isoformat()
+    db_res = conn.execute(
+        """
+        DELETE FROM Notify_Outbox
+        WHERE
+            state != 'pending' AND
+            created < ?;
+    """,
+        (before,),
+    )
+    conn.commit()
+    return db_res.rowcount
+
+
+def compact(conn):
+    """Return free pages to file system and refresh statistics.
+    Database is vacuumed once to enable incremental vacuum.
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+
+    Returns:
+        tuple: Page count before and after
+    """
+    if conn.in_transaction:
+        conn.commit()
+    pages_before = conn.execute("PRAGMA page_count;").fetchone()[0]
+
+    # 2 is INCREMENTAL
+    if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+        conn.execute("VACUUM;")
+    else:
+        conn.execute("PRAGMA incremental_vacuum;").fetchall()
+    conn.execute("ANALYZE Student_Sessions;")
+    conn.commit()
+
+    return pages_before, conn.execute("PRAGMA page_count;").fetchone()[0]
+
+
+def run_retention(days=SESSION_RETENTION_DAYS):
+    """Prune sessions and notifications, then compact database
+
+    Args:
+        days (int): Retention in days
+
+    Returns:
+        RetentionReport: Report
+    """
+    with connection() as conn:
+        sessions = prune_sessions(conn, days)
+        notifications = prune_notifications(conn, days)
+        report = RetentionReport(
+            sessions, *compact(conn), notifications=notifications
+        )
+    logger.info("Retention: %s", report)
+    return report
+
+
+def main():
+    """Retention CLI"""
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument(
+        "-d",
+        "--days",
+        type=int,
+        default=SESSION_RETENTION_DAYS,
+        help="Keep sessions and notifications younger than given days",
+    )
+    args = ap.parse_args()
+    print(run_retention(args.days))
+
+
+if __name__ == "__main__":
+    main()
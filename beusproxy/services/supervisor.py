@@ -0,0 +1,248 @@
+"""Process Supervisor
+
+Runs a subsystem in a child process and restarts it when it exits
+unexpectedly. With a lock file, an advisory lock elects one supervisor
+among processes sharing it, others stand by and take over once the lock
+is released, which the OS does as soon as its holder dies.
+The holder keeps its status in the lock file, read by /status.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+from multiprocessing import Process, current_process
+
+# Imported on load, so that atexit cleanups registered after
+# closing supervisors run before multiprocessing joins children
+from multiprocessing.connection import Pipe
+
+from ..common.utils import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds between checks and heartbeats, also lock retries of standbys
+SUPERVISOR_INTERVAL = 1
+# Seconds a heartbeat is trusted by read_status
+HEARTBEAT_TTL = 15
+# Restart delay, doubling up to RESTART_BACKOFF_MAX.
+# Reset once a child runs for RESTART_STABLE seconds.
+RESTART_BACKOFF = 1
+RESTART_BACKOFF_MAX = 60
+RESTART_STABLE = 60
+# Seconds a child is given to exit on shutdown
+SHUTDOWN_TIMEOUT = 15
+
+
+def try_lock(lock_path):
+    """Take an exclusive advisory lock, without waiting
+
+    Args:
+        lock_path (str): Lock file, created if missing
+
+    Returns:
+        int: Locked file descriptor, None if held elsewhere
+    """
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _child(target, conn, lock_fd, args):
+    """Child entrypoint.
+    Drops inherited lock, so it is held by supervisor alone.
+    Shutdown is requested over conn, or assumed once supervisor is gone.
+    """
+    if lock_fd is not None:
+        os.close(lock_fd)
+
+    shevent = threading.Event()
+    ppid = os.getppid()
+
+    def watch():
+        try:
+            while not conn.poll(SUPERVISOR_INTERVAL):
+                if os.getppid() != ppid:
+                    logger.error(
+                        "%s process lost its supervisor, shutting down",
+                        current_process().name.capitalize(),
+                    )
+                    break
+        except (EOFError, OSError):
+            pass
+        shevent.set()
+
+    threading.Thread(target=watch, daemon=True).start()
+    target(shevent, *args)
+
+
+class Supervisor:
+    """Supervisor base class.
+    Calls target(shevent, *args) in a child process,
+    restarting it with backoff until shevent is set.
+    Children are given their own shevent, set on shutdown, as
+    a process dying while waiting on a shared Event breaks it.
+    """
+
+    def __init__(self, name, target, *, args=(), lock_path=None, shevent=None):
+        # pylint: disable=R0913
+        self.name = name
+        self.restarts = 0
+        self._target = target
+        self._args = args
+        self._lock_path = lock_path
+        self._shevent = threading.Event() if shevent is None else shevent
+        self._lock_fd = None
+        self._proc = None
+        self._conn = None
+        self._started = None
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def start(self):
+        """Supervise in a background thread
+
+        Returns:
+            Supervisor: self
+        """
+        self._thread = threading.Thread(
+            name=f"{self.name}-supervisor", target=self.run, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Stop child and release lock"""
+        self._shevent.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run(self):
+        """Supervise in caller, until shevent is set"""
+        while not self._acquire():
+            if self._shevent.wait(SUPERVISOR_INTERVAL):
+                return
+
+        failures = 0
+        try:
+            while not self._shevent.is_set():
+                self._spawn()
+                while self._proc.is_alive():
+                    self._write_status()
+                    self._proc.join(SUPERVISOR_INTERVAL)
+                    if self._shevent.is_set():
+                        self._stop()
+                self._conn.close()
+
+                if self._shevent.is_set():
+                    break
+
+                if time.monotonic() - self._started >= RESTART_STABLE:
+                    failures = 0
+                delay = min(RESTART_BACKOFF * 2**failures, RESTART_BACKOFF_MAX)
+                failures += 1
+                self.restarts += 1
+                logger.error(
+                    "%s process exited with %s, restarting in %ds",
+                    self.name.capitalize(),
+                    self._proc.exitcode,
+                    delay,
+                )
+                self._write_status()
+                self._shevent.wait(delay)
+        finally:
+            self._release()
+
+    def _spawn(self):
+        self._conn, conn = Pipe()
+        self._proc = Process(
+            name=self.name,
+            target=_child,
+            args=(self._target, conn, self._lock_fd, self._args),
+        )
+        self._proc.start()
+        conn.close()
+        self._started = time.monotonic()
+        logger.info("%s process spawned - PID:%d", self.name.capitalize(), self._proc.pid)
+
+    def _stop(self):
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self._proc.join(SHUTDOWN_TIMEOUT)
+        if self._proc.is_alive():
+            logger.error("%s process didn't exit, terminating", self.name.capitalize())
+            self._proc.terminate()
+            self._proc.join()
+
+    def _acquire(self):
+        """Take lock file, if any
+
+        Returns:
+            bool: True if this supervisor should run the child
+        """
+        if self._lock_path is None:
+            return True
+
+        self._lock_fd = try_lock(self._lock_path)
+        if self._lock_fd is None:
+            return False
+        logger.info("%s supervised by PID:%d", self.name.capitalize(), os.getpid())
+        return True
+
+    def _release(self):
+        if self._lock_fd is None:
+            return
+        os.ftruncate(self._lock_fd, 0)
+        os.close(self._lock_fd)
+        self._lock_fd = None
+
+    def _write_status(self):
+        if self._lock_fd is None:
+            return
+        status = json.dumps(
+            {
+                "supervisor": os.getpid(),
+                "pid": self._proc.pid if self._proc.exitcode is None else None,
+                "restarts": self.restarts,
+                "heartbeat": time.time(),
+            }
+        ).encode()
+        # Overwritten in place, readers never see an empty file
+        os.pwrite(self._lock_fd, status, 0)
+        os.ftruncate(self._lock_fd, len(status))
+
+
+def read_status(lock_path):
+    """Status of supervisor holding lock file
+
+    Args:
+        lock_path (str): Lock file
+
+    Returns:
+        dict: alive and restarts, alive being True
+        if child runs and supervisor heartbeats
+    """
+    try:
+        with open(lock_path, "r", encoding="UTF-8") as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return {"alive": False, "restarts": 0}
+
+    fresh = time.time() - status["heartbeat"] < HEARTBEAT_TTL
+    return {
+        "alive": fresh and status["pid"] is not None,
+        "restarts": status["restarts"],
+    }
@@ -1,14 +1,19 @@
+import fcntl
 import math
+import os
 import re
 import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from sqlite3 import Error
-from threading import Event, Thread
+from threading import Condition, Event, Lock, Thread
 from typing import Optional
 
 import requests
 from jinja2 import Environment
 from requests import RequestException
+from requests.adapters import HTTPAdapter
 
 from ..common.utils import get_logger
 from ..config import (
@@ -18,16 +23,39 @@ from ..config import (
     REQUEST_TIMEOUT,
     WEB_HOSTNAME,
 )
-from .database import get_db
+from .database import connection
 
 logger = get_logger(__name__)
 
+# Telegram allows about 30 messages per second,
+# and one per second in the same chat
+RATE_GLOBAL = 30
+RATE_CHAT = 1
+# 429 is retried in place while retry_after is short,
+# otherwise raised to caller
+TELEGRAM_RETRIES = 3
+TELEGRAM_RETRY_AFTER_MAX = 30
+TELEGRAM_POOL_MAXSIZE = 8
+TELEGRAM_CHAT_BUCKETS = 1024
+# Updates handled at once, in order within a chat
+TELEGRAM_UPDATE_WORKERS = 8
+# Polling pauses while this many updates are in flight
+TELEGRAM_MAX_PENDING = 256
+# Seconds between polls while updates are in flight
+TELEGRAM_INFLIGHT_WAIT = 1
+
 
 class TelegramClient:
     # pylint: disable=R0902
     # pylint: disable=R0913
     """Telegram base class.
-    Getting updates, sending messages
+    Getting updates, sending messages.
+
+    Updates are handled by a pool of worker threads,
+    in order within each chat. Long polling confirms an update
+    to Telegram only after it is handled, so that updates
+    in flight are fetched again after a crash.
+    Without polling, updates are submitted by webhook.
     """
 
     def __init__(
@@ -39,46 +67,38 @@ class TelegramClient:
         api_hostname=BOT_TELEGRAM_HOSTNAME,
         api_key=BOT_TELEGRAM_API_KEY,
         worker_name: Optional[str] = None,
+        workers=TELEGRAM_UPDATE_WORKERS,
+        poll=True,
+        chat_lock: Optional[str] = None,
     ):
         self._jinja_env = jinja_env
         self._request_timeout = request_timeout
         self._polling_timeout = polling_timeout
-        self._api_hostname = api_hostname
-        self._api_key = api_key
-        self._offset = None
-
-        def updates_thread():
-            # pylint: disable=W3101
-            """Telegram Updates Thread"""
-            while not self._shevent.is_set():
-                try:
-                    res = requests.request(
-                        "GET",
-                        f"https://{api_hostname}/bot{api_key}/getUpdates",
-                        params={
-                            k: v
-                            for k, v in {
-                                "offset": self._offset,
-                                "timeout": self._polling_timeout,
-                            }.items()
-                            if v is not None
-                        },
-                        timeout=None,
-                    )
-                    if res.status_code == 200:
-                        for u in res.json()["result"]:
-                            self._offset = u["update_id"] + 1
-                            self.process_update(u)
-                    else:
-                        logger.error("Error while getting updates")
-                        time.sleep(self._request_timeout)
-                except TimeoutError as e:
-                    logger.error(e)
-            logger.info("TelegramClient shutting down...")
+        self._api = TelegramAPI(
+            api_hostname=api_hostname, api_key=api_key, timeout=request_timeout
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="telegram"
+        )
+        self._cond = Condition()
+        # Pending updates by chat, head is being handled
+        self._chats = {}
+        self._inflight = set()
+        # Next update_id, not fetched yet
+        self._next = None
+        # Byte chat_id of chat_lock is locked while handling, so that
+        # processes sharing it never handle a chat at the same time
+        self._chat_lock = None
+        if chat_lock is not None:
+            self._chat_lock = os.open(chat_lock, os.O_RDWR | os.O_CREAT, 0o644)
 
         self._shevent = Event()
-        self._worker = Thread(name=worker_name, target=updates_thread, daemon=True)
-        self._worker.start()
+        self._worker = None
+        if poll:
+            self._worker = Thread(
+                name=worker_name, target=self._updates_thread, daemon=True
+            )
+            self._worker.start()
 
     def __enter__(self):
         return self
@@ -89,6 +109,117 @@ class TelegramClient:
     def close(self):
         """Close TelegramClient"""
         self._shevent.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._worker is not None:
+            self._worker.join(self._request_timeout)
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._api.close()
+        if self._chat_lock is not None:
+            os.close(self._chat_lock)
+            self._chat_lock = None
+
+    def _updates_thread(self):
+        """Telegram Updates Thread"""
+        try:
+            self._api.call("deleteWebhook")
+        except RequestException as e:
+            logger.error("Couldn't delete webhook: %s", e)
+
+        while not self._shevent.is_set():
+            with self._cond:
+                # Updates in flight are fetched again, until handled
+                if self._inflight:
+                    self._cond.wait(TELEGRAM_INFLIGHT_WAIT)
+                while len(self._inflight) >= TELEGRAM_MAX_PENDING:
+                    if self._shevent.is_set():
+                        return
+                    self._cond.wait()
+                offset = min(self._inflight, default=self._next)
+                timeout = 0 if self._inflight else self._polling_timeout
+
+            try:
+                res = self._api.call(
+                    "getUpdates",
+                    {
+                        k: v
+                        for k, v in {
+                            "offset": offset,
+                            "timeout": timeout,
+                            "allowed_updates": ["message"],
+                        }.items()
+                        if v is not None
+                    },
+                    timeout=timeout + self._request_timeout,
+                )
+            except RequestException as e:
+                logger.error("Error while getting updates: %s", e)
+                self._shevent.wait(self._request_timeout)
+                continue
+
+            for u in res["result"]:
+                if self._next is not None and u["update_id"] < self._next:
+                    continue
+                self._next = u["update_id"] + 1
+                self.submit(u)
+        logger.info("TelegramClient shutting down...")
+
+    def submit(self, u):
+        """Queue an update, after earlier updates of its chat
+
+        Args:
+            u (dict): Update object
+
+        Returns:
+            Future: Resolved once update is handled
+        """
+        future = Future()
+        chat_id = u.get("message", {}).get("chat", {}).get("id")
+        with self._cond:
+            self._inflight.add(u["update_id"])
+            queue = self._chats.get(chat_id)
+            if queue is None:
+                queue = self._chats[chat_id] = deque()
+                self._executor.submit(self._drain, chat_id, queue)
+            queue.append((u, future))
+        return future
+
+    def _drain(self, chat_id, queue):
+        """Handle updates of a chat one by one"""
+        while True:
+            with self._cond:
+                if not queue:
+                    del self._chats[chat_id]
+                    return
+                u, future = queue[0]
+
+            try:
+                self._process_locked(chat_id, u)
+                future.set_result(None)
+            except Exception as e:  # pylint: disable=W0718
+                logger.exception("Update %d failed", u["update_id"])
+                future.set_exception(e)
+
+            with self._cond:
+                queue.popleft()
+                self._inflight.discard(u["update_id"])
+                self._cond.notify_all()
+
+    def _process_locked(self, chat_id, u):
+        """Handle an update, holding its chat in chat_lock if any.
+        Record locks are per process, updates of a chat are
+        already one at a time within process.
+        """
+        if self._chat_lock is None or not isinstance(chat_id, int):
+            self.process_update(u)
+            return
+
+        offset = chat_id % 2**62
+        fcntl.lockf(self._chat_lock, fcntl.LOCK_EX, 1, offset)
+        try:
+            self.process_update(u)
+        finally:
+            fcntl.lockf(self._chat_lock, fcntl.LOCK_UN, 1, offset)
 
     def start_cmd(self, chat_id, user_id):
         """/start command logic.
@@ -138,7 +269,7 @@ class TelegramClient:
             return
         logger.info("User '@%s' tried to verify code: %s", user_id, m.group(1))
 
-        with get_db() as db_con:
+        with connection() as db_con:
             db_cur = db_con.cursor()
             db_res = db_cur.execute(
                 """
@@ -260,52 +391,52 @@ class TelegramClient:
             chat_id (int): Telegram Chat ID
             user_id (str): Telegram user_id
         """
-        db_con = get_db()
-        db_cur = db_con.cursor()
-
-        db_res = db_cur.execute(
-            """
-            UPDATE
-                Students
-            SET
-                active_telegram_id = NULL
-            WHERE
-                active_telegram_id IN (
-                    SELECT
-                        ts.telegram_id
-                    FROM
-                        Telegram_Subscribers ts
-                    WHERE
-                        ts.telegram_user_id = ? AND
-                        ts.telegram_chat_id = ?
-                );
-        """,
-            (user_id, chat_id),
-        )
+        with connection() as db_con:
+            db_cur = db_con.cursor()
 
-        if not db_res.rowcount > 0:
-            db_con.rollback()
+            db_res = db_cur.execute(
+                """
+                UPDATE
+                    Students
+                SET
+                    active_telegram_id = NULL
+                WHERE
+                    active_telegram_id IN (
+                        SELECT
+                            ts.telegram_id
+                        FROM
+                            Telegram_Subscribers ts
+                        WHERE
+                            ts.telegram_user_id = ? AND
+                            ts.telegram_chat_id = ?
+                    );
+            """,
+                (user_id, chat_id),
+            )
+
+            if not db_res.rowcount > 0:
+                db_con.rollback()
+                send_template(
+                    "unsubscribe_nosub",
+                    chat_id,
+                    user_id,
+                    WEB_HOSTNAME,
+                    jinja_env=self._jinja_env,
+                )
+                logger.info(
+                    "Couldn't unsubscribe for telegram user '@%s'. No subscriptions",
+                    user_id,
+                )
+                return
+
+            db_con.commit()
             send_template(
-                "unsubscribe_nosub",
+                "unsubscribe",
                 chat_id,
                 user_id,
-                WEB_HOSTNAME,
                 jinja_env=self._jinja_env,
             )
-            logger.info(
-                "Couldn't unsubscribe for telegram user '@%s'. No subscriptions",
-                user_id,
-            )
-            return
-
-        db_con.commit()
-        send_template(
-            "unsubscribe",
-            chat_id,
-            user_id,
-            jinja_env=self._jinja_env,
-        )
-        logger.info("Telegram user '@%s' unsubscribed", user_id)
+            logger.info("Telegram user '@%s' unsubscribed", user_id)
 
     def process_update(self, u):
         """Process verifications queue
@@ -349,24 +480,196 @@ class TelegramClient:
                     logger.error(e)
 
 
-def get_me():
-    """Telegram API: getMe
+class TokenBucket:
+    """Token Bucket Model
+
+    Thread-safe. Tokens are reserved in advance,
+    so concurrent callers queue up instead of bursting.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def reserve(self):
+        """Take a token
+
+        Returns:
+            float: Seconds to wait before using it
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return max(-self._tokens / self.rate, 0)
+
+    def pause(self, seconds):
+        """Hold next token back for given seconds
+
+        Args:
+            seconds (float): Seconds
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+    def idle(self):
+        """Whether bucket is full"""
+        with self._lock:
+            self._refill()
+            return self._tokens >= self.capacity
+
+
+class TelegramAPI:
+    """TelegramAPI base class.
+    Bot API calls over a pooled keep-alive session, one per process.
+    Messages are paced by token buckets within Telegram limits,
+    429 responses are retried after retry_after.
+    """
+
+    def __init__(
+        self,
+        *,
+        api_hostname=BOT_TELEGRAM_HOSTNAME,
+        api_key=BOT_TELEGRAM_API_KEY,
+        timeout=REQUEST_TIMEOUT,
+    ):
+        self._base_url = f"https://{api_hostname}/bot{api_key}"
+        self._timeout = timeout
+        self._lock = Lock()
+        self._pid = None
+        self._session = None
+        self._global = TokenBucket(RATE_GLOBAL)
+        self._chats = {}
+
+    @property
+    def session(self):
+        """Session of current process.
+        Created lazily, recreated after fork.
+
+        Returns:
+            Session: requests.Session
+        """
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                self._session = requests.Session()
+                self._session.mount(
+                    "https://", HTTPAdapter(pool_maxsize=TELEGRAM_POOL_MAXSIZE)
+                )
+                self._pid = os.getpid()
+            return self._session
+
+    def close(self):
+        """Close pooled connections"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._pid = None
+
+    def _chat_bucket(self, chat_id):
+        with self._lock:
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                # Forget chats which are quiet again
+                if len(self._chats) >= TELEGRAM_CHAT_BUCKETS:
+                    self._chats = {
+                        k: v for k, v in self._chats.items() if not v.idle()
+                    }
+                bucket = self._chats[chat_id] = TokenBucket(RATE_CHAT)
+            return bucket
+
+    def call(self, method, payload=None, *, chat_id=None, **kwargs):
+        """Call a Bot API method with JSON body.
+        Calls with chat_id are paced per chat and globally.
+
+        Args:
+            method (str): Bot API method
+            payload (dict): Parameters
+            chat_id (int): Chat messaged by the call
+
+        Returns:
+            dict: JSON response
+        """
+        kwargs.setdefault("timeout", self._timeout)
+        for _ in range(TELEGRAM_RETRIES):
+            if chat_id is not None:
+                time.sleep(
+                    max(self._global.reserve(), self._chat_bucket(chat_id).reserve())
+                )
+            res = self.session.post(
+                f"{self._base_url}/{method}", json=payload, **kwargs
+            )
+            if res.status_code != 429:
+                break
+
+            try:
+                retry_after = res.json()["parameters"]["retry_after"]
+            except (ValueError, KeyError, TypeError):
+                retry_after = 1
+            logger.warning("Telegram %s rate limited, retry after %ds", method, retry_after)
+            if retry_after > TELEGRAM_RETRY_AFTER_MAX:
+                break
+            if chat_id is not None:
+                self._chat_bucket(chat_id).pause(retry_after)
+            else:
+                time.sleep(retry_after)
+
+        if res.status_code != 200:
+            raise RequestException(res.status_code, res.text)
+
+        return res.json()
+
+
+api = TelegramAPI()
+
+
+def set_webhook(url, secret_token):
+    """Telegram API: setWebhook
+    Updates are sent to url instead of being polled.
+
+    Args:
+        url (str): Webhook URL
+        secret_token (str): Sent back in X-Telegram-Bot-Api-Secret-Token
 
     Returns:
         dict: JSON response
     """
-    res = requests.request(
-        "GET",
-        f"https://{BOT_TELEGRAM_HOSTNAME}/bot{BOT_TELEGRAM_API_KEY}/getMe",
-        timeout=REQUEST_TIMEOUT,
+    return api.call(
+        "setWebhook",
+        {
+            "url": url,
+            "secret_token": secret_token,
+            "allowed_updates": ["message"],
+        },
     )
-    if res is None:
-        return res
 
-    if res.status_code != 200:
-        raise RequestException(res.status_code)
 
-    return res.json()
+def get_webhook_info():
+    """Telegram API: getWebhookInfo
+
+    Returns:
+        dict: JSON response
+    """
+    return api.call("getWebhookInfo")
+
+
+def get_me():
+    """Telegram API: getMe
+
+    Returns:
+        dict: JSON response
+    """
+    return api.call("getMe")
 
 
 def send_message(text=None, chat_id=None, *, params=None):
@@ -383,17 +686,7 @@ def send_message(text=None, chat_id=None, *, params=None):
         params["text"] = text
     if chat_id:
         params["chat_id"] = chat_id
-    res = requests.request(
-        "GET",
-        f"https://{BOT_TELEGRAM_HOSTNAME}/bot{BOT_TELEGRAM_API_KEY}/sendMessage",
-        params=params,
-        timeout=REQUEST_TIMEOUT,
-    )
-
-    if not res.status_code == 200:
-        raise RequestException(res.status_code, res.text)
-
-    return res.json()
+    return api.call("sendMessage", params, chat_id=params.get("chat_id"))
 
 
 def send_template(template, chat_id, *args, jinja_env):
@@ -1,51 +1,121 @@
 import os
 import time
-from multiprocessing import Event, Process
-from pathlib import Path
+from threading import Lock
 
-from jinja2 import Environment, FileSystemLoader
+from requests import RequestException
 
 from ..common.utils import get_logger
-from ..config import TEMPLATES_FOLDER
-from .telegram import TelegramClient
+from ..config import API_HOSTNAME, BOT_TELEGRAM_WEBHOOK_SECRET
+from .supervisor import Supervisor, read_status, try_lock
+from .telegram import TelegramClient, get_webhook_info, set_webhook
+from .templates import registry
+
+logger = get_logger(__name__)
+
+# Held by the worker supervising Telegram polling,
+# or registering the webhook in webhook mode
+TELEGRAM_LOCK = ".telegram.lock"
+# Chats being handled by webhook workers
+TELEGRAM_CHATS_LOCK = ".telegram.chats.lock"
+# Webhook is reported dead for this many seconds after a delivery error
+WEBHOOK_ERROR_TTL = 600
+# Seconds webhook status is reused, sparing Telegram a call per /status
+WEBHOOK_INFO_TTL = 30
+
+_webhook_status = {"checked": None, "status": None}
+_webhook_status_lock = Lock()
+
+
+def proc_telegram(shevent):
+    tc = TelegramClient(registry.env)
+    try:
+        shevent.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tc.close()
 
 
 class TelegramProc:
-    """Telegram Process Base Class"""
+    """Telegram Process Base Class
+
+    Every worker supervises, one holding TELEGRAM_LOCK polls
+    in a child process. Others take over if it dies.
+    """
 
     def __init__(self):
-        self._shevent = Event()
-        self._proc = None
-        self._lock_file = Path(".telegram.lock")
-        if not self._lock_file.exists():
-            self._lock_file.write_text(str(os.getpid()), encoding="UTF-8")
-            time.sleep(1)
-            if self._lock_file.read_text(encoding="UTF-8") == str(os.getpid()):
-                get_logger(__package__).info("Telegram Process spawned - PID:%d", os.getpid())
-            else:
-                return
-        else:
-            return
-
-        def proc_init():
-            tc = TelegramClient(
-                Environment(loader=FileSystemLoader(TEMPLATES_FOLDER)),
-            )
-            while not self._shevent.is_set():
-                try:
-                    time.sleep(2)
-                except KeyboardInterrupt:
-                    self._shevent.set()
-                    tc.close()
-            tc.close()
-
-        self._proc = Process(target=proc_init)
-        self._proc.start()
+        self._supervisor = Supervisor(
+            "telegram", proc_telegram, lock_path=TELEGRAM_LOCK
+        ).start()
 
     def close(self):
         """Close Telegram Connection"""
-        if self._proc:
-            self._shevent.set()
-            self._proc.join()
-            if self._lock_file.exists():
-                self._lock_file.unlink()
+        self._supervisor.close()
+
+
+class TelegramWebhook:
+    """Telegram Webhook Base Class
+
+    Every worker handles updates posted to it, one chat at a time
+    across workers. Webhook is registered by the worker holding
+    TELEGRAM_LOCK only.
+    """
+
+    def __init__(self, url, secret_token):
+        self._client = TelegramClient(
+            registry.env, poll=False, chat_lock=TELEGRAM_CHATS_LOCK
+        )
+        self._lock_fd = try_lock(TELEGRAM_LOCK)
+        if self._lock_fd is not None:
+            try:
+                set_webhook(url, secret_token)
+                logger.info("Telegram webhook set - PID:%d", os.getpid())
+            except RequestException as e:
+                logger.error("Couldn't set Telegram webhook: %s", e)
+
+    def submit(self, u):
+        """Queue an update, see TelegramClient.submit"""
+        return self._client.submit(u)
+
+    def close(self):
+        """Close Telegram Connection"""
+        self._client.close()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+
+def telegram_status():
+    """Liveness of Telegram updates.
+    In webhook mode, as Telegram saw it within WEBHOOK_INFO_TTL.
+
+    Returns:
+        dict: alive, and restarts of polling process
+            or pendingUpdates and lastError of webhook
+    """
+    if not BOT_TELEGRAM_WEBHOOK_SECRET:
+        return read_status(TELEGRAM_LOCK)
+
+    # Checked by one thread at a time, others reuse its result
+    with _webhook_status_lock:
+        checked = _webhook_status["checked"]
+        if checked is None or time.monotonic() - checked >= WEBHOOK_INFO_TTL:
+            _webhook_status["status"] = _webhook_info_status()
+            _webhook_status["checked"] = time.monotonic()
+        return _webhook_status["status"]
+
+
+def _webhook_info_status():
+    """Webhook status as reported by getWebhookInfo"""
+    try:
+        info = get_webhook_info()["result"]
+    except (RequestException, KeyError) as e:
+        logger.error("Couldn't get Telegram webhook info: %s", e)
+        return {"alive": False, "pendingUpdates": None, "lastError": None}
+
+    failing = time.time() - info.get("last_error_date", 0) < WEBHOOK_ERROR_TTL
+    return {
+        "alive": info.get("url") == f"{API_HOSTNAME}bot/telegram" and not failing,
+        "pendingUpdates": info.get("pending_update_count"),
+        "lastError": info.get("last_error_message"),
+    }
@@ -0,0 +1,83 @@
+"""Template Registry
+
+Templates of API and bot, compiled once per process
+and rendered from memory. Compiled templates are also kept
+in TEMPLATES_CACHE, if set, so restarts skip compiling.
+"""
+
+import os
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from ..common.utils import get_logger
+from ..config import TEMPLATES_CACHE, TEMPLATES_FOLDER
+
+logger = get_logger(__name__)
+
+BOT_TEMPLATES_FOLDER = "bot/templates"
+
+
+class TemplateRegistry:
+    """TemplateRegistry base class.
+    One environment for API and bot templates.
+    Templates are never evicted nor checked for changes.
+    """
+
+    def __init__(self, folders=None, *, cache_folder=TEMPLATES_CACHE):
+        if folders is None:
+            folders = [TEMPLATES_FOLDER, BOT_TEMPLATES_FOLDER]
+
+        bytecode_cache = None
+        if cache_folder:
+            try:
+                os.makedirs(cache_folder, exist_ok=True)
+                bytecode_cache = FileSystemBytecodeCache(cache_folder)
+            except OSError as e:
+                logger.error("Template cache disabled: %s", e)
+
+        self.env = Environment(
+            loader=FileSystemLoader([f for f in folders if os.path.isdir(f)]),
+            cache_size=-1,
+            auto_reload=False,
+            bytecode_cache=bytecode_cache,
+        )
+
+    def warm(self):
+        """Compile every template
+
+        Returns:
+            int: Compiled templates
+        """
+        names = self.env.list_templates()
+        for name in names:
+            self.env.get_template(name)
+        return len(names)
+
+    def render(self, name, **kwargs):
+        """Render a template
+
+        Args:
+            name (str): Template name
+            kwargs: Template context
+
+        Returns:
+            str: Rendered template
+        """
+        return self.env.get_template(name).render(**kwargs)
+
+
+registry = TemplateRegistry()
+
+
+def render(name, **kwargs):
+    """Render a template of process-wide registry
+
+    Args:
+        name (str): Template name
+        kwargs: Template context
+
+    Returns:
+        str: Rendered template
+    """
+    return registry.render(name, **kwargs)
+
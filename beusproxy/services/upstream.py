@@ -0,0 +1,157 @@
+"""Upstream Client Service
+
+Pooled keep-alive session to the root server, one per worker process.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+from threading import Lock
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..config import (HOST, REQUEST_TIMEOUT, UPSTREAM_POOL_CONNECTIONS,
+                      UPSTREAM_POOL_MAXSIZE, USER_AGENT)
+
+
+class UpstreamClient:
+    """UpstreamClient base class.
+    Wrapping requests.Session with a bounded connection pool,
+    so that requests to root server reuse TCP+TLS connections.
+    """
+
+    def __init__(
+        self,
+        *,
+        pool_connections: Optional[int] = UPSTREAM_POOL_CONNECTIONS,
+        pool_maxsize: Optional[int] = UPSTREAM_POOL_MAXSIZE,
+        timeout: Optional[int] = REQUEST_TIMEOUT,
+    ):
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._timeout = timeout
+        self._lock = Lock()
+        self._pid = None
+        self._session = None
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Close pooled connections"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._session = None
+            self._executor = None
+            self._pid = None
+
+    @property
+    def session(self):
+        """Session of current worker process.
+        Created lazily, recreated after fork.
+
+        Returns:
+            Session: requests.Session
+        """
+        with self._lock:
+            self._check_pid()
+            return self._session
+
+    def _check_pid(self):
+        """Recreate session of current process, threads don't survive fork"""
+        if self._session is None or self._pid != os.getpid():
+            self._session = self._new_session()
+            self._executor = None
+            self._pid = os.getpid()
+
+    def map(self, func, items):
+        """Run blocking calls concurrently over the session,
+        at most pool_maxsize at once.
+
+        Args:
+            func (callable): Called with each item
+            items (list): Items
+
+        Returns:
+            list: Results in order of items
+        """
+        with self._lock:
+            self._check_pid()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._pool_maxsize, thread_name_prefix="upstream"
+                )
+            executor = self._executor
+        return list(executor.map(func, items))
+
+    def _new_session(self):
+        """Create a pooled session"""
+        session = requests.Session()
+
+        # pool_maxsize is per host, pool_block caps the
+        # connections instead of opening throwaway ones.
+        adapter = HTTPAdapter(
+            pool_connections=self._pool_connections,
+            pool_maxsize=self._pool_maxsize,
+            pool_block=True,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        # Session is shared between students.
+        # Never store cookies set by root server.
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        session.headers.update(
+            {
+                "Host": HOST,
+                "User-Agent": USER_AGENT,
+            }
+        )
+        return session
+
+    def request(self, method, url, *, sessid=None, stud_ar=True, **kwargs):
+        """Blocking requests.Session.request wrapper.
+        Bakes PHPSESSID cookie if sessid is given.
+
+        Reference:
+        https://requests.readthedocs.io/en/latest/api/#requests.Session.request
+
+        Args:
+            method (str): HTTP method
+            url (str): URL
+            sessid (str): Student session_id
+            stud_ar (bool): Skip announcements
+
+        Returns:
+            Response: Response object
+        """
+        headers = kwargs.pop("headers", {})
+        if sessid is not None:
+            headers["Cookie"] = session_cookie(sessid, stud_ar=stud_ar)
+        kwargs.setdefault("timeout", self._timeout)
+
+        return self.session.request(method, url, headers=headers, **kwargs)
+
+
+def session_cookie(sessid, *, stud_ar=True):
+    """Cookie header for root server
+
+    Args:
+        sessid (str): Student session_id
+        stud_ar (bool): Skip announcements
+
+    Returns:
+        str: Cookie header value
+    """
+    if stud_ar:
+        return f"PHPSESSID={sessid}; BEU_STUD_AR=1; "
+    return f"PHPSESSID={sessid}; "
@@ -1,21 +1,60 @@
+import asyncio
+
 import beusproxy.services.database as db
+import beusproxy.services.retention as retention
+from beusproxy.common.utils import get_logger
 
 from . import chain
+from .notify_mgr import Dispatcher
+
+logger = get_logger(__package__)
 
 
-def run_chain():
-    """Worker function
+async def run_chain(engine):
+    """Worker coroutine
 
     Args:
+        engine (BotEngine): Engine holding pooled resources
     """
+    # Only students in leased shards
+    if not (shards := engine.shards()):
+        return
+
     # Stage 1
     # Bake cookies for students in need
     # Skips students with invalid credentials just in case.
-    with db.get_db() as conn:
-        chain.authorize_subs(conn)
+    with db.connection() as conn:
+        await chain.authorize_subs(conn, engine.httpc, shards)
 
     # Stage 2
     # Fetch grades and compare against database
-    # Notify subscribers asynchronously
-    with db.get_db() as conn:
-        chain.check_grades(conn)
+    # Changes are enqueued into outbox
+    with db.connection() as conn:
+        await chain.check_grades(conn, engine.httpc, shards)
+
+    # Stage 3
+    # Notify subscribers without waiting for outbox job
+    await deliver_outbox(engine)
+
+
+async def deliver_outbox(engine):
+    """Deliver due notifications of leased shards.
+    Emails failing while SMTP server is unreachable are retried later.
+
+    Args:
+        engine (BotEngine): Engine holding pooled resources
+    """
+    await Dispatcher(
+        emailc=engine.email_client(),
+        webhooks=engine.webhooks,
+    ).deliver(engine.leases.owned)
+
+
+async def run_retention(engine):
+    """Prune sessions, by the worker owning first shard
+
+    Args:
+        engine (BotEngine): Engine holding pooled resources
+    """
+    if 0 in engine.leases.owned:
+        await asyncio.to_thread(retention.run_retention)
@@ -1,16 +1,20 @@
 import asyncio
 
-from aiohttp import ClientSession, ClientTimeout, ClientResponseError, ClientConnectorError
+from aiohttp import ClientError
 
 from beusproxy.common.utils import get_logger
-from beusproxy.config import API_INTERNAL_HOSTNAME, REQUEST_TIMEOUT
+from beusproxy.config import API_INTERNAL_HOSTNAME, BOT_CONCURRENCY
 
+from ..leases import shard_of
 
-def authorize_subs(conn):
+
+async def authorize_subs(conn, httpc, shards):
     """Authorize Student Subscribers
 
     Args:
         conn (sqlite3.Connection): MainDB Connection
+        httpc (ClientSession): Pooled session of bot
+        shards (frozenset): Shards leased to worker
     """
     logger = get_logger(__package__)
 
@@ -38,37 +42,36 @@ def authorize_subs(conn):
             s.student_id != 99;
     """
     ).fetchall()
+    stud_credentials = [
+        stud for stud in stud_credentials if shard_of(stud["id"]) in shards
+    ]
 
     logger.debug("Authenticating -> %s", str([stud["student_id"] for stud in stud_credentials]))
 
+    sem = asyncio.Semaphore(BOT_CONCURRENCY)
+
     # Authorization Coroutine
     async def auth_stud_coro(student_id, password):
         """Authorize Student"""
-        async with ClientSession(timeout=ClientTimeout(REQUEST_TIMEOUT)) as httpc:
-            return (
-                student_id,
-                await httpc.request(
-                    "POST",
+        async with sem:
+            try:
+                async with httpc.post(
                     f"{API_INTERNAL_HOSTNAME}auth",
                     json={"studentId": student_id, "password": password},
-                ),
-            )
+                ) as res:
+                    return student_id, res.status
+            except (ClientError, asyncio.TimeoutError) as e:
+                logger.error("Auth failed for %d: %s", student_id, e)
+                return student_id, None
 
     # Grab hot cookies for every student.
-    async def auth_stud_gather_coro():
-        try:
-            return await asyncio.gather(
-                *[
-                    auth_stud_coro(stud["student_id"], stud["password"])
-                    for stud in stud_credentials
-                ]
-            )
-        except (ClientConnectorError, ClientResponseError, asyncio.TimeoutError) as e:
-            logger.error(e)
-
-    ress = asyncio.run(auth_stud_gather_coro())
+    ress = await asyncio.gather(
+        *[
+            auth_stud_coro(stud["student_id"], stud["password"])
+            for stud in stud_credentials
+        ]
+    )
 
-    for student_id, res in ress:
-        if res.status != 200:
-            logger.warning("Auth failed for %d: %d", student_id, res.status)
-            continue
+    for student_id, status in ress:
+        if status is not None and status != 200:
+            logger.warning("Auth failed for %d: %d", student_id, status)
@@ -1,35 +1,39 @@
 import asyncio
 import json
-import socket
+import sqlite3
 from datetime import datetime
 from json import JSONDecodeError
 from asyncio import TimeoutError as AsyncioTimeoutError
-from smtplib import SMTPException
 
-from aiohttp import ClientSession, ClientTimeout, ClientError
+from aiohttp import ClientError
 
 from beusproxy.common.utils import get_logger
-from beusproxy.config import API_INTERNAL_HOSTNAME, DEBUG, HOST, USER_AGENT, REQUEST_TIMEOUT
-from beusproxy.services.email import EmailClient
+from beusproxy.config import (API_INTERNAL_HOSTNAME, BOT_CONCURRENCY,
+                              BOT_POLL_BUDGET, BOT_SHARDS, DEBUG)
 
-from ..common.utils import grade_diff
+from ..common import polling
+from ..common.utils import grade_changes, grade_diff, grades_digest
 from ..common.debug import log4grades
-from ..notify_mgr import notify
+from ..leases import shard_of
+from ..notify_mgr import Dispatcher
 
 logger = get_logger(__package__)
 
 
-def check_grades(conn):
+async def check_grades(conn, httpc, shards):
     """Fetch grades and compare
 
     Args:
         conn (sqlite3.Connection): MainDB Connection
+        httpc (ClientSession): Pooled session of bot
+        shards (frozenset): Shards leased to worker
     """
     subs = conn.execute(
         """
         SELECT
-            id,
-            session_id
+            t.id,
+            t.session_id,
+            sg.next_poll
         FROM (
           SELECT
             *,
@@ -51,85 +55,98 @@ def check_grades(conn):
                 s.active_email_id IS NULL
             )
         ) t
+        LEFT JOIN Student_Grades sg
+        ON
+            t.id == sg.owner_id
         WHERE rn = 1;
     """
     ).fetchall()
 
-    cr = {}
-    async def grades_coro(owner_id, session_id):
-        try:
-            async with ClientSession(timeout=ClientTimeout(REQUEST_TIMEOUT)) as httpc:
-                cr[owner_id] = await httpc.request(
-                    "GET",
-                    f"{API_INTERNAL_HOSTNAME}resource/grades/latest",
-                    headers={
-                        "Cookie": f"SessionID={session_id};",
-                        "User-Agent": USER_AGENT,
-                    },
-                )
-        except ClientError as e:
-            logger.error("Error occurred in grades_coro for owner_id %s: %s", owner_id, e)
-
-    # Fetch grades via API
-    async def grades_gather_coro():
-        try:
-            await asyncio.gather(
-                *[grades_coro(sub["id"], sub["session_id"]) for sub in subs]
-            )
-        except AsyncioTimeoutError as e:
-            logger.error(e)
+    # Poll due subscribers of leased shards only,
+    # within share of budget
+    subs = polling.due(
+        [sub for sub in subs if shard_of(sub["id"]) in shards],
+        max(BOT_POLL_BUDGET * len(shards) // BOT_SHARDS, 1),
+    )
 
     cr_json = {}
-    async def grades_json_coro(sub_id, sub_grades_cr):
-        if sub_grades_cr.status == 200:
+    sem = asyncio.Semaphore(BOT_CONCURRENCY)
+    async def grades_coro(owner_id, session_id):
+        async with sem:
             try:
-                cr_json[sub_id] = await sub_grades_cr.json(
-                    encoding="UTF-8", loads=json.loads, content_type="application/json"
-                )
-            except RuntimeError as e:
-                logger.error("Error occurred in grades_json_coro for sub_id %s: %s", sub_id, e)
-        else:
-            cr_json[sub_id] = sub_grades_cr.status
-
-    async def grades_json_gather_coro():
-        try:
-            await asyncio.gather(
-                *[
-                    grades_json_coro(sub_id, sub_grades_cr)
-                    for sub_id, sub_grades_cr in cr.items()
-                ]
-            )
-        except ClientError as e:
-            logger.error(e)
+                async with httpc.get(
+                    f"{API_INTERNAL_HOSTNAME}resource/grades/latest",
+                    headers={"Cookie": f"SessionID={session_id};"},
+                ) as res:
+                    if res.status == 200:
+                        cr_json[owner_id] = await res.json(
+                            encoding="UTF-8",
+                            loads=json.loads,
+                            content_type="application/json",
+                        )
+                    else:
+                        cr_json[owner_id] = res.status
+            except (ClientError, AsyncioTimeoutError, JSONDecodeError) as e:
+                logger.error("Error occurred in grades_coro for owner_id %s: %s", owner_id, e)
 
-    asyncio.run(grades_gather_coro())
-    asyncio.run(grades_json_gather_coro())
+    # Fetch grades via API, over pooled session of bot.
+    # Semaphore keeps queued requests out of the timeout.
+    await asyncio.gather(
+        *[grades_coro(sub["id"], sub["session_id"]) for sub in subs]
+    )
 
-    subs_grades_old = conn.execute(
-        """
-        SELECT
-            sg.owner_id,
-            sg.grades
-        FROM
-            Student_Grades sg
-        INNER JOIN
-            Students s
-        ON
-            sg.owner_id == s.id AND
-            NOT (
-                s.active_telegram_id IS NULL AND
-                s.active_discord_id IS NULL AND
-                s.active_email_id IS NULL
-            );
-    """
-    ).fetchall()
+    # Old snapshots of polled subscribers, indexed by owner_id
+    rows_old = {
+        row["owner_id"]: row
+        for row in conn.execute(
+            f"""
+            SELECT
+                owner_id,
+                digest,
+                changed,
+                poll_interval,
+                next_poll
+            FROM
+                Student_Grades
+            WHERE
+                owner_id IN ({", ".join("?" * len(cr_json))});
+        """,
+            tuple(cr_json),
+        ).fetchall()
+    }
 
-    # Get a EmailClient
-    try:
-        emailc = EmailClient()
-    except (SMTPException, socket.gaierror, OSError) as e:
-        logger.error("emailc: %s", e)
-        return
+    # Unchanged snapshots are neither loaded nor diffed
+    digests = {
+        sub_id: grades_digest(sub_grades)
+        for sub_id, sub_grades in cr_json.items()
+        if not isinstance(sub_grades, int)
+    }
+    stale = [
+        sub_id
+        for sub_id, digest in digests.items()
+        if sub_id in rows_old and rows_old[sub_id]["digest"] != digest
+    ]
+    blobs_old = dict(
+        conn.execute(
+            f"""
+            SELECT
+                owner_id,
+                grades
+            FROM
+                Student_Grades
+            WHERE
+                owner_id IN ({", ".join("?" * len(stale))});
+        """,
+            tuple(stale),
+        ).fetchall()
+    )
+
+    # Written in one transaction at the end,
+    # along with notifications of changes
+    dispatcher = Dispatcher()
+    snapshots = []
+    polls = []
+    events = []
 
     # Compare grades wisely
     for sub_id, sub_grades in cr_json.items():
@@ -152,39 +169,115 @@ def check_grades(conn):
                     conn.rollback()
             logger.error("Invalid response %d for %d", sub_grades, sub_id)
             continue
-        if sub_grades and dict(subs_grades_old).get(sub_id):
-            # Grade diff util
+
+        now = datetime.now()
+        row_old = rows_old.get(sub_id)
+        if sub_id in rows_old and sub_id not in blobs_old:
+            state = polling.next_state(polling.PollState.from_row(row_old), False, now)
+            polls.append(
+                (
+                    now.isoformat(),
+                    int(state.interval.total_seconds()),
+                    state.next_poll.isoformat(),
+                    sub_id,
+                )
+            )
+            continue
+
+        changes = []
+        grades_old = None
+        if sub_grades and sub_id in blobs_old:
             try:
-                diffs = grade_diff(
-                    json.loads(dict(subs_grades_old)[sub_id]), sub_grades
+                grades_old = json.loads(blobs_old[sub_id])
+            except (JSONDecodeError, TypeError) as e:
+                # Replaced by new snapshot below, so it isn't polled again at once
+                logger.error(
+                    "Couldn't decode JSON from DB for Sub %d, resetting: %s", sub_id, e
+                )
+        if grades_old is not None:
+            # Grade diff util
+            changes = grade_changes(grades_old, sub_grades)
+            events.extend(
+                (
+                    sub_id,
+                    change.course,
+                    change.field,
+                    json.dumps(change.old),
+                    json.dumps(change.new),
+                    now.isoformat(),
+                )
+                for change in changes
+            )
+            if changes:
+                diffs = grade_diff(grades_old, sub_grades, changes)
+                # Push to outbox, same change is notified once
+                # even if another worker detects it too
+                dispatcher.push(
+                    sub_id,
+                    diffs,
+                    sub_grades,
+                    f"{sub_id}:{row_old['changed']}:{row_old['digest']}:{digests[sub_id]}",
+                )
+                logger.debug(
+                    "Changes found for Sub %d -> %s",
+                    sub_id,
+                    json.dumps(diffs, ensure_ascii=True),
                 )
-                if len(diffs) != 0:
-                    # Push to notifier
-                    notify(sub_id, diffs, sub_grades, emailc=emailc)
-                    logger.debug(
-                        "Changes found for Sub %d -> %s",
-                        sub_id,
-                        json.dumps(diffs, ensure_ascii=True),
-                    )
-            except JSONDecodeError as e:
-                logger.error("Couldn't decode JSON from DB for Sub %d: %s", sub_id, e)
-                continue
         if DEBUG:
-            log4grades(sub_id, subs_grades_old, sub_grades)
-        cur = conn.execute(
+            log4grades(sub_id, grades_old, sub_grades, changes)
+        state = polling.next_state(
+            polling.PollState.from_row(row_old), len(changes) != 0, now
+        )
+        snapshots.append(
+            (
+                sub_id,
+                json.dumps(sub_grades),
+                digests[sub_id],
+                now.isoformat(),
+                state.changed.isoformat() if state.changed else None,
+                int(state.interval.total_seconds()),
+                state.next_poll.isoformat(),
+            )
+        )
+
+    try:
+        conn.executemany(
             """
             REPLACE INTO Student_Grades (
-                owner_id, grades, updated
+                owner_id, grades, digest, updated, changed, poll_interval, next_poll
             )
             VALUES (
-                ?, ?, ?
+                ?, ?, ?, ?, ?, ?, ?
             );
         """,
-            (sub_id, json.dumps(sub_grades), datetime.now().isoformat()),
+            snapshots,
         )
-        if cur.rowcount > 0:
-            conn.commit()
-        else:
-            conn.rollback()
-
-    emailc.quit()
+        conn.executemany(
+            """
+            UPDATE
+                Student_Grades
+            SET
+                updated = ?,
+                poll_interval = ?,
+                next_poll = ?
+            WHERE
+                owner_id = ?;
+        """,
+            polls,
+        )
+        conn.executemany(
+            """
+            INSERT INTO Grade_Events (
+                owner_id, course, field, old, new, ts
+            )
+            VALUES (
+                ?, ?, ?, ?, ?, ?
+            );
+        """,
+            events,
+        )
+        dispatcher.enqueue(conn, datetime.now())
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logger.error("Couldn't save grades: %s", e)
@@ -4,30 +4,29 @@ import json
 
 from .utils import grade_diff
 
-def log4grades(sub_id, subs_grades_old, sub_grades):
+def log4grades(sub_id, grades_old, sub_grades, changes):
     """
     Write notes and changes back to db
     High level debugging
+
+    Args:
+        sub_id (int): Subscriber ID
+        grades_old (dict): Old Grades Table, None if not stored
+        sub_grades (dict): New Grades Table
+        changes (list): Changes found by check
     """
     with open("log/grades_history.log", "a", encoding="utf-8") as f:
         text = {
-            "old": json.loads(
-                dict(subs_grades_old).get(sub_id, '{"isOldGradesNull": true}')
-            ),
+            "old": grades_old if grades_old is not None else {"isOldGradesNull": True},
             "new": sub_grades,
             "diff": (
-                grade_diff(
-                    json.loads(
-                        dict(subs_grades_old).get(sub_id, '{"isOldGradesNullX": true}')
-                    ),
-                    sub_grades,
-                )
-                if dict(subs_grades_old).get(sub_id)
+                grade_diff(grades_old, sub_grades, changes)
+                if grades_old is not None
                 else {"isOldGradesNull": True}
             ),
         }
         f.write(
-            f"[{datetime.now().isoformat()}] - Sub {sub_id}: {json.dumps(text["old"])}\n"
+            f"[{datetime.now().isoformat()}] - Sub {sub_id}: {json.dumps(text['old'])}\n"
         )
-        f.write(f"[{datetime.now().isoformat()}] - |    : {json.dumps(text["new"])}\n")
-        f.write(f"[{datetime.now().isoformat()}] - |    : {json.dumps(text["diff"])}\n")
+        f.write(f"[{datetime.now().isoformat()}] - |    : {json.dumps(text['new'])}\n")
+        f.write(f"[{datetime.now().isoformat()}] - |    : {json.dumps(text['diff'])}\n")
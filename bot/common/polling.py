@@ -0,0 +1,86 @@
+"""Adaptive Polling
+
+Poll interval of each subscriber, kept in Student_Grades.
+Interval is reset when grades change and doubled when they don't.
+Students with recent changes are capped to a shorter interval.
+"""
+import heapq
+import random
+from datetime import datetime, timedelta
+
+POLL_MIN = timedelta(minutes=2)
+POLL_MAX = timedelta(hours=1)
+# Cap of students with changes in HOT_WINDOW
+POLL_HOT_MAX = timedelta(minutes=10)
+HOT_WINDOW = timedelta(days=3)
+# Spread of next poll, fraction of interval
+JITTER = 0.2
+
+
+class PollState:
+    """Poll State Model"""
+
+    def __init__(self, interval, changed, next_poll):
+        self.interval = interval
+        self.changed = changed
+        self.next_poll = next_poll
+
+    @classmethod
+    def from_row(cls, row):
+        """State from Student_Grades row, None if row is None
+
+        Args:
+            row (sqlite3.Row): Row with poll_interval, changed and next_poll
+
+        Returns:
+            PollState: State
+        """
+        if row is None:
+            return None
+        return cls(
+            timedelta(seconds=row["poll_interval"]),
+            datetime.fromisoformat(row["changed"]) if row["changed"] else None,
+            datetime.fromisoformat(row["next_poll"]) if row["next_poll"] else None,
+        )
+
+
+def next_state(state, changed, now=None):
+    """State after a successful poll
+
+    Args:
+        state (PollState): Previous state, None if never polled
+        changed (bool): Whether grades changed
+        now (datetime): Poll time
+
+    Returns:
+        PollState: Next state
+    """
+    now = now or datetime.now()
+    if state is None or changed:
+        interval = POLL_MIN
+    else:
+        interval = min(state.interval * 2, POLL_MAX)
+
+    last_changed = now if changed else (state.changed if state else None)
+    if last_changed is not None and now - last_changed < HOT_WINDOW:
+        interval = min(interval, POLL_HOT_MAX)
+
+    jitter = random.uniform(1 - JITTER, 1 + JITTER)
+    return PollState(interval, last_changed, now + interval * jitter)
+
+
+def due(subs, budget, now=None):
+    """Subscribers to poll now, most overdue first
+
+    Args:
+        subs (list): Rows with next_poll, None if never polled
+        budget (int): Max subscribers to poll
+        now (datetime): Current time
+
+    Returns:
+        list: Rows due for polling
+    """
+    now = (now or datetime.now()).isoformat()
+    # Never polled sort first
+    candidates = [sub for sub in subs if (sub["next_poll"] or "") <= now]
+    return heapq.nsmallest(budget, candidates, key=lambda sub: sub["next_poll"] or "")
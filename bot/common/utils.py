@@ -1,86 +1,113 @@
+import hashlib
+import json
 import random
 
-import jsondiff
-from jinja2 import Environment, FileSystemLoader
-
 from beusproxy.config import BOT_DISCORD_USERNAME, BOT_DISCORD_AVATAR
 from beusproxy.parser.grades import rename_table_inv
+from beusproxy.services.templates import render
+
+
+# Grade fields notified on change
+GRADE_FIELDS = frozenset(
+    {
+        "absents",
+        "act1",
+        "act2",
+        "act3",
+        "sem",
+        "addFinal",
+        "attendance",
+        "final",
+        "iw",
+        "reFinal",
+    }
+)
 
 
-def diff(dic_old, dic):
-    """JSONDiff wrapper
+class GradeChange:
+    """Grade Change Model"""
 
-    Args:
-        dic_old (dict): Old Dictionary
-        dic (dict): New Dictionary
+    __slots__ = ("course", "field", "old", "new")
 
-    Returns:
-        dict: Differences
-    """
-    # Filter out jsondiff symbols.
-    return clean_symbol(jsondiff.diff(dic_old, dic, syntax="rightonly"))
+    def __init__(self, course, field, old, new):
+        self.course = course
+        self.field = field
+        self.old = old
+        self.new = new
+
+    def __eq__(self, other):
+        return isinstance(other, GradeChange) and all(
+            getattr(self, a) == getattr(other, a) for a in self.__slots__
+        )
 
+    def __repr__(self):
+        return f"GradeChange({self.course}.{self.field}: {self.old!r} -> {self.new!r})"
 
-def grade_diff(grades_old, grades):
-    """Grades table comparator
+
+def grade_changes(grades_old, grades):
+    """Changed grade fields, course by course.
+    Only GRADE_FIELDS are compared, in order of new grades table.
+    Every field of a new course is a change from None.
 
     Args:
         grades_old (dict): Old Grades Table
         grades (dict): New Grades Table
 
     Returns:
-        dict: Differences
+        list: List of GradeChange
     """
+    changes = []
+    for course, fields in grades.items():
+        if not isinstance(fields, dict):
+            continue
+        fields_old = grades_old.get(course)
+        if not isinstance(fields_old, dict):
+            fields_old = {}
+        for field, value in fields.items():
+            if field not in GRADE_FIELDS:
+                continue
+            if field in fields_old and fields_old[field] == value:
+                continue
+            changes.append(GradeChange(course, field, fields_old.get(field), value))
+    return changes
 
-    # Differentiate grades using jsondiff.
-    diff_dic = diff(grades_old, grades)
 
-    # Filter
-    filter = {
-        "absents",
-        "act1",
-        "act2",
-        "act3",
-        "sem",
-        "addFinal",
-        "attendance",
-        "final",
-        "iw",
-        "reFinal",
-    }
+def grades_digest(grades):
+    """Digest of a grades table, independent of key order
 
-    for k, v in dict(diff_dic).items():
-        if isinstance(v, dict):
-            for kk, vv in dict(v).items():
-                if kk not in filter:
-                    v.pop(kk)
-            if len(v) == 0:
-                diff_dic.pop(k)
+    Args:
+        grades (dict): Grades Table
 
-    return diff_dic
+    Returns:
+        str: sha256 hexdigest of canonical JSON
+    """
+    canonical = json.dumps(grades, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("UTF-8")).hexdigest()
 
 
-def clean_symbol(table):
-    """Remove jsondiff Symbols
+def grade_diff(grades_old, grades, changes=None):
+    """Grades table comparator
 
     Args:
-        table (dict): Input table
+        grades_old (dict): Old Grades Table
+        grades (dict): New Grades Table
+        changes (list): Changes if already computed
 
     Returns:
-        dict: Output table
+        dict: New values of changed fields by course
     """
-    out_table = {}
-    for k, v in table.items():
-        if isinstance(k, jsondiff.symbols.Symbol):
-            continue
-        if isinstance(v, dict):
-            v = clean_symbol(v)
-        out_table[k] = v
-    return out_table
+    if changes is None:
+        changes = grade_changes(grades_old, grades)
+    diff_dic = {}
+    for change in changes:
+        diff_dic.setdefault(change.course, {})[change.field] = change.new
+    return diff_dic
 
 
 def report_gen_dcmsg(diffs, grades):
-    """Discord Message Report Generator
+    """Discord Message Report Generator.
+    One embed per changed course, messages over
+    10 embeds are split by the webhook client.
 
     Args:
         diffs (dict): Differences
@@ -89,18 +116,21 @@ def report_gen_dcmsg(diffs, grades):
     Return:
         dict: Rendered Discord Message
     """
-    fields = []
+    color = random_dec_color(minimum=64)
+    embeds = []
     for course in report_gen_list(diffs, grades):
-        value = ""
-        for k, v in course["diffs"].items():
-            value += f"{k}\n"
-            # value += f"{k}: {v}\n"
-        fields.append(
-            {"name": f"{course['courseCode']} - {course['courseName']}", "value": value}
+        if not course["diffs"]:
+            continue
+        embeds.append(
+            {
+                "color": color,
+                "title": f"{course['courseCode']} - {course['courseName']}",
+                "description": "\n".join(course["diffs"]),
+            }
         )
     return {
         "content": None,
-        "embeds": [{"color": random_dec_color(minimum=64), "fields": fields}],
+        "embeds": embeds,
         "username": BOT_DISCORD_USERNAME,
         "avatar_url": BOT_DISCORD_AVATAR,
     }
@@ -118,9 +148,9 @@ def report_gen_md(diffs, grades, *, telegram=False):
         str: Rendered Markdown Output
     """
     # Render and return.
-    env = Environment(loader=FileSystemLoader("bot/templates"))
-    return env.get_template("telegram_report.txt").render(
-        courses=report_gen_list(diffs, grades, telegram=telegram)
+    return render(
+        "telegram_report.txt",
+        courses=report_gen_list(diffs, grades, telegram=telegram),
     )
 
 
@@ -135,9 +165,6 @@ def report_gen_html(diffs, grades):
         str: Rendered HTML Output
     """
     # Render and return.
-
-    env = Environment(loader=FileSystemLoader("bot/templates"))
-
     colors = []
     report = report_gen_list(diffs, grades)
     for i in report:
@@ -150,7 +177,7 @@ def report_gen_html(diffs, grades):
             }
         )
 
-    return env.get_template("report.html").render(divs=report, colors=colors)
+    return render("report.html", divs=report, colors=colors)
 
 
 def report_gen_list(diffs, grades, *, telegram=False):
@@ -0,0 +1,222 @@
+import asyncio
+import heapq
+import socket
+import sqlite3
+from datetime import datetime, time, timedelta
+from smtplib import SMTPException
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+from beusproxy.common.utils import get_logger
+from beusproxy.config import BOT_CONCURRENCY, REQUEST_TIMEOUT, USER_AGENT
+from beusproxy.services.database import connection
+from beusproxy.services.discord import WebhookClient
+from beusproxy.services.email import EmailClient
+from .leases import LEASE_TTL
+
+logger = get_logger(__package__)
+
+# Checks are paused between end and start
+ACTIVE_START = time(6, 0)
+ACTIVE_END = time(1, 0)
+
+# Leases are renewed apart from jobs, so a long job never lets them expire
+HEARTBEAT_INTERVAL = LEASE_TTL // 6
+
+
+def is_active(dt):
+    """Check if datetime is in active window
+
+    Args:
+        dt (datetime): Datetime
+
+    Returns:
+        bool: Whether it is active
+    """
+    if ACTIVE_START <= ACTIVE_END:
+        return ACTIVE_START <= dt.time() <= ACTIVE_END
+    return dt.time() >= ACTIVE_START or dt.time() <= ACTIVE_END
+
+
+def next_at(dt, at):
+    """Next datetime at given time of day
+
+    Args:
+        dt (datetime): Datetime to start from
+        at (time): Time of day
+
+    Returns:
+        datetime: Next occurrence after dt
+    """
+    nxt = datetime.combine(dt.date(), at)
+    if nxt <= dt:
+        nxt += timedelta(days=1)
+    return nxt
+
+
+class Job:
+    """Job Model
+
+    Coroutine function run every interval, receiving the engine.
+    Windowed jobs are postponed outside the active window.
+    """
+
+    def __init__(self, name, func, interval, *, at=None, windowed=True):
+        # pylint: disable=R0913
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.windowed = windowed
+        now = datetime.now()
+        self.due = now if at is None else next_at(now, at)
+
+    def __lt__(self, other):
+        return self.due < other.due
+
+
+class BotEngine:
+    """BotEngine base class.
+    Runs jobs in one event loop, keeping
+    HTTP session and SMTP connections warm between runs.
+    Jobs work on shards leased to the engine, renewed by
+    a heartbeat task. A job is cancelled if a shard is lost.
+    """
+
+    def __init__(self, shevent, jobs, *, leases=None):
+        self._shevent = shevent
+        self._jobs = list(jobs)
+        self._emailc = None
+        self.httpc = None
+        self.webhooks = None
+        self.leases = leases
+        self._job_task = None
+        self._lost = False
+
+    async def run(self):
+        """Run jobs until shutdown event is set"""
+        async with ClientSession(
+            connector=TCPConnector(limit=BOT_CONCURRENCY),
+            timeout=ClientTimeout(REQUEST_TIMEOUT),
+            headers={"User-Agent": USER_AGENT},
+        ) as self.httpc:
+            self.webhooks = WebhookClient(self.httpc)
+            heartbeat = None
+            if self.leases is not None:
+                heartbeat = asyncio.create_task(self._heartbeat())
+            try:
+                await self._loop()
+            finally:
+                if heartbeat is not None:
+                    heartbeat.cancel()
+                self.close()
+
+    def shards(self):
+        """Renew leases of worker
+
+        Returns:
+            frozenset: Owned shards
+        """
+        with connection() as conn:
+            return self.leases.renew(conn)
+
+    def close(self):
+        """Release leases and close SMTP connections"""
+        if self.leases is not None:
+            try:
+                with connection() as conn:
+                    self.leases.release(conn)
+            except sqlite3.Error as e:
+                logger.error("Couldn't release leases: %s", e)
+        self._quit_email()
+
+    def _quit_email(self):
+        """Close SMTP connections"""
+        if self._emailc is not None:
+            self._emailc.quit()
+            self._emailc = None
+
+    def email_client(self):
+        """Email client of bot.
+        Connects on first email, never here.
+
+        Returns:
+            EmailClient: Pooled email client
+        """
+        if self._emailc is None:
+            self._emailc = EmailClient()
+        return self._emailc
+
+    async def wait(self, delay):
+        """Sleep until delay passes or shutdown event is set
+
+        Args:
+            delay (float): Seconds
+
+        Returns:
+            bool: Whether shutdown event is set
+        """
+        if delay > 0:
+            return await asyncio.to_thread(self._shevent.wait, delay)
+        return self._shevent.is_set()
+
+    def _shards_lost(self, lost):
+        """Cancel running job, it may be working on lost shards
+
+        Args:
+            lost (set): Shards no longer owned
+        """
+        logger.warning("Worker %s lost shards %s", self.leases.worker, sorted(lost))
+        if self._job_task is not None and not self._job_task.done():
+            self._lost = True
+            self._job_task.cancel()
+
+    async def _heartbeat(self):
+        """Renew leases every HEARTBEAT_INTERVAL, regardless of jobs.
+        Shards not renewed within LEASE_TTL are given up.
+        """
+        renewed = datetime.now()
+        while not await self.wait(HEARTBEAT_INTERVAL):
+            owned = self.leases.owned
+            try:
+                await asyncio.to_thread(self.shards)
+                renewed = datetime.now()
+            except sqlite3.Error as e:
+                logger.error("Couldn't renew leases: %s", e)
+                if datetime.now() - renewed >= timedelta(seconds=LEASE_TTL):
+                    self.leases.owned = frozenset()
+            if lost := owned - self.leases.owned:
+                self._shards_lost(lost)
+
+    async def _loop(self):
+        """Run due jobs in order"""
+        heap = list(self._jobs)
+        heapq.heapify(heap)
+        while heap:
+            if await self.wait((heap[0].due - datetime.now()).total_seconds()):
+                return
+
+            job = heapq.heappop(heap)
+            now = datetime.now()
+            if job.windowed and not is_active(now):
+                job.due = next_at(now, ACTIVE_START)
+                heapq.heappush(heap, job)
+                continue
+
+            self._job_task = asyncio.create_task(job.func(self))
+            try:
+                await self._job_task
+            except asyncio.CancelledError:
+                if not self._lost:
+                    raise
+                logger.warning("Job %s cancelled", job.name)
+            except (SMTPException, socket.gaierror, OSError) as e:
+                logger.error("Job %s: %s", job.name, e)
+            except Exception:  # pylint: disable=W0718
+                logger.exception("Job %s failed", job.name)
+
+            self._job_task = None
+            self._lost = False
+
+            # Missed runs are skipped, not bursted
+            job.due = max(job.due + job.interval, datetime.now())
+            heapq.heappush(heap, job)
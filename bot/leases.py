@@ -0,0 +1,112 @@
+import math
+import os
+import socket
+import time
+
+from beusproxy.common.utils import get_logger
+from beusproxy.config import BOT_SHARDS
+
+logger = get_logger(__package__)
+
+# Seconds a lease or heartbeat lasts without renewal
+LEASE_TTL = 180
+
+
+def shard_of(student_id, shards=BOT_SHARDS):
+    """Shard of a student
+
+    Args:
+        student_id (int): Students.id
+        shards (int): Shard count
+
+    Returns:
+        int: Shard
+    """
+    return student_id % shards
+
+
+class LeaseManager:
+    """LeaseManager base class.
+    Workers heartbeat into Bot_Workers and lease
+    an equal share of shards in Bot_Leases.
+    Shards of dead workers are claimed once their leases expire.
+    """
+
+    def __init__(self, shards=BOT_SHARDS, *, ttl=LEASE_TTL, worker=None):
+        self.worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        self._shards = shards
+        self._ttl = ttl
+        self.owned = frozenset()
+
+    def renew(self, conn):
+        """Heartbeat, renew owned leases and claim or release
+        shards to reach a fair share.
+
+        Args:
+            conn (sqlite3.Connection): Database connection
+
+        Returns:
+            frozenset: Owned shards
+        """
+        now = time.time()
+        expires = now + self._ttl
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            conn.execute(
+                "REPLACE INTO Bot_Workers (worker, expires) VALUES (?, ?);",
+                (self.worker, expires),
+            )
+            conn.execute("DELETE FROM Bot_Workers WHERE expires < ?;", (now,))
+            conn.execute(
+                "DELETE FROM Bot_Leases WHERE expires < ? OR shard >= ?;",
+                (now, self._shards),
+            )
+
+            workers = conn.execute("SELECT COUNT(*) FROM Bot_Workers;").fetchone()[0]
+            fair = math.ceil(self._shards / max(workers, 1))
+
+            leases = conn.execute("SELECT shard, owner FROM Bot_Leases;").fetchall()
+            owned = sorted(row["shard"] for row in leases if row["owner"] == self.worker)
+            taken = {row["shard"] for row in leases}
+
+            # Hand extras over to newcomers
+            for shard in owned[fair:]:
+                conn.execute(
+                    "DELETE FROM Bot_Leases WHERE shard = ? AND owner = ?;",
+                    (shard, self.worker),
+                )
+            owned = owned[:fair]
+            conn.execute(
+                "UPDATE Bot_Leases SET expires = ? WHERE owner = ?;",
+                (expires, self.worker),
+            )
+
+            free = [shard for shard in range(self._shards) if shard not in taken]
+            for shard in free[: fair - len(owned)]:
+                conn.execute(
+                    "INSERT INTO Bot_Leases (shard, owner, expires) VALUES (?, ?, ?);",
+                    (shard, self.worker, expires),
+                )
+                owned.append(shard)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        if set(owned) != self.owned:
+            logger.info("Worker %s owns shards %s", self.worker, sorted(owned))
+        self.owned = frozenset(owned)
+        return self.owned
+
+    def release(self, conn):
+        """Give up all leases, so that other workers take over
+
+        Args:
+            conn (sqlite3.Connection): Database connection
+        """
+        conn.execute("DELETE FROM Bot_Leases WHERE owner = ?;", (self.worker,))
+        conn.execute("DELETE FROM Bot_Workers WHERE worker = ?;", (self.worker,))
+        conn.commit()
+        self.owned = frozenset()
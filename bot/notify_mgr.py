@@ -1,51 +1,102 @@
 import asyncio
+import json
 import sqlite3
+from datetime import datetime, timedelta
 from smtplib import SMTPException
 
-import aiosqlite
+from aiohttp import ClientError
 from requests import RequestException
 
 from beusproxy.common.utils import get_logger
-from beusproxy.config import DATABASE, APP_NAME
+from beusproxy.config import APP_NAME, BOT_SHARDS, BOT_SMTP_POOL_SIZE
+from beusproxy.services.database import connection
 from beusproxy.services.email import generate_mime
 from beusproxy.services.telegram import send_message as tg_send_message
-from beusproxy.services.discord import send_message as dc_send_message
 from bot.common.utils import report_gen_md, report_gen_dcmsg, report_gen_html
 
 logger = get_logger(__package__)
 
+# Concurrent sends per channel, so that a slow channel
+# doesn't hold up the others. Emails are sent in batches,
+# one per pooled SMTP connection.
+CHANNEL_LIMITS = {
+    "telegram": 8,
+    "email": BOT_SMTP_POOL_SIZE,
+    "discord": 4,
+}
+
+# Outbox delivery: failed sends are retried after
+# OUTBOX_BACKOFF, doubling up to OUTBOX_BACKOFF_MAX.
+# Given up as dead after OUTBOX_MAX_ATTEMPTS.
+OUTBOX_BACKOFF = timedelta(minutes=1)
+OUTBOX_BACKOFF_MAX = timedelta(hours=6)
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BATCH = 200
+
+
+def _query(sql, args, commit, fetchall, fetchone):
+    with connection() as conn:
+        cursor = conn.execute(sql, args)
+        if commit:
+            if cursor.rowcount > 0:
+                conn.commit()
+            else:
+                conn.rollback()
+        if fetchone:
+            return cursor.fetchone()
+        if fetchall:
+            return cursor.fetchall()
+        return None
+
 
 async def query(
         sql, *args, commit=False, fetchall=True, fetchone=False
 ):
-    """Aiosqlite query execution wrapper"""
-    async with aiosqlite.connect(DATABASE) as conn:
-        conn.row_factory = aiosqlite.Row
-        async with conn.execute(sql, args) as cursor:
-            if commit:
-                if cursor.total_changes > 0:
-                    await conn.commit()
-                else:
-                    await conn.rollback()
-            if fetchone:
-                return await cursor.fetchone()
-            if fetchall:
-                return await cursor.fetchall()
-            return None
+    """Query execution wrapper.
+    Runs in a thread over pooled connections of bot.
+    """
+    return await asyncio.to_thread(_query, sql, args, commit, fetchall, fetchone)
 
 
-async def get_sub(sub_id) -> sqlite3.Row | list[sqlite3.Row]:
-    """Get Subscriptions Coroutine
+class Notification:
+    """Notification Model"""
+
+    def __init__(
+        self,
+        *,
+        service,
+        destination=None,
+        diff=None,
+        sub_id=None,
+        grades=None,
+        id_=None,
+        parts=0,
+    ):
+        # pylint: disable=R0913
+        self.id = id_
+        self.service = service
+        self.destination = destination
+        self.diff = diff
+        self.sub_id = sub_id
+        self.grades = grades
+        # Parts of a split message already sent
+        self.parts = parts
+
+
+def get_subs(conn, sub_ids) -> dict[int, sqlite3.Row]:
+    """Get Subscriptions.
+    Channels of all subscribers in one query.
 
     Args:
-        sub_id (int): Subscriber ID
+        conn (sqlite3.Connection): Database connection
+        sub_ids (list): Subscriber IDs
 
     Returns:
-        - list: List of Rows
-        - sqlite3.Row: Row
+        dict: Rows by Subscriber ID
     """
-    return await query("""
+    rows = conn.execute(f"""
         SELECT
+            s.id,
             tgs.telegram_chat_id,
             ems.email,
             dcs.discord_webhook_url
@@ -67,105 +118,361 @@ async def get_sub(sub_id) -> sqlite3.Row | list[sqlite3.Row]:
             s.id == dcs.owner_id AND
             s.active_discord_id == dcs.discord_id
         WHERE
-            s.id = ?;
-    """, sub_id, fetchone=True)
+            s.id IN ({", ".join("?" * len(sub_ids))});
+    """, tuple(sub_ids)).fetchall()
+    return {row["id"]: row for row in rows}
 
 
-def notify(sub_id, diffs, grades, *, emailc):
-    sub = asyncio.run(get_sub(sub_id))
+def backoff(attempts):
+    """Delay before next attempt
 
-    if sub["telegram_chat_id"]:
-        try:
-            tg_send_message(
-                report_gen_md(diffs, grades, telegram=True),
-                sub["telegram_chat_id"],
-                params={
-                    "parse_mode": "MarkdownV2"
-                },
+    Args:
+        attempts (int): Attempts made
+
+    Returns:
+        timedelta: Delay
+    """
+    return min(OUTBOX_BACKOFF * 2 ** max(attempts - 1, 0), OUTBOX_BACKOFF_MAX)
+
+
+class Dispatcher:
+    """Dispatcher base class.
+    Changes are enqueued into Notify_Outbox along with grade
+    snapshots, then delivered by outbox workers, fanned out
+    over channels within CHANNEL_LIMITS.
+    Blocking senders run in threads.
+    """
+
+    # Destination column of each channel
+    CHANNELS = {
+        "telegram": "telegram_chat_id",
+        "email": "email",
+        "discord": "discord_webhook_url",
+    }
+
+    def __init__(self, *, emailc=None, webhooks=None, limits=None):
+        self._emailc = emailc
+        self._webhooks = webhooks
+        self._limits = CHANNEL_LIMITS if limits is None else limits
+        self._queue = []
+
+    def push(self, sub_id, diffs, grades, key):
+        """Queue changes of a subscriber
+
+        Args:
+            sub_id (int): Subscriber ID
+            diffs (dict): Differences
+            grades (dict): Grades
+            key (str): Identifies the change, notified once per channel
+        """
+        self._queue.append((sub_id, diffs, grades, key))
+
+    def enqueue(self, conn, now):
+        """Write queued changes into outbox, one row per active channel.
+        Not committed, caller commits with grade snapshots.
+
+        Args:
+            conn (sqlite3.Connection): Database connection
+            now (datetime): Enqueue time
+
+        Returns:
+            int: Enqueued notifications
+        """
+        queue, self._queue = self._queue, []
+        if not queue:
+            return 0
+
+        subs = get_subs(conn, list({sub_id for sub_id, _, _, _ in queue}))
+        cur = conn.executemany(
+            """
+            INSERT OR IGNORE INTO Notify_Outbox (
+                owner_id, service, destination, dedupe, payload, created, next_try
             )
-            logger.debug("Notification sent for sub %d via Telegram.", sub_id)
-        except RequestException as ex:
-            logger.error("Couldn't send notification for sub %d via Telegram: %s", sub_id, ex)
-    if sub["email"]:
-        try:
-            emailc.send(
-                generate_mime(
-                    email_to=sub["email"],
-                    email_subject=f"[{APP_NAME}] Notification",
-                    body=report_gen_html(diffs, grades),
+            VALUES (
+                ?, ?, ?, ?, ?, ?, ?
+            );
+        """,
+            [
+                (
+                    sub_id,
+                    service,
+                    subs[sub_id][column],
+                    f"{service}:{key}",
+                    json.dumps({"diff": diffs, "grades": grades}),
+                    now.isoformat(),
+                    now.isoformat(),
+                )
+                for sub_id, diffs, grades, key in queue
+                if sub_id in subs
+                for service, column in self.CHANNELS.items()
+                if subs[sub_id][column]
+            ],
+        )
+        return cur.rowcount
+
+    async def deliver(self, shards):
+        """Send due notifications of leased shards and
+        record outcomes. Email and Discord are skipped
+        without their clients.
+
+        Args:
+            shards (frozenset): Shards leased to worker
+
+        Returns:
+            int: Sent notifications
+        """
+        clients = {"email": self._emailc, "discord": self._webhooks}
+        services = [
+            service for service in self.CHANNELS
+            if clients.get(service, True) is not None
+        ]
+        if not shards or not services:
+            return 0
+
+        now = datetime.now()
+        rows = await query(
+            f"""
+            SELECT
+                id,
+                owner_id,
+                service,
+                destination,
+                payload,
+                attempts
+            FROM
+                Notify_Outbox
+            WHERE
+                state = 'pending' AND
+                next_try <= ? AND
+                service IN ({", ".join("?" * len(services))}) AND
+                owner_id % ? IN ({", ".join("?" * len(shards))})
+            ORDER BY
+                next_try
+            LIMIT ?;
+        """,
+            now.isoformat(),
+            *services,
+            BOT_SHARDS,
+            *shards,
+            OUTBOX_BATCH,
+        )
+        if not rows:
+            return 0
+
+        # Every claimed row gets an outcome, so that a failing
+        # notification is retried and given up, never blocking the batch
+        errors = {}
+        payloads = {}
+        notifications = {}
+        for row in rows:
+            try:
+                payload = json.loads(row["payload"])
+                notifications[row["id"]] = Notification(
+                    id_=row["id"],
+                    service=row["service"],
+                    destination=row["destination"],
+                    diff=payload["diff"],
+                    sub_id=row["owner_id"],
+                    grades=payload["grades"],
+                    parts=int(payload.get("parts", 0)),
+                )
+            except (ValueError, TypeError, KeyError, AttributeError) as ex:
+                errors[row["id"]] = f"Invalid payload: {ex!r}"
+                continue
+            payloads[row["id"]] = payload
+
+        sems = {
+            service: asyncio.Semaphore(limit)
+            for service, limit in self._limits.items()
+        }
+        emails = [n for n in notifications.values() if n.service == "email"]
+        batches = [
+            emails[i::self._limits["email"]] for i in range(self._limits["email"])
+        ]
+        for result in await asyncio.gather(
+            *[self._send(notification, sems[notification.service])
+              for notification in notifications.values()
+              if notification.service != "email"],
+            *[self._send_emails(batch) for batch in batches if batch],
+            return_exceptions=True,
+        ):
+            if isinstance(result, BaseException):
+                logger.error("Notification batch failed: %r", result)
+            else:
+                errors.update(result)
+
+        outcomes = []
+        now = datetime.now()
+        for row in rows:
+            error = errors.get(row["id"], "Not sent")
+            attempts = row["attempts"] + 1
+            if error is None:
+                state = "sent"
+            elif attempts >= OUTBOX_MAX_ATTEMPTS:
+                state = "dead"
+                logger.error(
+                    "Giving up notification %d for sub %d via %s after %d attempts",
+                    row["id"],
+                    row["owner_id"],
+                    row["service"].capitalize(),
+                    attempts,
+                )
+            else:
+                state = "pending"
+
+            # Retries resume split messages after parts already sent
+            payload = None
+            notification = notifications.get(row["id"])
+            if (
+                notification is not None
+                and notification.parts != payloads[row["id"]].get("parts", 0)
+            ):
+                payload = json.dumps(dict(payloads[row["id"]], parts=notification.parts))
+
+            outcomes.append(
+                (
+                    state,
+                    attempts,
+                    (now + backoff(attempts)).isoformat(),
+                    error,
+                    now.isoformat(),
+                    payload,
+                    row["id"],
                 )
             )
-            logger.debug("Notification sent for sub %d via Email.", sub_id)
-        except SMTPException as ex:
-            logger.error("Couldn't send notification for sub %d via Email: %s", sub_id, ex)
-    if sub["discord_webhook_url"]:
-        try:
-            dc_send_message(
-                sub["discord_webhook_url"],
-                message=report_gen_dcmsg(diffs, grades),
+        await asyncio.to_thread(self._record, outcomes)
+        return list(errors.values()).count(None)
+
+    @staticmethod
+    def _record(outcomes):
+        """Save delivery outcomes
+
+        Args:
+            outcomes (list): List of
+                (state, attempts, next_try, error, updated, payload, id),
+                payload is kept if None
+        """
+        with connection() as conn:
+            conn.executemany(
+                """
+                UPDATE
+                    Notify_Outbox
+                SET
+                    state = ?,
+                    attempts = ?,
+                    next_try = ?,
+                    error = ?,
+                    updated = ?,
+                    payload = COALESCE(?, payload)
+                WHERE
+                    id = ?;
+            """,
+                outcomes,
             )
-            logger.debug("Notification sent for sub %d via Discord.", sub_id)
-        except RequestException as ex:
-            logger.error("Couldn't send notification for sub %d via Discord: %s", sub_id, ex)
-
-
-# class NotifyManager:
-#     """Notification Manager Base Class"""
-#
-#     def __enter__(self):
-#         return self
-#
-#     def __exit__(self, *_):
-#         self.close()
-#
-#     def close(self):
-#         """Clean up the manager"""
-#
-#     def notify(self, sub_id, diffs, grades, *, emailc):
-#         """Notify Asynchronously
-#
-#         Args:
-#             sub_id (int): Subscriber ID
-#             diffs (dict): Differences
-#             grades (dict): Grades
-#
-#         Returns:
-#             Future: Future object
-#         """
-#
-#         notify(sub_id, diffs, grades, emailc=emailc)
-        # self.submit_coro(notify_coro, sub_id, diffs, grades, emailc=emailc).result()
-
-    # def submit_coro(self, task, *args, **kwargs):
-    #     """Thread-safe method via submit coroutine task.
-
-    #     Args:
-    #         task (function): Coroutine
-
-    #     Returns:
-    #         Future: Future object
-    #     """
-    #     return asyncio.run_coroutine_threadsafe(task(*args, **kwargs), self._loop)
-
-    # def service_coro_gen(self, service_t, diffs):
-    #     """Generate Coroutine via send diffs for the service type
-
-    #     Args:
-    #         service_t (SubService): Service Type Enum
-    #         diffs (dict): Differences
-
-    #     Returns:
-    #         coroutine: Sender Coroutine
-    #     """
-    #     # match service_t:
-    #     #     case SubService.TELEGRAM:
-    #     #         pass
+            conn.commit()
 
+    async def _send(self, notification, sem):
+        """Send a notification, within limit of its channel
 
-class Notification:
-    """Notification Model"""
+        Args:
+            notification (Notification): Notification
+            sem (asyncio.Semaphore): Limit of channel
 
-    def __init__(self, *, service, destination=None, diff=None):
-        self.service = service
-        self.destination = destination
-        self.diff = diff
+        Returns:
+            dict: Error by outbox id, None if it was sent
+        """
+        sender = getattr(self, f"_send_{notification.service}")
+        async with sem:
+            try:
+                if asyncio.iscoroutinefunction(sender):
+                    await sender(notification)
+                else:
+                    await asyncio.to_thread(sender, notification)
+            except (
+                RequestException, SMTPException, OSError, ClientError, asyncio.TimeoutError
+            ) as ex:
+                _log_failure(notification, ex)
+                return {notification.id: str(ex) or type(ex).__name__}
+            except Exception as ex:  # pylint: disable=W0718
+                # Rendering bugs, bad payloads; recorded like send failures
+                logger.exception("Couldn't render notification %d", notification.id)
+                return {notification.id: repr(ex)}
+        _log_success(notification)
+        return {notification.id: None}
+
+    async def _send_emails(self, notifications):
+        """Send emails back to back over one SMTP connection
+
+        Args:
+            notifications (list): Email notifications
+
+        Returns:
+            dict: Error by outbox id, None if it was sent
+        """
+        result = {}
+        mimes = []
+        rendered = []
+        for notification in notifications:
+            try:
+                mimes.append(
+                    generate_mime(
+                        email_to=notification.destination,
+                        email_subject=f"[{APP_NAME}] Notification",
+                        body=report_gen_html(notification.diff, notification.grades),
+                    )
+                )
+            except Exception as ex:  # pylint: disable=W0718
+                logger.exception("Couldn't render notification %d", notification.id)
+                result[notification.id] = repr(ex)
+                continue
+            rendered.append(notification)
+
+        try:
+            sent = await asyncio.to_thread(self._emailc.send_many, mimes) if mimes else []
+        except Exception as ex:  # pylint: disable=W0718
+            sent = [ex] * len(rendered)
+        for notification, ex in zip(rendered, sent):
+            if ex is None:
+                _log_success(notification)
+                result[notification.id] = None
+            else:
+                _log_failure(notification, ex)
+                result[notification.id] = str(ex) or type(ex).__name__
+        return result
+
+    def _send_telegram(self, notification):
+        tg_send_message(
+            report_gen_md(notification.diff, notification.grades, telegram=True),
+            notification.destination,
+            params={
+                "parse_mode": "MarkdownV2"
+            },
+        )
+
+    async def _send_discord(self, notification):
+        def on_part(sent):
+            notification.parts = sent
+
+        await self._webhooks.send(
+            notification.destination,
+            report_gen_dcmsg(notification.diff, notification.grades),
+            start=notification.parts,
+            on_part=on_part,
+        )
+
+
+def _log_success(notification):
+    logger.debug(
+        "Notification sent for sub %d via %s.",
+        notification.sub_id,
+        notification.service.capitalize(),
+    )
+
+
+def _log_failure(notification, ex):
+    logger.error(
+        "Couldn't send notification for sub %d via %s: %s",
+        notification.sub_id,
+        notification.service.capitalize(),
+        ex,
+    )
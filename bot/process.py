@@ -1,38 +1,39 @@
-import os
-import time
-from datetime import datetime
-from multiprocessing import Event, Process
-from pathlib import Path
-
-import schedule
+import asyncio
+from datetime import timedelta
+from multiprocessing import Event
 
 from beusproxy.common.utils import get_logger
-from . import run_chain
+from beusproxy.config import BOT_WORKERS
+from beusproxy.services.database import connection
+from beusproxy.services.migrations import migrate
+from beusproxy.services.supervisor import Supervisor
+from beusproxy.services.templates import registry
+from . import deliver_outbox, run_chain, run_retention
+from .engine import ACTIVE_START, BotEngine, Job
+from .leases import LeaseManager
 
 logger = get_logger(__package__)
 
 
 class BotProc:
-    """Bot Process Base Class"""
+    """Bot Process Base Class
+
+    Supervises worker processes, each leasing its share of students.
+    Crashed workers are restarted with backoff.
+    Safe to run in many places at once, leases are kept in database.
+    """
 
-    def __init__(self, daemon=True, shevent=Event()):
+    def __init__(self, daemon=True, shevent=Event(), workers=BOT_WORKERS):
         self._shevent = shevent
-        self._proc = None
         self._daemon = daemon
-        self._lock_file = Path(".bot.lock")
-        if not self._lock_file.exists():
-            self._lock_file.write_text(str(os.getpid()), encoding="UTF-8")
-            time.sleep(1)
-            if self._lock_file.read_text(encoding="UTF-8") == str(os.getpid()):
-                logger.info("Bot Process spawned - PID:%d", os.getpid())
-            else:
-                return
-        else:
-            return
+        self._supervisors = [
+            Supervisor(f"bot-{i}", proc_worker, shevent=shevent)
+            for i in range(workers)
+        ]
 
-        if daemon:
-            self._proc = Process(target=proc_worker, args={self._shevent}, daemon=daemon)
-            self._proc.start()
+        # Non-daemon mode supervises one worker in caller
+        for supervisor in self._supervisors[0 if daemon else 1:]:
+            supervisor.start()
 
     def __enter__(self):
         return self
@@ -42,25 +43,31 @@ class BotProc:
 
     def run(self):
         if not self._daemon:
-            proc_worker(shevent=self._shevent)
+            self._supervisors[0].run()
 
     def close(self):
-        """Terminates Bot Process"""
-        if self._proc:
-            self._shevent.set()
-            self._proc.join()
-            if self._lock_file.exists():
-                self._lock_file.unlink()
+        """Terminates Bot Processes"""
+        self._shevent.set()
+        for supervisor in self._supervisors:
+            supervisor.close()
 
 
 def proc_worker(shevent=None):
-    schedule.every(2).minutes.do(run_chain)
-    while not shevent.is_set():
-        now = datetime.now().time()
-        start = datetime.strptime("06:00", "%H:%M").time()
-        end = datetime.strptime("01:00", "%H:%M").time()
+    with connection() as conn:
+        migrate(conn)
+    registry.warm()
 
-        if now >= start or now <= end:
-            schedule.run_pending()
-        time.sleep(1)
-    schedule.clear()
+    jobs = [
+        # Students are polled at their own pace, see common/polling.py
+        Job("chain", run_chain, timedelta(minutes=1)),
+        # Retries of failed notifications, see notify_mgr.py
+        Job("outbox", deliver_outbox, timedelta(seconds=20)),
+        Job(
+            "retention",
+            run_retention,
+            timedelta(days=1),
+            at=ACTIVE_START,
+            windowed=False,
+        ),
+    ]
+    asyncio.run(BotEngine(shevent, jobs, leases=LeaseManager()).run())
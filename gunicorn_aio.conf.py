@@ -0,0 +1,4 @@
+bind = "0.0.0.0:8000"
+workers = 4
+worker_class = "aiohttp.GunicornWebWorker"
+wsgi_app = "aio:app"
@@ -0,0 +1,61 @@
+"""Test Configuration
+
+Config is read on import, so environment points to a scratch
+database and folders before beusproxy is imported.
+"""
+
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH = tempfile.mkdtemp(prefix="beusp-tests-")
+
+
+def init_db(path):
+    """Create a database from beusp_init.sql, at schema version 0"""
+    with open(os.path.join(ROOT, "beusp_init.sql"), "r", encoding="UTF-8") as f:
+        script = f.read()
+    conn = sqlite3.connect(path)
+    conn.executescript(script)
+    conn.close()
+
+
+init_db(os.path.join(SCRATCH, "beusp.db"))
+os.environ.update(
+    {
+        "DATABASE": os.path.join(SCRATCH, "beusp.db"),
+        "API_HOSTNAME": "http://localhost/api/",
+        "API_INTERNAL_HOSTNAME": "http://localhost/api/",
+        "STATIC_HOSTNAME": "http://localhost/",
+        "WEB_HOSTNAME": "http://localhost/",
+        "RESPONSE_CACHE": os.path.join(SCRATCH, "cache.db"),
+        "PHOTO_CACHE": os.path.join(SCRATCH, "photos"),
+        "BOT_ENABLED": "false",
+    }
+)
+
+
+@pytest.fixture(name="db")
+def db_fixture():
+    """Pooled connection to migrated scratch database"""
+    # pylint: disable=C0415
+    from beusproxy.services.database import connection
+    from beusproxy.services.migrations import migrate
+
+    with connection() as conn:
+        migrate(conn)
+        yield conn
+        for table in ("Notify_Outbox", "Bot_Leases", "Bot_Workers"):
+            conn.execute(f"DELETE FROM {table};")
+        conn.commit()
+
+
+@pytest.fixture(name="fresh_db")
+def fresh_db_fixture(tmp_path):
+    """Path of a database at schema version 0"""
+    path = str(tmp_path / "beusp.db")
+    init_db(path)
+    return path
@@ -0,0 +1,60 @@
+from bot.leases import LeaseManager
+
+SHARDS = 4
+
+
+def owners(conn):
+    rows = conn.execute("SELECT shard, owner FROM Bot_Leases ORDER BY shard;")
+    return {row["shard"]: row["owner"] for row in rows}
+
+
+def test_lone_worker_claims_every_shard(db):
+    a = LeaseManager(SHARDS, worker="a")
+
+    assert a.renew(db) == frozenset(range(SHARDS))
+    assert set(owners(db).values()) == {"a"}
+
+
+def test_shards_are_handed_over_to_newcomer(db):
+    a = LeaseManager(SHARDS, worker="a")
+    b = LeaseManager(SHARDS, worker="b")
+    a.renew(db)
+
+    # Nothing free until a gives up its extras
+    assert b.renew(db) == frozenset()
+    assert len(a.renew(db)) == SHARDS // 2
+    assert len(b.renew(db)) == SHARDS // 2
+    assert a.owned.isdisjoint(b.owned)
+    assert a.renew(db) | b.renew(db) == frozenset(range(SHARDS))
+
+
+def test_expired_leases_are_claimed(db):
+    a = LeaseManager(SHARDS, worker="a")
+    b = LeaseManager(SHARDS, worker="b")
+    a.renew(db)
+
+    # a stops renewing
+    db.execute("UPDATE Bot_Workers SET expires = 0 WHERE worker = 'a';")
+    db.execute("UPDATE Bot_Leases SET expires = 0 WHERE owner = 'a';")
+    db.commit()
+
+    assert b.renew(db) == frozenset(range(SHARDS))
+    assert set(owners(db).values()) == {"b"}
+    assert db.execute("SELECT worker FROM Bot_Workers;").fetchall()[0]["worker"] == "b"
+
+
+def test_released_shards_are_claimed(db):
+    a = LeaseManager(SHARDS, worker="a")
+    b = LeaseManager(SHARDS, worker="b")
+    a.renew(db)
+
+    a.release(db)
+    assert not a.owned
+    assert b.renew(db) == frozenset(range(SHARDS))
+
+
+def test_shards_beyond_count_are_dropped(db):
+    LeaseManager(SHARDS * 2, worker="a").renew(db)
+
+    assert LeaseManager(SHARDS, worker="a").renew(db) == frozenset(range(SHARDS))
+    assert max(owners(db)) == SHARDS - 1
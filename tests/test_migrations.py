@@ -0,0 +1,64 @@
+import shutil
+import sqlite3
+
+import pytest
+
+from beusproxy.services import migrations
+from beusproxy.services.migrations import MIGRATIONS, migrate, schema_version
+
+
+def schema(conn):
+    return conn.execute(
+        "SELECT type, name, sql FROM sqlite_master ORDER BY type, name;"
+    ).fetchall()
+
+
+def test_migrate_is_idempotent(fresh_db):
+    conn = sqlite3.connect(fresh_db)
+
+    assert migrate(conn) == len(MIGRATIONS)
+    migrated = schema(conn)
+    assert migrate(conn) == len(MIGRATIONS)
+    assert schema(conn) == migrated
+    assert schema_version(conn) == len(MIGRATIONS)
+
+
+def test_migrate_resumes_from_version(fresh_db, tmp_path, monkeypatch):
+    once = str(tmp_path / "once.db")
+    shutil.copy(fresh_db, once)
+    conn = sqlite3.connect(fresh_db)
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", MIGRATIONS[:2])
+    assert migrate(conn) == 2
+    monkeypatch.undo()
+    assert migrate(conn) == len(MIGRATIONS)
+
+    # Same as migrating at once
+    other = sqlite3.connect(once)
+    migrate(other)
+    assert schema(conn) == schema(other)
+
+
+def test_migrated_by_another_connection(fresh_db):
+    first = sqlite3.connect(fresh_db)
+    second = sqlite3.connect(fresh_db)
+
+    migrate(first)
+    assert migrate(second) == len(MIGRATIONS)
+    assert schema(first) == schema(second)
+
+
+def test_failed_migration_is_rolled_back(fresh_db, monkeypatch):
+    conn = sqlite3.connect(fresh_db)
+    migrate(conn)
+    before = schema(conn)
+
+    monkeypatch.setattr(
+        migrations,
+        "MIGRATIONS",
+        MIGRATIONS + [["CREATE TABLE Partial (id INTEGER);", "NOT SQL;"]],
+    )
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(conn)
+    assert schema_version(conn) == len(MIGRATIONS)
+    assert schema(conn) == before
@@ -0,0 +1,132 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from beusproxy.config import BOT_SHARDS
+from bot.notify_mgr import (OUTBOX_BACKOFF, OUTBOX_BACKOFF_MAX,
+                            OUTBOX_MAX_ATTEMPTS, Dispatcher, backoff)
+
+SHARDS = frozenset(range(BOT_SHARDS))
+PAYLOAD = json.dumps({"diff": {}, "grades": {}})
+
+
+def add(conn, destination, *, attempts=0, payload=PAYLOAD, next_try=None):
+    """Pending Telegram notification, due now unless next_try"""
+    now = datetime.now()
+    cur = conn.execute(
+        """
+        INSERT INTO Notify_Outbox (
+            owner_id, service, destination, dedupe, payload, attempts, created, next_try
+        )
+        VALUES (
+            1, 'telegram', ?, ?, ?, ?, ?, ?
+        );
+    """,
+        (
+            destination,
+            f"telegram:{destination}",
+            payload,
+            attempts,
+            now.isoformat(),
+            (next_try or now).isoformat(),
+        ),
+    )
+    conn.commit()
+    return cur.lastrowid
+
+
+def row(conn, id_):
+    return conn.execute("SELECT * FROM Notify_Outbox WHERE id = ?;", (id_,)).fetchone()
+
+
+def deliver(failures):
+    """Deliver due notifications, raising failures[destination] if any"""
+    sent = []
+
+    def send(notification):
+        if notification.destination in failures:
+            raise failures[notification.destination]
+        sent.append(notification.destination)
+
+    dispatcher = Dispatcher()
+    dispatcher._send_telegram = send  # pylint: disable=W0212
+    return asyncio.run(dispatcher.deliver(SHARDS)), sent
+
+
+def test_backoff_doubles_up_to_max():
+    assert backoff(1) == OUTBOX_BACKOFF
+    assert backoff(2) == OUTBOX_BACKOFF * 2
+    assert backoff(3) == OUTBOX_BACKOFF * 4
+    assert backoff(20) == OUTBOX_BACKOFF_MAX
+
+
+def test_sent(db):
+    id_ = add(db, "1")
+
+    assert deliver({}) == (1, ["1"])
+    assert row(db, id_)["state"] == "sent"
+    assert row(db, id_)["attempts"] == 1
+    assert row(db, id_)["error"] is None
+
+
+def test_failure_is_retried_after_backoff(db):
+    id_ = add(db, "1")
+
+    assert deliver({"1": OSError("down")}) == (0, [])
+    failed = row(db, id_)
+    assert failed["state"] == "pending"
+    assert failed["attempts"] == 1
+    assert failed["error"] == "down"
+    assert datetime.fromisoformat(failed["next_try"]) - datetime.fromisoformat(
+        failed["updated"]
+    ) == backoff(1)
+
+    # Not due until backoff passes
+    assert deliver({}) == (0, [])
+    db.execute("UPDATE Notify_Outbox SET next_try = ?;", (datetime.now().isoformat(),))
+    db.commit()
+    assert deliver({}) == (1, ["1"])
+    assert row(db, id_)["state"] == "sent"
+    assert row(db, id_)["attempts"] == 2
+
+
+def test_dead_after_max_attempts(db):
+    id_ = add(db, "1", attempts=OUTBOX_MAX_ATTEMPTS - 1)
+
+    deliver({"1": OSError("down")})
+    assert row(db, id_)["state"] == "dead"
+    assert row(db, id_)["attempts"] == OUTBOX_MAX_ATTEMPTS
+
+    # Never tried again
+    db.execute("UPDATE Notify_Outbox SET next_try = ?;", (datetime.now().isoformat(),))
+    db.commit()
+    assert deliver({}) == (0, [])
+
+
+def test_unexpected_error_doesnt_abort_batch(db):
+    broken = add(db, "1")
+    ok = add(db, "2")
+
+    assert deliver({"1": ValueError("bug")}) == (1, ["2"])
+    assert row(db, broken)["state"] == "pending"
+    assert row(db, broken)["error"] == repr(ValueError("bug"))
+    assert row(db, ok)["state"] == "sent"
+
+
+def test_invalid_payload_is_retried(db):
+    broken = add(db, "1", payload="{")
+    ok = add(db, "2")
+
+    assert deliver({}) == (1, ["2"])
+    assert row(db, broken)["state"] == "pending"
+    assert row(db, broken)["attempts"] == 1
+    assert row(db, broken)["error"].startswith("Invalid payload")
+    assert row(db, ok)["state"] == "sent"
+
+
+def test_not_due_is_left_alone(db):
+    id_ = add(db, "1", next_try=datetime.now() + timedelta(hours=1))
+
+    assert deliver({}) == (0, [])
+    assert row(db, id_)["attempts"] == 0
+    assert row(db, id_)["updated"] is None
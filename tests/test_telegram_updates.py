@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from beusproxy.services.telegram import TelegramClient
+
+CHATS = 3
+UPDATES = 5
+
+
+def update(update_id, chat_id):
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}}}
+
+
+class Recorder:
+    """process_update recording handling intervals per chat"""
+
+    def __init__(self, delay=0.01, fail=()):
+        self.delay = delay
+        self.fail = fail
+        self.handled = {}
+        self.active = {}
+        self.overlaps = 0
+        self.concurrent = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, u):
+        chat_id = u["message"]["chat"]["id"]
+        with self._lock:
+            if self.active.get(chat_id):
+                self.overlaps += 1
+            self.active[chat_id] = True
+            self.concurrent = max(self.concurrent, sum(self.active.values()))
+        time.sleep(self.delay)
+        with self._lock:
+            self.active[chat_id] = False
+            self.handled.setdefault(chat_id, []).append(u["update_id"])
+        if u["update_id"] in self.fail:
+            raise ValueError(u["update_id"])
+
+
+@pytest.fixture(name="client")
+def client_fixture():
+    with TelegramClient(None, poll=False, workers=CHATS) as client:
+        yield client
+
+
+def submit_all(client):
+    futures = [
+        client.submit(update(chat_id * 100 + i, chat_id))
+        for i in range(UPDATES)
+        for chat_id in range(CHATS)
+    ]
+    for future in futures:
+        future.exception(5)
+    return futures
+
+
+def test_updates_are_handled_in_order_per_chat(client):
+    recorder = client.process_update = Recorder()
+    submit_all(client)
+
+    assert recorder.handled == {
+        chat_id: [chat_id * 100 + i for i in range(UPDATES)] for chat_id in range(CHATS)
+    }
+    assert recorder.overlaps == 0
+    # Chats don't wait for each other
+    assert recorder.concurrent > 1
+
+
+def test_failed_update_doesnt_block_chat(client):
+    recorder = client.process_update = Recorder(fail={1})
+    futures = submit_all(client)
+
+    assert isinstance(futures[CHATS].exception(), ValueError)
+    assert recorder.handled[0] == list(range(UPDATES))
+
+
+def _handle_chat(lock_path, intervals, ready):
+    with TelegramClient(None, poll=False, chat_lock=lock_path) as client:
+
+        def process_update(_):
+            start = time.monotonic()
+            time.sleep(0.05)
+            intervals.put((os.getpid(), start, time.monotonic()))
+
+        client.process_update = process_update
+        ready.wait(5)
+        for future in [client.submit(update(i, 42)) for i in range(3)]:
+            future.result(5)
+
+
+def test_chat_is_handled_by_one_process_at_a_time(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    intervals = ctx.Queue()
+    ready = ctx.Event()
+    procs = [
+        ctx.Process(
+            target=_handle_chat, args=(str(tmp_path / "chats.lock"), intervals, ready)
+        )
+        for _ in range(2)
+    ]
+    for proc in procs:
+        proc.start()
+    ready.set()
+    handled = [intervals.get(timeout=10) for _ in range(6)]
+    for proc in procs:
+        proc.join(5)
+
+    assert {pid for pid, _, _ in handled} == {proc.pid for proc in procs}
+    handled.sort(key=lambda interval: interval[1])
+    for (_, _, end), (_, start, _) in zip(handled, handled[1:]):
+        assert end <= start